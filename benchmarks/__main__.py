@@ -0,0 +1,14 @@
+"""
+Run every knox benchmark against a single test database.
+"""
+from benchmarks import (
+    auth_hot_path, hash_token, token_key_collisions, views_throughput,
+)
+from benchmarks.utils import parse_args
+
+if __name__ == '__main__':
+    iterations = parse_args(__doc__).iterations
+    benchmarks = (auth_hot_path, views_throughput, token_key_collisions, hash_token)
+    for benchmark in benchmarks:
+        print(f'# {benchmark.__name__}')
+        benchmark.main(iterations)
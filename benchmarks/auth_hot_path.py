@@ -0,0 +1,133 @@
+"""
+Latency and query count of `TokenAuthentication.authenticate` for a token
+presented in the `Authorization` header, across token counts per user,
+`AUTO_REFRESH` modes, token prefixes, hash algorithms, the token cache and
+token stores, and of rejecting invalid tokens.
+"""
+from datetime import timedelta
+
+from benchmarks.utils import (
+    measure, override_knox_settings, parse_args, report, setup_django,
+)
+
+TOKENS_PER_USER = (1, 100, 10000)
+
+AUTO_REFRESH_SCENARIOS = (
+    ('AUTO_REFRESH off', {}),
+    ('AUTO_REFRESH on, throttled', {'AUTO_REFRESH': True}),
+    ('AUTO_REFRESH on, saved every request',
+     {'AUTO_REFRESH': True, 'MIN_REFRESH_INTERVAL': 0}),
+    ('AUTO_REFRESH on, buffered every request',
+     {'AUTO_REFRESH': True, 'MIN_REFRESH_INTERVAL': 0,
+      'AUTO_REFRESH_BUFFER': 'knox.refresh.LocMemRefreshBuffer'}),
+)
+
+HASH_ALGORITHMS = (
+    'hashlib.sha512',
+    'hashlib.sha256',
+    'hashlib.sha3_512',
+    'hashlib.blake2b',
+)
+
+
+def authenticate(user, name, iterations, token_count=1, **overrides):
+    from rest_framework.test import APIRequestFactory
+
+    from knox import auth
+    from knox.models import AuthToken
+
+    with override_knox_settings(**overrides):
+        AuthToken.objects.all().delete()
+        created = AuthToken.objects.bulk_create_tokens(
+            [user] * token_count, expiry=timedelta(hours=10),
+            prefix=overrides.get('TOKEN_PREFIX', ''))
+        _, token = created[-1]
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {token}')
+        authentication = auth.TokenAuthentication()
+        mean_us, queries = measure(
+            lambda: authentication.authenticate(request), iterations)
+    report(name, mean_us, queries)
+
+
+def authenticate_stored(user, name, iterations, **overrides):
+    from rest_framework.test import APIRequestFactory
+
+    from knox import auth, stores
+
+    with override_knox_settings(**overrides):
+        _, token = stores.get_token_store().create(user, timedelta(hours=10))
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {token}')
+        authentication = auth.TokenAuthentication()
+        mean_us, queries = measure(
+            lambda: authentication.authenticate(request), iterations)
+    report(name, mean_us, queries)
+
+
+def reject(name, token, iterations, **overrides):
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework.test import APIRequestFactory
+
+    from knox import auth
+
+    with override_knox_settings(**overrides):
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {token}')
+        authentication = auth.TokenAuthentication()
+
+        def authenticate():
+            try:
+                authentication.authenticate(request)
+            except AuthenticationFailed:
+                pass
+
+        mean_us, queries = measure(authenticate, iterations)
+    report(name, mean_us, queries)
+
+
+def main(iterations=1000):
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    user = User.objects.create_user('bench.auth', password='bench')
+
+    for token_count in TOKENS_PER_USER:
+        authenticate(user, f'{token_count} tokens per user', iterations,
+                     token_count=token_count)
+    authenticate(user, '10000 tokens per user, no inline cleanup', iterations,
+                 token_count=10000, INLINE_TOKEN_CLEANUP=False)
+
+    for name, overrides in AUTO_REFRESH_SCENARIOS:
+        authenticate(user, name, iterations, **overrides)
+
+    authenticate(user, 'LAZY_USER', iterations, INLINE_TOKEN_CLEANUP=False,
+                 LAZY_USER=True)
+
+    authenticate(user, 'TOKEN_PREFIX "bench_"', iterations,
+                 TOKEN_PREFIX='bench_')
+
+    for algorithm in HASH_ALGORITHMS:
+        authenticate(user, f'SECURE_HASH_ALGORITHM {algorithm}', iterations,
+                     SECURE_HASH_ALGORITHM=algorithm)
+
+    authenticate(user, 'TOKEN_CACHE LocMemTokenCache', iterations,
+                 TOKEN_CACHE='knox.cache.LocMemTokenCache')
+    authenticate(user, 'TOKEN_CACHE DjangoTokenCache', iterations,
+                 TOKEN_CACHE='knox.cache.DjangoTokenCache')
+
+    authenticate_stored(user, 'TOKEN_STORE InMemoryTokenStore', iterations,
+                        TOKEN_STORE='knox.stores.InMemoryTokenStore')
+    authenticate_stored(user, 'TOKEN_STORE DjangoCacheTokenStore', iterations,
+                        TOKEN_STORE='knox.stores.DjangoCacheTokenStore')
+
+    reject('malformed token', 'not-a-knox-token', iterations)
+    reject('unknown token', '0' * 64, iterations)
+    reject('unknown token, NEGATIVE_TOKEN_CACHE', '0' * 64, iterations,
+           NEGATIVE_TOKEN_CACHE='knox.cache.LocMemNegativeTokenCache')
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__).iterations)
@@ -0,0 +1,33 @@
+"""
+Cost of hashing a token with each supported hash configuration.
+"""
+import hashlib
+import timeit
+
+from benchmarks.utils import parse_args, report, setup_django
+
+HASH_CONFIGURATIONS = (
+    ('sha512', hashlib.sha512, None, None),
+    ('sha512, peppered (HMAC)', hashlib.sha512, b'pepper', None),
+    ('sha3_512', hashlib.sha3_512, None, None),
+    ('sha256', hashlib.sha256, None, None),
+    ('blake2b', hashlib.blake2b, None, None),
+    ('blake2b, peppered, 32 bytes', hashlib.blake2b, b'pepper', 32),
+    ('blake2s, peppered', hashlib.blake2s, b'pepper', None),
+)
+
+
+def main(iterations=100000):
+    setup_django(create_database=False)
+
+    from knox.crypto import create_token_string, make_digest
+
+    data = create_token_string().encode()
+    for name, hash_func, key, digest_size in HASH_CONFIGURATIONS:
+        elapsed = timeit.timeit(
+            lambda: make_digest(hash_func, data, key, digest_size), number=iterations)
+        report(f'hash_token, {name}', elapsed / iterations * 1e6)
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__, iterations=100000).iterations)
@@ -0,0 +1,40 @@
+"""
+Authentication cost with N tokens sharing the presented token's `token_key`.
+
+The digest lookup makes the cost independent of N.
+"""
+from benchmarks.utils import measure, parse_args, report, setup_django
+
+
+def main(iterations=1000):
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+
+    from knox.auth import TokenAuthentication
+    from knox.models import AuthToken
+
+    User = get_user_model()
+    user = User.objects.create_user('bench', password='bench')
+    # colliding rows belong to another user so that the inline cleanup of
+    # the authenticating user's tokens does not skew the measurement
+    other_user = User.objects.create_user('other', password='other')
+    authentication = TokenAuthentication()
+
+    for collisions in (0, 10, 100, 1000):
+        AuthToken.objects.all().delete()
+        instance, token = AuthToken.objects.create(user=user, expiry=None)
+        AuthToken.objects.bulk_create(
+            AuthToken(digest=f'{i:0128x}', token_key=instance.token_key,
+                      user=other_user)
+            for i in range(collisions)
+        )
+        token = token.encode()
+        mean_us, queries = measure(
+            lambda: authentication.authenticate_credentials(token), iterations)
+        report(f'authenticate, {collisions} colliding token_key rows',
+               mean_us, queries)
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__).iterations)
@@ -0,0 +1,109 @@
+"""
+Helpers for the standalone knox benchmarks.
+
+Benchmarks run against the `knox_project` test project with a throwaway
+SQLite test database. Run them from the repository root, e.g.::
+
+    python -m benchmarks.token_key_collisions
+
+or run all of them with `python -m benchmarks`.
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from importlib import reload
+
+import django
+
+_database_created = False
+
+
+def setup_django(create_database=True):
+    """
+    Configure Django and create a fresh test database, once per process.
+    """
+    global _database_created
+    if _database_created:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'knox_project.settings')
+    django.setup()
+    if not create_database:
+        return
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    _database_created = True
+
+
+def parse_args(description, iterations=1000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--iterations', type=int, default=iterations,
+        help='Number of timed calls per scenario.')
+    return parser.parse_args()
+
+
+def reload_knox():
+    """
+    Reload the knox modules that read `knox_settings` at import time.
+    """
+    from knox import auth, cache, crypto, last_used, refresh, stores, views
+
+    for module in (crypto, cache, refresh, last_used, stores, auth, views):
+        reload(module)
+
+
+@contextmanager
+def override_knox_settings(**overrides):
+    """
+    Run the enclosed block with the given `REST_KNOX` settings.
+    """
+    from django.test import override_settings
+
+    from knox.settings import DEFAULTS
+
+    with override_settings(REST_KNOX=dict(DEFAULTS, **overrides)):
+        reload_knox()
+        try:
+            yield
+        finally:
+            from knox.refresh import get_refresh_buffer
+            refresh_buffer = get_refresh_buffer()
+            if refresh_buffer is not None:
+                refresh_buffer.pop_pending()
+    reload_knox()
+
+
+def measure(func, iterations=1000, setup=None):
+    """
+    Call `func` `iterations` times and return the mean wall-clock time in
+    microseconds and the mean number of queries per call.
+
+    If given, `setup` is called untimed before each call and its return
+    value is passed to `func` as positional arguments.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    func(*(setup() if setup else ()))  # warm up
+    elapsed = 0
+    queries = 0
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            func(*args)
+            elapsed += time.perf_counter() - start
+        queries += len(captured)
+    return elapsed / iterations * 1e6, queries / iterations
+
+
+def report(name, mean_us, queries=None):
+    line = f'{name:<50} {mean_us:>10.1f} us/op {1e6 / mean_us:>10.0f} ops/s'
+    if queries is not None:
+        line += f' {queries:>6.1f} queries/op'
+    print(line)
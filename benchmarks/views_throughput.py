@@ -0,0 +1,79 @@
+"""
+Throughput of `LoginView` and `LogoutAllView`.
+
+The login request is force-authenticated so that password hashing, which
+is outside of knox's control, does not dominate the measurement.
+"""
+from datetime import timedelta
+
+from benchmarks.utils import (
+    measure, override_knox_settings, parse_args, report, setup_django,
+)
+
+LOGIN_SCENARIOS = (
+    ('LoginView', {}),
+    ('LoginView, TOKEN_LIMIT_PER_USER 10, reject',
+     {'TOKEN_LIMIT_PER_USER': 10}),
+    ('LoginView, TOKEN_LIMIT_PER_USER 10, evict_oldest',
+     {'TOKEN_LIMIT_PER_USER': 10, 'TOKEN_LIMIT_PER_USER_POLICY': 'evict_oldest'}),
+)
+
+LOGOUT_ALL_TOKENS_PER_USER = (1, 10, 100)
+
+
+def login(user, name, iterations, **overrides):
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from knox import views
+    from knox.models import AuthToken
+
+    factory = APIRequestFactory()
+    with override_knox_settings(**overrides):
+        view = views.LoginView.as_view()
+        AuthToken.objects.all().delete()
+
+        def setup():
+            request = factory.post('/')
+            force_authenticate(request, user=user)
+            return (request,)
+
+        mean_us, queries = measure(view, iterations, setup)
+    report(name, mean_us, queries)
+
+
+def logout_all(user, token_count, iterations):
+    from rest_framework.test import APIRequestFactory
+
+    from knox import views
+    from knox.models import AuthToken
+
+    factory = APIRequestFactory()
+    with override_knox_settings():
+        view = views.LogoutAllView.as_view()
+
+        def setup():
+            created = AuthToken.objects.bulk_create_tokens(
+                [user] * token_count, expiry=timedelta(hours=10), prefix='')
+            _, token = created[-1]
+            return (factory.post('/', HTTP_AUTHORIZATION=f'Token {token}'),)
+
+        mean_us, queries = measure(view, iterations, setup)
+    report(f'LogoutAllView, {token_count} tokens per user', mean_us, queries)
+
+
+def main(iterations=1000):
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    user = User.objects.create_user('bench.views', password='bench')
+
+    for name, overrides in LOGIN_SCENARIOS:
+        login(user, name, iterations, **overrides)
+    for token_count in LOGOUT_ALL_TOKENS_PER_USER:
+        logout_all(user, token_count, iterations)
+
+
+if __name__ == '__main__':
+    main(parse_args(__doc__).iterations)
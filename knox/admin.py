@@ -1,10 +1,24 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.translation import ngettext
 
 from knox import models
+from knox.stores import get_token_store
 
 
 @admin.register(models.AuthToken)
 class AuthTokenAdmin(admin.ModelAdmin):
-    list_display = ('digest', 'user', 'created', 'expiry',)
+    list_display = ('digest', 'user', 'created', 'expiry', 'last_used',)
     fields = ()
     raw_id_fields = ('user',)
+    actions = ('revoke_tokens',)
+
+    @admin.action(permissions=('delete',), description='Revoke selected tokens')
+    def revoke_tokens(self, request, queryset):
+        '''
+        Deletes the selected tokens in bulk with the `TOKEN_STORE`, without
+        the per token signals of the `delete_selected` action.
+        '''
+        revoked = get_token_store().revoke(queryset)
+        self.message_user(request, ngettext(
+            'Revoked %d token.', 'Revoked %d tokens.', revoked) % revoked,
+            messages.SUCCESS)
@@ -0,0 +1,56 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+
+
+def connect_receivers(**kwargs):
+    '''
+    Connects the receivers keeping the `TOKEN_CACHE`, the
+    `REVOCATION_CHANNEL` and a `TOKEN_STORE` other than the default up to
+    date, and only while these are configured: a `post_delete` receiver
+    disables Django's fast delete, so every deletion would fetch the deleted
+    rows first.
+    '''
+    from knox import (
+        cache, revocation, settings as knox_settings_module, stores,
+    )
+    from knox.models import get_token_model
+
+    if kwargs.get('setting', 'REST_KNOX') != 'REST_KNOX':
+        return
+    # Read the raw settings, importing the classes would bind them before
+    # tests reload their modules
+    user_settings = dict(knox_settings_module.knox_settings.user_settings)
+    if user_settings.get('TOKEN_STORE') == knox_settings_module.DEFAULTS['TOKEN_STORE']:
+        # The database keeps the users of its tokens up to date
+        del user_settings['TOKEN_STORE']
+    token_model = get_token_model()
+    receivers = [
+        ('TOKEN_CACHE', post_delete, cache.invalidate_token, token_model),
+        ('TOKEN_CACHE', post_save, cache.invalidate_user_tokens,
+         settings.AUTH_USER_MODEL),
+        ('REVOCATION_CHANNEL', post_delete, revocation.publish_revoked_token,
+         token_model),
+        ('REVOCATION_CHANNEL', post_save, revocation.publish_deactivated_user_tokens,
+         settings.AUTH_USER_MODEL),
+        ('TOKEN_STORE', post_save, stores.update_user_tokens, settings.AUTH_USER_MODEL),
+        ('TOKEN_STORE', post_delete, stores.delete_user_tokens,
+         settings.AUTH_USER_MODEL),
+    ]
+    for setting, signal, receiver, sender in receivers:
+        dispatch_uid = f'{receiver.__module__}.{receiver.__name__}'
+        if user_settings.get(setting) is None:
+            signal.disconnect(sender=sender, dispatch_uid=dispatch_uid)
+        else:
+            # weak=False keeps the receivers connected when tests reload modules
+            signal.connect(receiver, sender=sender, weak=False, dispatch_uid=dispatch_uid)
+
+
+class KnoxConfig(AppConfig):
+    name = 'knox'
+
+    def ready(self):
+        connect_receivers()
+        # Runs after knox.settings has reloaded knox_settings
+        setting_changed.connect(connect_receivers)
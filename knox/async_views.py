@@ -0,0 +1,74 @@
+'''
+Asynchronous variants of the knox views for ASGI deployments.
+
+These views require the `adrf` package (`pip install django-rest-knox[async]`).
+'''
+from adrf.views import APIView
+from asgiref.sync import sync_to_async
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+
+from knox.auth import AsyncTokenAuthentication
+from knox.metrics import get_metrics
+from knox.stores import get_token_store
+from knox.views import LoginView, LogoutAllView, LogoutView, RefreshView
+
+
+class AsyncLoginView(LoginView, APIView):
+
+    async def acreate_token(self):
+        token_prefix = self.get_token_prefix()
+        return await get_token_store().acreate(
+            self.get_token_user(), self.get_token_ttl(), prefix=token_prefix
+        )
+
+    async def post(self, request, format=None):
+        token_limit_per_user = self.get_token_limit_per_user()
+        if token_limit_per_user is None:
+            instance, token = await self.acreate_token()
+        else:
+            # Django transactions are synchronous only
+            created = await sync_to_async(self.create_token_within_limit)(
+                token_limit_per_user)
+            if created is None:
+                return self.get_token_limit_response()
+            instance, token = created
+        await sync_to_async(user_logged_in.send)(
+            sender=request.user.__class__, request=request, user=request.user)
+        get_metrics().increment('knox_logins_total', result='success')
+        return self.get_post_response(request, token, instance)
+
+
+class AsyncRefreshView(RefreshView, APIView):
+    authentication_classes = (AsyncTokenAuthentication,)
+
+    async def post(self, request, format=None):
+        # Django transactions are synchronous only
+        instance, token = await sync_to_async(self.rotate_token)()
+        get_metrics().increment('knox_token_refreshes_total')
+        return self.get_post_response(request, token, instance)
+
+
+class AsyncLogoutView(LogoutView, APIView):
+    authentication_classes = (AsyncTokenAuthentication,)
+
+    async def post(self, request, format=None):
+        await get_token_store().adelete(request._auth)
+        await sync_to_async(user_logged_out.send)(
+            sender=request.user.__class__, request=request, user=request.user)
+        get_metrics().increment('knox_logouts_total', scope='token')
+        return self.get_post_response(request)
+
+
+class AsyncLogoutAllView(LogoutAllView, APIView):
+    '''
+    Log the user out of all sessions
+    I.E. deletes all auth tokens for the user
+    '''
+    authentication_classes = (AsyncTokenAuthentication,)
+
+    async def post(self, request, format=None):
+        await get_token_store().adelete_for_user(request.user)
+        await sync_to_async(user_logged_out.send)(
+            sender=request.user.__class__, request=request, user=request.user)
+        get_metrics().increment('knox_logouts_total', scope='all')
+        return self.get_post_response(request)
@@ -1,21 +1,97 @@
 import binascii
 import logging
+import re
+from collections import namedtuple
 from hmac import compare_digest
 
+from django.db import router
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
 from rest_framework.authentication import (
     BaseAuthentication, get_authorization_header,
 )
 
-from knox.crypto import hash_token
+from knox import signing
+from knox.cache import (
+    cache_invalid_digest, cache_token, get_token_cache,
+    is_cached_invalid_digest,
+)
+from knox.crypto import get_token_string_length, hash_token, hash_token_legacy
+from knox.last_used import get_last_used_buffer
+from knox.metrics import get_metrics
 from knox.models import get_token_model
+from knox.refresh import apply_pending_expiry, get_refresh_buffer
+from knox.revocation import get_revocation_channel, poll_revocations
 from knox.settings import CONSTANTS, knox_settings
 from knox.signals import token_expired
+from knox.stores import get_token_store
 
 logger = logging.getLogger(__name__)
 
+hex_characters = re.compile('[0-9a-f]*')
+
+# Outcome of verifying a token, see `TokenAuthentication.verify_tokens`
+TokenVerification = namedtuple('TokenVerification', ('valid', 'user_id', 'expiry'))
+
+INVALID_TOKEN = TokenVerification(False, None, None)
+
+
+def _load_deferred_fields(user):
+    deferred_fields = user.get_deferred_fields()
+    if deferred_fields:
+        user.refresh_from_db(fields=deferred_fields)
+    return user
+
+
+class LazyUser(SimpleLazyObject):
+    '''
+    Stands in for a user fetched with only its primary key, `is_active` and
+    username.
+
+    These, `is_authenticated` and `get_username()`, are served without a
+    query; accessing any other attribute loads all of the remaining fields in
+    a single query.
+    '''
+    eager_attributes = frozenset({
+        'pk', 'is_active', 'is_authenticated', 'is_anonymous', '_meta',
+        'get_username',
+    })
+
+    def __init__(self, user):
+        self.__dict__['_user'] = user
+        super().__init__(lambda: _load_deferred_fields(user))
+
+    def __getattr__(self, name):
+        user = self.__dict__['_user']
+        if name in self.eager_attributes or name == user._meta.pk.attname:
+            return getattr(user, name)
+        return super().__getattr__(name)
+
+    @property
+    def __class__(self):
+        return self.__dict__['_user'].__class__
+
+    def __eq__(self, other):
+        return self.__dict__['_user'] == other
+
+    def __hash__(self):
+        return hash(self.__dict__['_user'])
+
+    def __bool__(self):
+        return True
+
+
+def get_user_instance(user):
+    '''
+    Returns the user a `LazyUser` stands in for, e.g. to assign it to a
+    foreign key, and any other user unchanged.
+    '''
+    if issubclass(type(user), LazyUser):
+        return user.__dict__['_user']
+    return user
+
 
 class TokenAuthentication(BaseAuthentication):
     '''
@@ -26,11 +102,33 @@ class TokenAuthentication(BaseAuthentication):
     in plaintext in the database
 
     If successful
-    - `request.user` will be a django `User` instance
+    - `request.user` will be a django `User` instance, or with `LAZY_USER` a
+      `LazyUser` standing in for it
     - `request.auth` will be an `AuthToken` instance
     '''
 
     def authenticate(self, request):
+        token = self.get_token_from_header(request)
+        if token is None:
+            return None
+        user, auth_token = self.authenticate_credentials(token)
+        return (user, auth_token)
+
+    async def aauthenticate(self, request):
+        '''
+        Asynchronous counterpart of `authenticate`, using the async ORM.
+        '''
+        token = self.get_token_from_header(request)
+        if token is None:
+            return None
+        user, auth_token = await self.aauthenticate_credentials(token)
+        return (user, auth_token)
+
+    def get_token_from_header(self, request):
+        '''
+        Returns the raw token from the `Authorization` header, or `None` if
+        the header is meant for another authentication scheme.
+        '''
         auth = get_authorization_header(request).split()
         prefix = self.authenticate_header(request).encode()
 
@@ -46,35 +144,521 @@ class TokenAuthentication(BaseAuthentication):
             msg = _('Invalid token header. '
                     'Token string should not contain spaces.')
             raise exceptions.AuthenticationFailed(msg)
+        return auth[1]
+
+    def authenticate_credentials(self, token):
+        '''
+        The token is hashed once and its digest, the primary key of the
+        token table, is used for an indexed point lookup, together with its
+        digests under any `LEGACY_SECURE_HASH_ALGORITHMS`. The stored
+        `token_key` is checked as well.
+
+        Tokens that have expired will be deleted and rejected.
+
+        When a `TOKEN_CACHE` is configured, verified tokens are served from
+        the cache and the database is only consulted on a miss. Malformed
+        tokens, signed tokens with a bad signature or past their signed
+        expiry, and with a `NEGATIVE_TOKEN_CACHE` recently rejected tokens,
+        are rejected without a query.
+        '''
+        metrics = get_metrics()
+        with metrics.timer('knox_authentication_duration_seconds'):
+            try:
+                user, auth_token = self._authenticate_credentials(token)
+            except exceptions.AuthenticationFailed:
+                metrics.increment('knox_authentications_total', result='failure')
+                raise
+        metrics.increment('knox_authentications_total', result='success')
+        return (user, auth_token)
 
-        user, auth_token = self.authenticate_credentials(auth[1])
+    async def aauthenticate_credentials(self, token):
+        '''
+        Asynchronous counterpart of `authenticate_credentials`.
+        '''
+        metrics = get_metrics()
+        with metrics.timer('knox_authentication_duration_seconds'):
+            try:
+                user, auth_token = await self._aauthenticate_credentials(token)
+            except exceptions.AuthenticationFailed:
+                metrics.increment('knox_authentications_total', result='failure')
+                raise
+        metrics.increment('knox_authentications_total', result='success')
         return (user, auth_token)
 
-    def authenticate_credentials(self, token):
+    def verify_tokens(self, tokens, record_use=True) -> list:
         '''
-        Due to the random nature of hashing a value, this must inspect
-        each auth_token individually to find the correct one.
+        Verifies a batch of raw tokens, as `str` or `bytes`, e.g. on behalf
+        of an API gateway, returning a `TokenVerification` for each of them
+        in order.
 
-        Tokens that have expired will be deleted and skipped
+        Tokens not served by the `TOKEN_CACHE` are looked up together in a
+        single query joined with their users. Valid tokens are renewed and
+        recorded as used as by `authenticate_credentials`, unless
+        `record_use` is false, but expired tokens are left for
+        `purge_expired` to delete.
         '''
-        msg = _('Invalid token.')
-        token = token.decode("utf-8")
-        for auth_token in get_token_model().objects.filter(
-                token_key=token[:CONSTANTS.TOKEN_KEY_LENGTH]):
-            if self._cleanup_token(auth_token):
+        metrics = get_metrics()
+        results = [INVALID_TOKEN] * len(tokens)
+        pending = {}
+        for index, token in enumerate(tokens):
+            if isinstance(token, str):
+                token = token.encode()
+            try:
+                token = self._decode_token(token)
+                digests = self._get_token_digests(token)
+            except exceptions.AuthenticationFailed:
                 continue
+            auth_token = self._get_known_token(token, digests)
+            if auth_token is not None:
+                results[index] = self._verify_cached_token(auth_token, record_use)
+            elif not is_cached_invalid_digest(digests[0]):
+                pending[index] = (token, digests)
+
+        auth_tokens = self._lookup_tokens(pending.values())
+        for index, (token, digests) in pending.items():
+            results[index] = self._verify_token(
+                self._find_token(auth_tokens, digests), token, digests, record_use)
+
+        valid_count = sum(result.valid for result in results)
+        metrics.increment(
+            'knox_token_verifications_total', valid_count, result='valid')
+        metrics.increment(
+            'knox_token_verifications_total', len(results) - valid_count,
+            result='invalid')
+        return results
+
+    def get_token_queryset(self):
+        '''
+        Returns the live tokens, see `AuthTokenManager.live`, joined with
+        their user so that a lookup takes a single query.
+
+        With `LAZY_USER`, only the primary key, `is_active` and username of
+        the user are fetched. Override this to restrict the user columns with `only()`
+        or to add `select_related()` relations of a custom user model.
+        '''
+        queryset = get_token_model().objects.live().select_related('user')
+        if knox_settings.LAZY_USER:
+            queryset = queryset.defer(*self._get_deferred_user_fields())
+        return queryset
+
+    def renew_token(self, auth_token) -> bool:
+        '''
+        Extend the token expiry, returning whether the new expiry was saved
+        or, with an `AUTO_REFRESH_BUFFER`, queued for a bulk write.
+        '''
+        metrics = get_metrics()
+        if not self._renew_expiry(auth_token):
+            metrics.increment('knox_token_renewals_total', result='throttled')
+            return False
+        refresh_buffer = get_refresh_buffer()
+        if refresh_buffer is None:
+            if not get_token_store().renew(auth_token):
+                self._reject_deleted_token(auth_token)
+            metrics.increment('knox_token_renewals_total', result='written')
+        else:
+            refresh_buffer.add(auth_token.digest, auth_token.expiry)
+            metrics.increment('knox_token_renewals_total', result='buffered')
+            refresh_buffer.flush_if_due()
+        return True
+
+    async def arenew_token(self, auth_token) -> bool:
+        '''
+        Asynchronous counterpart of `renew_token`.
+        '''
+        metrics = get_metrics()
+        if not self._renew_expiry(auth_token):
+            metrics.increment('knox_token_renewals_total', result='throttled')
+            return False
+        refresh_buffer = get_refresh_buffer()
+        if refresh_buffer is None:
+            if not await get_token_store().arenew(auth_token):
+                self._reject_deleted_token(auth_token)
+            metrics.increment('knox_token_renewals_total', result='written')
+        else:
+            refresh_buffer.add(auth_token.digest, auth_token.expiry)
+            metrics.increment('knox_token_renewals_total', result='buffered')
+            await refresh_buffer.aflush_if_due()
+        return True
+
+    def record_last_used(self, auth_token) -> bool:
+        '''
+        With `TRACK_LAST_USED`, set `last_used` to now unless it was recorded
+        less than `LAST_USED_INTERVAL` seconds ago, returning whether it was
+        saved or, with a `LAST_USED_BUFFER`, queued for a bulk write.
+        '''
+        if not knox_settings.TRACK_LAST_USED:
+            return False
+        metrics = get_metrics()
+        if not self._touch_token(auth_token):
+            metrics.increment('knox_last_used_updates_total', result='throttled')
+            return False
+        last_used_buffer = get_last_used_buffer()
+        if last_used_buffer is None:
+            if not get_token_store().update_last_used(auth_token):
+                self._reject_deleted_token(auth_token)
+            metrics.increment('knox_last_used_updates_total', result='written')
+        else:
+            last_used_buffer.add(auth_token.digest, auth_token.last_used)
+            metrics.increment('knox_last_used_updates_total', result='buffered')
+            last_used_buffer.flush_if_due()
+        return True
+
+    async def arecord_last_used(self, auth_token) -> bool:
+        '''
+        Asynchronous counterpart of `record_last_used`.
+        '''
+        if not knox_settings.TRACK_LAST_USED:
+            return False
+        metrics = get_metrics()
+        if not self._touch_token(auth_token):
+            metrics.increment('knox_last_used_updates_total', result='throttled')
+            return False
+        last_used_buffer = get_last_used_buffer()
+        if last_used_buffer is None:
+            if not await get_token_store().aupdate_last_used(auth_token):
+                self._reject_deleted_token(auth_token)
+            metrics.increment('knox_last_used_updates_total', result='written')
+        else:
+            last_used_buffer.add(auth_token.digest, auth_token.last_used)
+            metrics.increment('knox_last_used_updates_total', result='buffered')
+            await last_used_buffer.aflush_if_due()
+        return True
+
+    def validate_token_format(self, token) -> bool:
+        '''
+        Returns whether `token` can have been created by knox: a prefix of at
+        most `MAXIMUM_TOKEN_PREFIX_LENGTH` characters followed by as many
+        lowercase hexadecimal characters as knox creates for
+        `AUTH_TOKEN_CHARACTER_LENGTH` or one of the
+        `LEGACY_AUTH_TOKEN_CHARACTER_LENGTHS`.
+
+        Override this to accept tokens issued in another format, or to
+        require the prefixes your application issues.
+        '''
+        for length in self._get_token_string_lengths():
+            prefix_length = len(token) - length
+            if (0 <= prefix_length <= CONSTANTS.MAXIMUM_TOKEN_PREFIX_LENGTH and
+                    hex_characters.fullmatch(token, prefix_length) is not None):
+                return True
+        return False
+
+    def validate_user(self, auth_token):
+        if not auth_token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        if knox_settings.LAZY_USER:
+            return (LazyUser(auth_token.user), auth_token)
+        return (auth_token.user, auth_token)
 
+    def authenticate_header(self, request):
+        return knox_settings.AUTH_HEADER_PREFIX
+
+    def _authenticate_credentials(self, token):
+        token = self._decode_token(token)
+        digests = self._hash_token(token)
+
+        auth_token = self._get_known_token(token, digests)
+        if auth_token is not None:
+            if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                if self.renew_token(auth_token):
+                    cache_token(auth_token)
+            user, auth_token = self.validate_user(auth_token)
+            if self.record_last_used(auth_token):
+                cache_token(auth_token)
+            return (user, auth_token)
+        self._check_cached_invalid_digest(digests[0])
+
+        auth_token = self._get_token(token, digests)
+        if knox_settings.AUTO_REFRESH and auth_token.expiry:
+            self.renew_token(auth_token)
+        cache_token(auth_token)
+        user, auth_token = self.validate_user(auth_token)
+        if self.record_last_used(auth_token):
+            cache_token(auth_token)
+        return (user, auth_token)
+
+    async def _aauthenticate_credentials(self, token):
+        token = self._decode_token(token)
+        digests = self._hash_token(token)
+
+        auth_token = self._get_known_token(token, digests)
+        if auth_token is not None:
+            if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                if await self.arenew_token(auth_token):
+                    cache_token(auth_token)
+            user, auth_token = self.validate_user(auth_token)
+            if await self.arecord_last_used(auth_token):
+                cache_token(auth_token)
+            return (user, auth_token)
+        self._check_cached_invalid_digest(digests[0])
+
+        auth_token = await self._aget_token(token, digests)
+        if knox_settings.AUTO_REFRESH and auth_token.expiry:
+            await self.arenew_token(auth_token)
+        cache_token(auth_token)
+        user, auth_token = self.validate_user(auth_token)
+        if await self.arecord_last_used(auth_token):
+            cache_token(auth_token)
+        return (user, auth_token)
+
+    def _decode_token(self, token) -> str:
+        try:
+            token = token.decode("utf-8")
+        except UnicodeDecodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if self.validate_token_format(token):
+            return token
+        if not signing.is_signed_token(token):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        self._verify_signed_token(token)
+        return token
+
+    def _verify_signed_token(self, token) -> None:
+        '''
+        Checks the signature and, unless `AUTO_REFRESH` may have extended it,
+        the expiry of a signed token before it is looked up, so that forged
+        and expired tokens are rejected without touching the database.
+        '''
+        claims = signing.unsign_token(token)
+        if claims is None or not self.validate_token_format(
+                signing.get_random_part(token)):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not knox_settings.AUTO_REFRESH and self._is_expired(claims):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def _hash_token(self, token) -> list:
+        with get_metrics().timer(
+                'knox_authentication_stage_duration_seconds', stage='hash'):
+            return self._get_token_digests(token)
+
+    def _get_token_digests(self, token) -> list:
+        '''
+        Returns the digests the token may be stored under, the digest under
+        the current `SECURE_HASH_ALGORITHM` first.
+        '''
+        try:
+            return [hash_token(token), *hash_token_legacy(token)]
+        except (TypeError, binascii.Error):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def _check_token(self, auth_token, token) -> None:
+        if not compare_digest(auth_token.token_key,
+                              token[:CONSTANTS.TOKEN_KEY_LENGTH]):
+            cache_invalid_digest(auth_token.digest)
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def _get_token_string_lengths(self) -> set:
+        return {
+            get_token_string_length(length) for length in (
+                knox_settings.AUTH_TOKEN_CHARACTER_LENGTH,
+                *knox_settings.LEGACY_AUTH_TOKEN_CHARACTER_LENGTHS)
+        }
+
+    def _check_cached_invalid_digest(self, digest) -> None:
+        if is_cached_invalid_digest(digest):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def _get_deferred_user_fields(self) -> list:
+        user_model = get_token_model()._meta.get_field('user').related_model
+        # The username is sent with token_expired, also from async code
+        fetched = {user_model._meta.pk.name, 'is_active', user_model.USERNAME_FIELD}
+        return [f'user__{field.name}'
+                for field in user_model._meta.concrete_fields
+                if field.name not in fetched]
+
+    def _lookup_tokens(self, pending) -> dict:
+        '''
+        Returns the tokens stored under the digests of the `(token, digests)`
+        pairs in `pending`, by digest, fetched with a single `IN` query, and
+        another one on the write database for those a replica may lack.
+        '''
+        digests = [digest for _, token_digests in pending for digest in token_digests]
+        if not digests:
+            return {}
+        metrics = get_metrics()
+        metrics.increment('knox_token_lookups_total', source='database')
+        store = get_token_store()
+        queryset = self.get_token_queryset()
+        auth_tokens = store.get_many(digests, queryset)
+        write_queryset = store.get_write_queryset(queryset)
+        if write_queryset is None:
+            return auth_tokens
+        stale_digests = [
+            digest
+            for _, token_digests in pending
+            if self._may_be_stale(self._find_token(auth_tokens, token_digests))
+            for digest in token_digests
+        ]
+        if stale_digests:
+            metrics.increment('knox_token_lookups_total', source='fallback')
+            auth_tokens.update(store.get_many(stale_digests, write_queryset))
+        return auth_tokens
+
+    def _find_token(self, auth_tokens, digests):
+        for digest in digests:
+            if digest in auth_tokens:
+                return auth_tokens[digest]
+        return None
+
+    def _verify_cached_token(self, auth_token, record_use):
+        if record_use and knox_settings.AUTO_REFRESH and auth_token.expiry:
+            try:
+                if self.renew_token(auth_token):
+                    cache_token(auth_token)
+            except exceptions.AuthenticationFailed:
+                return INVALID_TOKEN
+        return self._get_verification(auth_token, record_use)
+
+    def _verify_token(self, auth_token, token, digests, record_use):
+        if auth_token is None:
+            cache_invalid_digest(digests[0])
+            return INVALID_TOKEN
+        try:
+            self._check_token(auth_token, token)
+        except exceptions.AuthenticationFailed:
+            return INVALID_TOKEN
+        apply_pending_expiry(auth_token)
+        if self._is_expired(auth_token):
+            return INVALID_TOKEN
+        if record_use and knox_settings.AUTO_REFRESH and auth_token.expiry:
             try:
-                digest = hash_token(token)
-            except (TypeError, binascii.Error):
-                raise exceptions.AuthenticationFailed(msg)
-            if compare_digest(digest, auth_token.digest):
-                if knox_settings.AUTO_REFRESH and auth_token.expiry:
-                    self.renew_token(auth_token)
-                return self.validate_user(auth_token)
-        raise exceptions.AuthenticationFailed(msg)
-
-    def renew_token(self, auth_token) -> None:
+                self.renew_token(auth_token)
+            except exceptions.AuthenticationFailed:
+                return INVALID_TOKEN
+        cache_token(auth_token)
+        return self._get_verification(auth_token, record_use)
+
+    def _get_verification(self, auth_token, record_use):
+        try:
+            self.validate_user(auth_token)
+            if record_use and self.record_last_used(auth_token):
+                cache_token(auth_token)
+        except exceptions.AuthenticationFailed:
+            return INVALID_TOKEN
+        return TokenVerification(True, auth_token.user_id, auth_token.expiry)
+
+    def _may_be_stale(self, auth_token) -> bool:
+        # A replica may not have caught up with a login or renewal yet
+        return auth_token is None or self._is_expired(auth_token)
+
+    def _get_token(self, token, digests):
+        metrics = get_metrics()
+        metrics.increment('knox_token_lookups_total', source='database')
+        store = get_token_store()
+        queryset = self.get_token_queryset()
+        with metrics.timer(
+                'knox_authentication_stage_duration_seconds', stage='lookup'):
+            auth_token = store.get(digests, queryset)
+            write_queryset = store.get_write_queryset(queryset)
+            if write_queryset is not None and self._may_be_stale(auth_token):
+                metrics.increment('knox_token_lookups_total', source='fallback')
+                auth_token = store.get(digests, write_queryset)
+        if auth_token is None:
+            cache_invalid_digest(digests[0])
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        self._check_token(auth_token, token)
+        apply_pending_expiry(auth_token)
+        with metrics.timer(
+                'knox_authentication_stage_duration_seconds', stage='cleanup'):
+            expired = self._cleanup_token(auth_token)
+        if expired:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return auth_token
+
+    async def _aget_token(self, token, digests):
+        metrics = get_metrics()
+        metrics.increment('knox_token_lookups_total', source='database')
+        store = get_token_store()
+        queryset = self.get_token_queryset()
+        with metrics.timer(
+                'knox_authentication_stage_duration_seconds', stage='lookup'):
+            auth_token = await store.aget(digests, queryset)
+            write_queryset = store.get_write_queryset(queryset)
+            if write_queryset is not None and self._may_be_stale(auth_token):
+                metrics.increment('knox_token_lookups_total', source='fallback')
+                auth_token = await store.aget(digests, write_queryset)
+        if auth_token is None:
+            cache_invalid_digest(digests[0])
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        self._check_token(auth_token, token)
+        apply_pending_expiry(auth_token)
+        with metrics.timer(
+                'knox_authentication_stage_duration_seconds', stage='cleanup'):
+            expired = await self._acleanup_token(auth_token)
+        if expired:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return auth_token
+
+    def _get_known_token(self, token, digests):
+        '''
+        Returns the token from the `TOKEN_CACHE` or, failing that, from the
+        claims of a trusted signed token, or `None` if it must be looked up.
+        '''
+        auth_token = self._get_cached_token(digests)
+        if auth_token is None:
+            auth_token = self._get_signed_token(token, digests[0])
+        return auth_token
+
+    def _get_signed_token(self, token, digest):
+        '''
+        Builds the token from its signed claims, without a query, while the
+        `REVOCATION_CHANNEL` vouches that it has not been revoked, see
+        `BaseRevocationChannel.is_trusted`. Tokens are looked up when
+        `AUTO_REFRESH` or `TRACK_LAST_USED` need the stored token.
+        '''
+        if (knox_settings.AUTO_REFRESH or knox_settings.TRACK_LAST_USED or
+                not signing.should_sign_tokens() or
+                not signing.is_signed_token(token)):
+            return None
+        revocation_channel = get_revocation_channel()
+        if revocation_channel is None:
+            return None
+        claims = signing.unsign_token(token)
+        if claims is None or claims.issued_at is None or self._is_expired(claims):
+            return None
+        poll_revocations()
+        if not revocation_channel.is_trusted(digest, claims.issued_at):
+            return None
+        token_model = get_token_model()
+        user_model = token_model._meta.get_field('user').related_model
+        user_pk = user_model._meta.pk.to_python(claims.user_pk)
+        # Deactivating a user revokes its tokens
+        values = {user_model._meta.pk.attname: user_pk, 'is_active': True}
+        names = [field.attname for field in user_model._meta.concrete_fields
+                 if field.attname in values]
+        # The other fields of the user are deferred
+        user = user_model.from_db(
+            router.db_for_read(user_model), names, [values[name] for name in names])
+        auth_token = token_model(
+            digest=digest, token_key=token[:CONSTANTS.TOKEN_KEY_LENGTH], user=user,
+            created=claims.issued_at, expiry=claims.expiry)
+        auth_token._state.adding = False
+        get_metrics().increment('knox_token_lookups_total', source='signature')
+        return auth_token
+
+    def _get_cached_token(self, digests):
+        token_cache = get_token_cache()
+        if token_cache is None:
+            return None
+        poll_revocations()
+        for digest in digests:
+            auth_token = token_cache.get(digest)
+            if auth_token is not None:
+                break
+        else:
+            return None
+        if self._is_expired(auth_token):
+            # Let the database lookup clean up and signal the expired token
+            token_cache.delete(digest)
+            return None
+        get_metrics().increment('knox_token_lookups_total', source='cache')
+        return auth_token
+
+    def _renew_expiry(self, auth_token) -> bool:
+        '''
+        Sets the renewed expiry on `auth_token`, returning whether the change
+        is large enough to be written to the database.
+        '''
         current_expiry = auth_token.expiry
         new_expiry = timezone.now() + knox_settings.TOKEN_TTL
 
@@ -89,31 +673,87 @@ class TokenAuthentication(BaseAuthentication):
 
         # Throttle refreshing of token to avoid db writes
         delta = (new_expiry - current_expiry).total_seconds()
-        if delta > knox_settings.MIN_REFRESH_INTERVAL:
-            auth_token.save(update_fields=('expiry',))
+        return delta > knox_settings.MIN_REFRESH_INTERVAL
 
-    def validate_user(self, auth_token):
-        if not auth_token.user.is_active:
-            raise exceptions.AuthenticationFailed(
-                _('User inactive or deleted.'))
-        return (auth_token.user, auth_token)
+    def _touch_token(self, auth_token) -> bool:
+        '''
+        Sets the last use time of `auth_token` to now, returning whether its
+        previous one, or the one pending in the `LAST_USED_BUFFER`, is old
+        enough for the change to be written.
+        '''
+        now = timezone.now()
+        last_used = auth_token.last_used
+        last_used_buffer = get_last_used_buffer()
+        if last_used_buffer is not None:
+            pending = last_used_buffer.get(auth_token.digest)
+            if pending is not None and (last_used is None or pending > last_used):
+                last_used = pending
+        if last_used is not None and (
+                (now - last_used).total_seconds() < knox_settings.LAST_USED_INTERVAL):
+            auth_token.last_used = last_used
+            return False
+        auth_token.last_used = now
+        return True
 
-    def authenticate_header(self, request):
-        return knox_settings.AUTH_HEADER_PREFIX
+    def _reject_deleted_token(self, auth_token) -> None:
+        '''
+        Rejects a token that another process deleted, e.g. on logout, while
+        it was in the `TOKEN_CACHE` of this one, dropping it from the cache.
+        '''
+        token_cache = get_token_cache()
+        if token_cache is not None:
+            token_cache.delete(auth_token.digest)
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def _is_expired(self, auth_token) -> bool:
+        return auth_token.expiry is not None and auth_token.expiry < timezone.now()
 
     def _cleanup_token(self, auth_token) -> bool:
-        for other_token in auth_token.user.auth_token_set.all():
-            if other_token.digest != auth_token.digest and other_token.expiry:
-                if other_token.expiry < timezone.now():
-                    other_token.delete()
-                    username = other_token.user.get_username()
-                    token_expired.send(sender=self.__class__,
-                                       username=username, source="other_token")
-        if auth_token.expiry is not None:
-            if auth_token.expiry < timezone.now():
-                username = auth_token.user.get_username()
-                auth_token.delete()
-                token_expired.send(sender=self.__class__,
-                                   username=username, source="auth_token")
-                return True
+        store = get_token_store()
+        if knox_settings.INLINE_TOKEN_CLEANUP:
+            for other_token in self._get_expired_other_tokens(auth_token):
+                if self._is_expired_other_token(other_token):
+                    store.delete(other_token)
+                    self._send_token_expired(auth_token, "other_token")
+        if self._is_expired(auth_token):
+            store.delete(auth_token)
+            self._send_token_expired(auth_token, "auth_token")
+            return True
+        return False
+
+    async def _acleanup_token(self, auth_token) -> bool:
+        store = get_token_store()
+        if knox_settings.INLINE_TOKEN_CLEANUP:
+            for other_token in await store.aget_expired_for_user(
+                    auth_token.user, exclude=auth_token):
+                if self._is_expired_other_token(other_token):
+                    await store.adelete(other_token)
+                    self._send_token_expired(auth_token, "other_token")
+        if self._is_expired(auth_token):
+            await store.adelete(auth_token)
+            self._send_token_expired(auth_token, "auth_token")
+            return True
         return False
+
+    def _get_expired_other_tokens(self, auth_token):
+        return get_token_store().get_expired_for_user(
+            auth_token.user, exclude=auth_token)
+
+    def _is_expired_other_token(self, other_token) -> bool:
+        apply_pending_expiry(other_token)
+        return self._is_expired(other_token)
+
+    def _send_token_expired(self, auth_token, source) -> None:
+        get_metrics().increment('knox_expired_tokens_deleted_total', source=source)
+        token_expired.send(sender=self.__class__,
+                           username=auth_token.user.get_username(), source=source)
+
+
+class AsyncTokenAuthentication(TokenAuthentication):
+    '''
+    `TokenAuthentication` whose `authenticate` is a coroutine, for use with
+    async views such as those in `knox.async_views`.
+    '''
+
+    async def authenticate(self, request):
+        return await self.aauthenticate(request)
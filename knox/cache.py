@@ -0,0 +1,243 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import router
+from django.utils import timezone
+
+from knox.models import get_token_model
+from knox.settings import knox_settings
+
+_token_cache = None
+_negative_token_cache = None
+
+
+class BaseTokenCache:
+    '''
+    Stores verified `AuthToken` instances, together with their user, keyed by
+    the token digest so `TokenAuthentication` can skip the database on a hit.
+    '''
+
+    def get(self, digest):
+        raise NotImplementedError
+
+    def set(self, digest, auth_token, timeout) -> None:
+        raise NotImplementedError
+
+    def delete_many(self, digests) -> None:
+        raise NotImplementedError
+
+    def delete(self, digest) -> None:
+        self.delete_many([digest])
+
+    def clear(self) -> None:
+        '''
+        Drops every cached token. Caches shared by all processes see every
+        deletion and need not implement this.
+        '''
+
+
+class DjangoTokenCache(BaseTokenCache):
+    '''
+    Token cache backed by the Django cache named by `TOKEN_CACHE_ALIAS`.
+
+    Since that cache is shared, only a snapshot of the user is stored with
+    a token: its primary key, `is_active`, username and `user_fields`. The
+    other fields, such as the password hash, are loaded on access.
+    '''
+    key_prefix = 'knox:token:'
+    user_fields = ()
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or knox_settings.TOKEN_CACHE_ALIAS]
+
+    def make_key(self, digest) -> str:
+        return self.key_prefix + digest
+
+    def get(self, digest):
+        return self.cache.get(self.make_key(digest))
+
+    def set(self, digest, auth_token, timeout) -> None:
+        self.cache.set(self.make_key(digest), self.get_snapshot(auth_token), timeout)
+
+    def delete_many(self, digests) -> None:
+        self.cache.delete_many([self.make_key(digest) for digest in digests])
+
+    def get_snapshot(self, auth_token):
+        user = auth_token.user
+        user_fields = {
+            user._meta.pk.attname, 'is_active', user.USERNAME_FIELD, *self.user_fields}
+        snapshot = _copy_fields(
+            auth_token, [field.attname for field in auth_token._meta.concrete_fields])
+        snapshot.user = _copy_fields(user, user_fields)
+        return snapshot
+
+
+class LocMemTokenCache(BaseTokenCache):
+    '''
+    In-process LRU token cache bounded by `TOKEN_CACHE_MAX_SIZE` entries.
+
+    Entries are pickled so that callers never share mutable instances
+    across requests or threads.
+    '''
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or knox_settings.TOKEN_CACHE_MAX_SIZE
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            try:
+                expires_at, value = self._data[digest]
+            except KeyError:
+                return None
+            if expires_at <= time.monotonic():
+                del self._data[digest]
+                return None
+            self._data.move_to_end(digest)
+        return pickle.loads(value)
+
+    def set(self, digest, auth_token, timeout) -> None:
+        value = pickle.dumps(auth_token, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[digest] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(digest)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, digests) -> None:
+        with self._lock:
+            for digest in digests:
+                self._data.pop(digest, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DjangoNegativeTokenCache(DjangoTokenCache):
+    '''
+    Negative token cache backed by the Django cache named by
+    `TOKEN_CACHE_ALIAS`.
+    '''
+    key_prefix = 'knox:invalid:'
+
+    def get_snapshot(self, value):
+        return value
+
+
+class LocMemNegativeTokenCache(LocMemTokenCache):
+    '''
+    In-process LRU negative token cache bounded by
+    `NEGATIVE_TOKEN_CACHE_MAX_SIZE` entries.
+    '''
+
+    def __init__(self, max_size=None):
+        super().__init__(max_size or knox_settings.NEGATIVE_TOKEN_CACHE_MAX_SIZE)
+
+
+def _copy_fields(instance, attnames):
+    '''
+    Returns a copy of a model instance holding only the given fields, of
+    those it has loaded, and deferring the others.
+    '''
+    loaded = instance.__dict__
+    names = [
+        field.attname for field in instance._meta.concrete_fields
+        if field.attname in attnames and field.attname in loaded
+    ]
+    return type(instance).from_db(
+        instance._state.db, names, [loaded[name] for name in names])
+
+
+def get_token_cache():
+    '''
+    Return the token cache configured by `TOKEN_CACHE`, or `None` when
+    token caching is disabled.
+    '''
+    global _token_cache
+    cache_class = knox_settings.TOKEN_CACHE
+    if cache_class is None:
+        return None
+    if type(_token_cache) is not cache_class:
+        _token_cache = cache_class()
+    return _token_cache
+
+
+def get_cache_timeout(auth_token) -> float:
+    '''
+    Cache a token for at most `TOKEN_CACHE_TTL` seconds and never past its
+    expiry.
+    '''
+    timeout = knox_settings.TOKEN_CACHE_TTL
+    if auth_token.expiry is not None:
+        remaining = (auth_token.expiry - timezone.now()).total_seconds()
+        timeout = min(timeout, remaining)
+    return timeout
+
+
+def cache_token(auth_token) -> None:
+    token_cache = get_token_cache()
+    if token_cache is None:
+        return
+    timeout = get_cache_timeout(auth_token)
+    if timeout > 0:
+        token_cache.set(auth_token.digest, auth_token, timeout)
+
+
+def get_negative_token_cache():
+    '''
+    Return the cache of rejected token digests configured by
+    `NEGATIVE_TOKEN_CACHE`, or `None` when it is disabled.
+    '''
+    global _negative_token_cache
+    cache_class = knox_settings.NEGATIVE_TOKEN_CACHE
+    if cache_class is None:
+        return None
+    if type(_negative_token_cache) is not cache_class:
+        _negative_token_cache = cache_class()
+    return _negative_token_cache
+
+
+def cache_invalid_digest(digest) -> None:
+    negative_token_cache = get_negative_token_cache()
+    if negative_token_cache is not None:
+        negative_token_cache.set(
+            digest, True, knox_settings.NEGATIVE_TOKEN_CACHE_TTL)
+
+
+def is_cached_invalid_digest(digest) -> bool:
+    negative_token_cache = get_negative_token_cache()
+    return (negative_token_cache is not None and
+            negative_token_cache.get(digest) is not None)
+
+
+def invalidate_token(sender, instance, **kwargs):
+    '''
+    `post_delete` receiver for the token model.
+    '''
+    token_cache = get_token_cache()
+    if token_cache is not None:
+        token_cache.delete(instance.digest)
+
+
+def invalidate_user_tokens(sender, instance, **kwargs):
+    '''
+    `post_save` receiver for the user model, dropping every cached token of
+    a user that has been deactivated.
+    '''
+    if getattr(instance, 'is_active', True):
+        return
+    token_cache = get_token_cache()
+    if token_cache is None:
+        return
+    token_model = get_token_model()
+    digests = token_model.objects.using(router.db_for_write(token_model)).filter(
+        user=instance).values_list('digest', flat=True)
+    token_cache.delete_many(list(digests))
@@ -1,9 +1,26 @@
 import binascii
+import hashlib
+import hmac
 from os import urandom as generate_bytes
 
 from knox.settings import knox_settings
 
 hash_func = knox_settings.SECURE_HASH_ALGORITHM
+hash_pepper = knox_settings.SECURE_HASH_PEPPER
+hash_digest_size = knox_settings.SECURE_HASH_DIGEST_SIZE
+legacy_hash_funcs = knox_settings.LEGACY_SECURE_HASH_ALGORITHMS
+
+if isinstance(hash_pepper, str):
+    hash_pepper = hash_pepper.encode()
+
+
+def get_token_string_length(character_length) -> int:
+    """
+    Returns the length of the token strings created with
+    `AUTH_TOKEN_CHARACTER_LENGTH` set to `character_length`, which is rounded
+    down to a whole number of bytes.
+    """
+    return int(character_length / 2) * 2
 
 
 def create_token_string() -> str:
@@ -43,8 +60,9 @@ def hash_token(token: str) -> str:
     """
     Calculates the hash of a token.
 
-    Uses the hash algorithm specified in knox_settings.SECURE_HASH_ALGORITHM.
-    The token is first converted to a hex-compatible format before hashing.
+    Uses the hash algorithm specified in knox_settings.SECURE_HASH_ALGORITHM,
+    keyed with knox_settings.SECURE_HASH_PEPPER and shortened to
+    knox_settings.SECURE_HASH_DIGEST_SIZE bytes when these are set.
 
     Args:
         token (str): The token string to hash.
@@ -56,6 +74,58 @@ def hash_token(token: str) -> str:
         >>> hash_token("abc123")
         'a123f...'  # The actual hash will be longer
     """
-    digest = hash_func()
-    digest.update(make_hex_compatible(token))
+    return make_digest(
+        hash_func, token.encode(), key=hash_pepper, digest_size=hash_digest_size)
+
+
+def hash_token_legacy(token: str) -> list:
+    """
+    Calculates the hashes a token created before the current
+    SECURE_HASH_ALGORITHM was configured may be stored under.
+
+    Uses each algorithm in knox_settings.LEGACY_SECURE_HASH_ALGORITHMS,
+    unkeyed and with its full digest size.
+
+    Args:
+        token (str): The token string to hash.
+
+    Returns:
+        list: The hexadecimal representations of the token's legacy digests.
+    """
+    data = token.encode()
+    return [make_digest(legacy_hash_func, data) for legacy_hash_func in legacy_hash_funcs]
+
+
+def make_digest(hash_func, data: bytes, key=None, digest_size=None) -> str:
+    """
+    Calculates a hexadecimal digest of data.
+
+    BLAKE2 is keyed and sized natively. Other algorithms are keyed with HMAC
+    and have their digest truncated.
+
+    Args:
+        hash_func: The hash algorithm constructor, e.g. hashlib.blake2b.
+        data (bytes): The data to hash.
+        key (bytes): An optional secret key.
+        digest_size (int): An optional digest size in bytes.
+
+    Returns:
+        str: The hexadecimal representation of the digest.
+    """
+    if hash_func in (hashlib.blake2b, hashlib.blake2s):
+        options = {}
+        if key:
+            options['key'] = key
+        if digest_size:
+            options['digest_size'] = digest_size
+        digest = hash_func(**options)
+        digest.update(data)
+        return digest.hexdigest()
+    if key:
+        digest = hmac.new(key, data, hash_func)
+    else:
+        digest = hash_func()
+        digest.update(data)
+    if digest_size:
+        return digest.digest()[:digest_size].hex()
     return digest.hexdigest()
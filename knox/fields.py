@@ -0,0 +1,49 @@
+from django.db import models
+
+from knox.settings import CONSTANTS
+
+
+class BinaryDigestField(models.BinaryField):
+    '''
+    Stores a hexadecimal token digest as raw bytes, half the size of its hex
+    text in the table and its indexes.
+
+    Values are hexadecimal strings in Python, so tokens are created and
+    looked up by digest exactly as with a `CharField`.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', CONSTANTS.DIGEST_LENGTH // 2)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        # BLOB columns cannot be primary keys on MySQL and Oracle
+        if connection.vendor == 'mysql':
+            return f'varbinary({self.max_length})'
+        if connection.vendor == 'oracle':
+            return f'RAW({self.max_length})'
+        return super().db_type(connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return bytes(value).hex()
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value).hex()
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if isinstance(value, str):
+            try:
+                return bytes.fromhex(value)
+            except ValueError as e:
+                raise e.__class__(
+                    f"Field '{self.name}' expected a hexadecimal digest "
+                    f"but got {value!r}.") from e
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
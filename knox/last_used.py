@@ -0,0 +1,54 @@
+from knox.refresh import CacheRefreshBuffer, LocMemRefreshBuffer
+from knox.settings import knox_settings
+from knox.stores import get_token_store
+
+_last_used_buffer = None
+
+
+class LastUsedBufferMixin:
+    '''
+    Makes a refresh buffer hold the last use times recorded with
+    `TRACK_LAST_USED` instead of expiries. They are flushed like renewals,
+    at most `AUTO_REFRESH_FLUSH_INTERVAL` seconds apart or once
+    `AUTO_REFRESH_BUFFER_SIZE` are pending, with the `TOKEN_STORE`.
+    '''
+
+    def write(self, pending) -> None:
+        get_token_store().update_last_used_many(pending)
+
+    async def awrite(self, pending) -> None:
+        await get_token_store().aupdate_last_used_many(pending)
+
+
+class LocMemLastUsedBuffer(LastUsedBufferMixin, LocMemRefreshBuffer):
+    '''
+    Keeps pending last use times in process memory.
+    '''
+
+
+class CacheLastUsedBuffer(LastUsedBufferMixin, CacheRefreshBuffer):
+    '''
+    Keeps pending last use times in the Django cache named by
+    `TOKEN_CACHE_ALIAS`, so that a use recorded by one process spares the
+    others a write for `LAST_USED_INTERVAL` seconds.
+    '''
+    key_prefix = 'knox:last_used:'
+
+    def get_timeout(self, last_used) -> float:
+        # Kept until flushed, and while it is recent enough to skip a write
+        return max(knox_settings.LAST_USED_INTERVAL,
+                   knox_settings.AUTO_REFRESH_FLUSH_INTERVAL)
+
+
+def get_last_used_buffer():
+    '''
+    Return the buffer configured by `LAST_USED_BUFFER`, or `None` when last
+    use times are written immediately.
+    '''
+    global _last_used_buffer
+    buffer_class = knox_settings.LAST_USED_BUFFER
+    if buffer_class is None:
+        return None
+    if type(_last_used_buffer) is not buffer_class:
+        _last_used_buffer = buffer_class()
+    return _last_used_buffer
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from knox.settings import CONSTANTS, knox_settings
+from knox.stores import get_token_store
+
+
+class Command(BaseCommand):
+    help = 'Create knox tokens in bulk and print them as "<username> <token>".'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='+',
+            help='Users to create tokens for.')
+        parser.add_argument(
+            '--count', type=int, default=1,
+            help='Number of tokens created per user (default: 1).')
+        expiry = parser.add_mutually_exclusive_group()
+        expiry.add_argument(
+            '--ttl', type=int,
+            help='Token lifetime in seconds (default: TOKEN_TTL).')
+        expiry.add_argument(
+            '--no-expiry', action='store_true',
+            help='Create tokens that never expire.')
+        parser.add_argument(
+            '--prefix', default=knox_settings.TOKEN_PREFIX,
+            help='Token prefix (default: TOKEN_PREFIX).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of tokens inserted per query (default: 1000).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        usernames = options['usernames']
+        users = User._default_manager.in_bulk(usernames, field_name=User.USERNAME_FIELD)
+        missing = [username for username in usernames if username not in users]
+        if missing:
+            raise CommandError('Unknown user(s): %s' % ', '.join(missing))
+
+        if len(options['prefix']) > CONSTANTS.MAXIMUM_TOKEN_PREFIX_LENGTH:
+            raise CommandError('Illegal prefix length')
+
+        if options['no_expiry']:
+            expiry = None
+        elif options['ttl'] is not None:
+            expiry = timedelta(seconds=options['ttl'])
+        else:
+            expiry = knox_settings.TOKEN_TTL
+
+        created = get_token_store().bulk_create(
+            [users[username] for username in usernames for _ in range(options['count'])],
+            expiry=expiry,
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+        )
+        for instance, token in created:
+            self.stdout.write(f'{instance.user.get_username()} {token}')
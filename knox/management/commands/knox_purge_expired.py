@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from knox.stores import get_token_store
+
+
+class Command(BaseCommand):
+    help = 'Delete expired knox tokens in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of tokens deleted per query (default: 1000).')
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to sleep between batches (default: 0).')
+        parser.add_argument(
+            '--send-signals', action='store_true',
+            help='Send the token_expired signal for every deleted token.')
+
+    def handle(self, *args, **options):
+        deleted = get_token_store().purge_expired(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            send_signals=options['send_signals'],
+        )
+        self.stdout.write(f'Deleted {deleted} expired token(s).')
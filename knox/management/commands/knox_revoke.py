@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from knox.stores import get_token_store
+
+
+class Command(BaseCommand):
+    help = 'Revoke knox tokens in batches, e.g. to log users out during an incident.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-ids', nargs='+', metavar='USER_ID',
+            help='Only revoke the tokens of these users.')
+        parser.add_argument(
+            '--created-before', type=self.parse_datetime, metavar='DATETIME',
+            help='Only revoke tokens created before this ISO 8601 datetime.')
+        parser.add_argument(
+            '--prefix',
+            help='Only revoke tokens starting with this prefix.')
+        parser.add_argument(
+            '--last-used-before', type=self.parse_datetime, metavar='DATETIME',
+            help='Only revoke tokens not used since this ISO 8601 datetime '
+                 '(requires TRACK_LAST_USED).')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Revoke every token when no other filter is given.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of tokens deleted per query (default: 1000).')
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to sleep between batches (default: 0).')
+        parser.add_argument(
+            '--send-signals', action='store_true',
+            help='Send token_expired for every token and user_logged_out for every user.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only print the number of tokens that would be revoked.')
+
+    def parse_datetime(self, value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def handle(self, *args, **options):
+        filters = {
+            'user_ids': options['user_ids'],
+            'created_before': options['created_before'],
+            'prefix': options['prefix'],
+            'last_used_before': options['last_used_before'],
+        }
+        # An empty prefix does not narrow down the tokens, see filter_tokens
+        filtered = any(filters.values())
+        if not filtered and not options['all']:
+            raise CommandError(
+                'Pass --user-ids, --created-before, --prefix or '
+                '--last-used-before, or --all to revoke every token.')
+
+        store = get_token_store()
+        if options['dry_run']:
+            count = store.count_tokens(**filters)
+            self.stdout.write(f'Would revoke {count} token(s).')
+            return
+
+        revoked = store.revoke(
+            **filters,
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            send_signals=options['send_signals'],
+        )
+        self.stdout.write(f'Revoked {revoked} token(s).')
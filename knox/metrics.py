@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+from knox.settings import knox_settings
+
+_metrics = None
+
+# Metrics emitted by knox, with their type and labels
+METRICS = {
+    'knox_authentication_duration_seconds': ('histogram', ()),
+    'knox_authentications_total': ('counter', ('result',)),
+    'knox_authentication_stage_duration_seconds': ('histogram', ('stage',)),
+    'knox_token_lookups_total': ('counter', ('source',)),
+    'knox_token_renewals_total': ('counter', ('result',)),
+    'knox_last_used_updates_total': ('counter', ('result',)),
+    'knox_expired_tokens_deleted_total': ('counter', ('source',)),
+    'knox_tokens_created_total': ('counter', ()),
+    'knox_logins_total': ('counter', ('result',)),
+    'knox_tokens_evicted_total': ('counter', ()),
+    'knox_token_refreshes_total': ('counter', ()),
+    'knox_logouts_total': ('counter', ('scope',)),
+    'knox_tokens_revoked_total': ('counter', ()),
+    'knox_token_verifications_total': ('counter', ('result',)),
+}
+
+
+class BaseMetrics:
+    '''
+    Receives the counters and timings knox emits, see `METRICS` for their
+    names and labels. Subclass it to forward them to a metrics library.
+    '''
+
+    def increment(self, name, value=1, **labels) -> None:
+        raise NotImplementedError
+
+    def observe(self, name, value, **labels) -> None:
+        '''
+        Records a sample, e.g. a duration in seconds, of a histogram.
+        '''
+        raise NotImplementedError
+
+    def timer(self, name, **labels):
+        '''
+        Returns a context manager observing the seconds spent in its block.
+        '''
+        return Timer(self, name, labels)
+
+
+class Timer:
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(
+            self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class NullMetrics(BaseMetrics):
+    '''
+    Discards every metric. This is the default.
+    '''
+    _timer = nullcontext()
+
+    def increment(self, name, value=1, **labels) -> None:
+        pass
+
+    def observe(self, name, value, **labels) -> None:
+        pass
+
+    def timer(self, name, **labels):
+        return self._timer
+
+
+class InMemoryMetrics(BaseMetrics):
+    '''
+    Keeps every metric in memory, for tests and debugging.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = defaultdict(int)
+            self.observations = defaultdict(list)
+
+    def increment(self, name, value=1, **labels) -> None:
+        with self._lock:
+            self.counters[self._make_key(name, labels)] += value
+
+    def observe(self, name, value, **labels) -> None:
+        with self._lock:
+            self.observations[self._make_key(name, labels)].append(value)
+
+    def get_count(self, name, **labels) -> int:
+        return self.counters.get(self._make_key(name, labels), 0)
+
+    def get_observations(self, name, **labels) -> list:
+        return list(self.observations.get(self._make_key(name, labels), ()))
+
+    def _make_key(self, name, labels) -> tuple:
+        return (name, *sorted(labels.items()))
+
+
+def get_metrics():
+    '''
+    Return the metrics backend configured by `METRICS`.
+    '''
+    global _metrics
+    metrics_class = knox_settings.METRICS
+    if type(_metrics) is not metrics_class:
+        _metrics = metrics_class()
+    return _metrics
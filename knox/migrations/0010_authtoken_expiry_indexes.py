@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knox', '0009_extend_authtoken_field'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='authtoken',
+            index=models.Index(fields=['user', 'expiry'], name='knox_authto_user_id_289448_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authtoken',
+            index=models.Index(fields=['expiry'], name='knox_authto_expiry_7e9d99_idx'),
+        ),
+    ]
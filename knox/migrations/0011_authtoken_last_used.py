@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knox', '0010_authtoken_expiry_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authtoken',
+            name='last_used',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
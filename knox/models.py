@@ -1,11 +1,22 @@
+import time
+from datetime import datetime, timedelta
+
 from django.apps import apps
 from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
 from django.core.exceptions import ImproperlyConfigured
-from django.db import models
+from django.db import models, router
+from django.db.models import Q
+from django.db.models.deletion import (
+    DO_NOTHING, get_candidate_relations_to_delete,
+)
 from django.utils import timezone
 
-from knox import crypto
+from knox import crypto, signing
+from knox.fields import BinaryDigestField
+from knox.metrics import get_metrics
 from knox.settings import CONSTANTS, knox_settings
+from knox.signals import token_expired
 
 sha = knox_settings.SECURE_HASH_ALGORITHM
 
@@ -20,14 +31,279 @@ class AuthTokenManager(models.Manager):
         prefix=knox_settings.TOKEN_PREFIX,
         **kwargs
     ):
+        token, fields = self._new_token(user, expiry, prefix)
+        instance = super().create(**fields, **kwargs)
+        get_metrics().increment('knox_tokens_created_total')
+        return instance, token
+
+    async def acreate(
+        self,
+        user,
+        expiry=knox_settings.TOKEN_TTL,
+        prefix=knox_settings.TOKEN_PREFIX,
+        **kwargs
+    ):
+        token, fields = self._new_token(user, expiry, prefix)
+        instance = await super().acreate(**fields, **kwargs)
+        get_metrics().increment('knox_tokens_created_total')
+        return instance, token
+
+    def bulk_create_tokens(
+        self,
+        users_or_specs,
+        expiry=knox_settings.TOKEN_TTL,
+        prefix=knox_settings.TOKEN_PREFIX,
+        batch_size=1000,
+    ):
+        '''
+        Create a token for each given user with as few INSERTs as possible.
+
+        Each item is either a user or a dict with a `user` key and optional
+        `expiry`, `prefix` and extra model field values overriding the
+        defaults for that token.
+
+        Returns a list of `(instance, token)` pairs in input order.
+        '''
+        instances = []
+        tokens = []
+        for item in users_or_specs:
+            spec = dict(item) if isinstance(item, dict) else {'user': item}
+            token, fields = self._new_token(
+                spec.pop('user'), spec.pop('expiry', expiry), spec.pop('prefix', prefix))
+            instances.append(self.model(**fields, **spec))
+            tokens.append(token)
+        instances = self.bulk_create(instances, batch_size=batch_size)
+        get_metrics().increment('knox_tokens_created_total', len(instances))
+        return list(zip(instances, tokens))
+
+    def _new_token(self, user, expiry, prefix):
         token = prefix + crypto.create_token_string()
-        digest = crypto.hash_token(token)
         if expiry is not None:
             expiry = timezone.now() + expiry
-        instance = super().create(
-            token_key=token[:CONSTANTS.TOKEN_KEY_LENGTH], digest=digest,
-            user=user, expiry=expiry, **kwargs)
-        return instance, token
+        if signing.should_sign_tokens():
+            token = signing.sign_token(token, user, expiry)
+        digest = crypto.hash_token(token)
+        return token, {
+            'token_key': token[:CONSTANTS.TOKEN_KEY_LENGTH],
+            'digest': digest,
+            'user': user,
+            'expiry': expiry,
+        }
+
+    def live(self):
+        '''
+        Returns the tokens that may still be valid, which authentication looks
+        tokens up in. Expired tokens are included so that they can be cleaned
+        up when presented.
+        '''
+        return self.all()
+
+    def purge_expired(self, batch_size=1000, sleep=0, send_signals=False):
+        '''
+        Delete tokens that expired before now in batches of `batch_size`,
+        sleeping `sleep` seconds between batches.
+
+        Tokens with a pending `AUTO_REFRESH` extension are not deleted; their
+        extended expiry is written instead.
+
+        Batches are read from the database tokens are deleted from, never
+        from a lagging read replica.
+
+        Returns the number of deleted tokens.
+        '''
+        now = timezone.now()
+        fields = ['pk']
+        if send_signals:
+            user_model = self.model._meta.get_field('user').related_model
+            fields.append('user__' + user_model.USERNAME_FIELD)
+        database = router.db_for_write(self.model)
+        expired_tokens = self.using(database).filter(expiry__lt=now)
+        deleted = 0
+        while True:
+            batch = list(expired_tokens.values_list(*fields)[:batch_size])
+            if not batch:
+                return deleted
+            extended = self._write_pending_expiries([row[0] for row in batch], now)
+            expired = [row for row in batch if row[0] not in extended]
+            expired_tokens.filter(pk__in=[row[0] for row in expired]).delete()
+            deleted += len(expired)
+            get_metrics().increment(
+                'knox_expired_tokens_deleted_total', len(expired), source='purge')
+            if send_signals:
+                for _, username in expired:
+                    token_expired.send(sender=self.model, username=username,
+                                       source="purge")
+            if len(batch) < batch_size:
+                return deleted
+            if sleep:
+                time.sleep(sleep)
+
+    def filter_tokens(
+        self,
+        tokens=None,
+        user_ids=None,
+        created_before=None,
+        prefix=None,
+        last_used_before=None,
+    ):
+        '''
+        Returns `tokens`, all tokens by default, narrowed down as `revoke`
+        does.
+        '''
+        tokens = self.all() if tokens is None else tokens
+        if user_ids is not None:
+            tokens = tokens.filter(user__in=user_ids)
+        if created_before is not None:
+            tokens = tokens.filter(created__lt=created_before)
+        if last_used_before is not None:
+            tokens = tokens.filter(
+                Q(last_used__lt=last_used_before) |
+                Q(last_used__isnull=True, created__lt=last_used_before))
+        if prefix:
+            tokens = tokens.filter(token_key__startswith=prefix)
+        return tokens
+
+    def revoke(
+        self,
+        tokens=None,
+        user_ids=None,
+        created_before=None,
+        prefix=None,
+        last_used_before=None,
+        batch_size=1000,
+        sleep=0,
+        send_signals=False,
+    ):
+        '''
+        Delete tokens in batches of `batch_size` with a single `DELETE` per
+        batch, sleeping `sleep` seconds between batches.
+
+        `tokens` is a queryset of the tokens to revoke, all tokens by default,
+        narrowed down to the tokens of the users with the given `user_ids`,
+        created before `created_before`, whose key starts with `prefix` and
+        not used since `last_used_before`, see `TRACK_LAST_USED`. Tokens
+        never used count as used when they were created.
+
+        The revoked tokens are dropped from the `TOKEN_CACHE` and published
+        to the `REVOCATION_CHANNEL` once per batch. With `send_signals`,
+        `token_expired` is sent for each token and `user_logged_out` once per
+        user.
+
+        Returns the number of revoked tokens.
+        '''
+        database = router.db_for_write(self.model)
+        tokens = self.filter_tokens(
+            tokens, user_ids, created_before, prefix, last_used_before).using(database)
+        logged_out = set()
+        revoked = 0
+        while True:
+            batch = list(tokens.values_list('pk', 'user')[:batch_size])
+            if not batch:
+                break
+            self._delete_revoked([digest for digest, _ in batch], database)
+            revoked += len(batch)
+            if send_signals:
+                self._send_revocation_signals(batch, database, logged_out)
+            if len(batch) < batch_size:
+                break
+            if sleep:
+                time.sleep(sleep)
+        get_metrics().increment('knox_tokens_revoked_total', revoked)
+        return revoked
+
+    def update_expiries(self, expiries) -> None:
+        '''
+        Bulk update token expiries from a mapping of digest to expiry.
+        '''
+        self.bulk_update(
+            [self.model(pk=digest, expiry=expiry) for digest, expiry in expiries.items()],
+            ['expiry'],
+        )
+
+    async def aupdate_expiries(self, expiries) -> None:
+        await self.abulk_update(
+            [self.model(pk=digest, expiry=expiry) for digest, expiry in expiries.items()],
+            ['expiry'],
+        )
+
+    def update_last_used(self, last_used) -> None:
+        '''
+        Bulk update the last use times of tokens from a mapping of digest to
+        time.
+        '''
+        self.bulk_update(
+            [self.model(pk=digest, last_used=time) for digest, time in last_used.items()],
+            ['last_used'],
+        )
+
+    async def aupdate_last_used(self, last_used) -> None:
+        await self.abulk_update(
+            [self.model(pk=digest, last_used=time) for digest, time in last_used.items()],
+            ['last_used'],
+        )
+
+    def _can_raw_delete(self) -> bool:
+        '''
+        Returns whether tokens can be deleted with a single `DELETE`,
+        bypassing the deletion collector, i.e. whether no rows referring to
+        tokens of a custom token model have to be cascaded or nulled.
+        '''
+        opts = self.model._meta
+        return (
+            all(related.field.remote_field.on_delete is DO_NOTHING
+                for related in get_candidate_relations_to_delete(opts)) and
+            not any(hasattr(field, 'bulk_related_objects')
+                    for field in opts.private_fields)
+        )
+
+    def _delete_revoked(self, digests, database) -> None:
+        from knox.cache import get_token_cache
+        from knox.revocation import publish_revocations
+
+        tokens = self.using(database).filter(pk__in=digests)
+        if not self._can_raw_delete():
+            # The post_delete receivers invalidate and publish each token
+            tokens.delete()
+            return
+        # Replaces the post_delete receivers, which would invalidate and
+        # publish each token on its own
+        tokens._raw_delete(database)
+        token_cache = get_token_cache()
+        if token_cache is not None:
+            token_cache.delete_many(digests)
+        publish_revocations(digests, using=database)
+
+    def _send_revocation_signals(self, batch, database, logged_out) -> None:
+        '''
+        Sends `token_expired` for each revoked `(digest, user id)` pair of
+        `batch` and `user_logged_out` for each user not in `logged_out` yet.
+        '''
+        user_model = self.model._meta.get_field('user').related_model
+        users = user_model._default_manager.using(database).in_bulk(
+            {user_id for _, user_id in batch})
+        for _, user_id in batch:
+            if user_id in users:
+                token_expired.send(sender=self.model,
+                                   username=users[user_id].get_username(),
+                                   source="revoke")
+        for user_id in users.keys() - logged_out:
+            user_logged_out.send(sender=user_model, request=None, user=users[user_id])
+        logged_out.update(users)
+
+    def _write_pending_expiries(self, digests, now):
+        from knox.refresh import get_refresh_buffer
+
+        refresh_buffer = get_refresh_buffer()
+        if refresh_buffer is None:
+            return set()
+        pending = {
+            digest: expiry
+            for digest, expiry in refresh_buffer.get_many(digests).items()
+            if expiry > now
+        }
+        if pending:
+            self.update_expiries(pending)
+        return set(pending)
 
 
 class AbstractAuthToken(models.Model):
@@ -45,16 +321,161 @@ class AbstractAuthToken(models.Model):
                              related_name='auth_token_set', on_delete=models.CASCADE)
     created = models.DateTimeField(auto_now_add=True)
     expiry = models.DateTimeField(null=True, blank=True)
+    # Only maintained with TRACK_LAST_USED
+    last_used = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         abstract = True
+        indexes = [
+            # Active token counts and expired token cleanup per user
+            models.Index(fields=['user', 'expiry']),
+            # Purging expired tokens
+            models.Index(fields=['expiry']),
+        ]
 
     def __str__(self) -> str:
         return f'{self.digest} : {self.user}'
 
 
+class ExpiryBucketAuthTokenManager(AuthTokenManager):
+
+    def live(self):
+        '''
+        Returns the tokens of buckets that have not ended yet, and those that
+        never expire.
+
+        With an `AUTO_REFRESH_BUFFER`, buckets are kept for another
+        `AUTO_REFRESH_FLUSH_INTERVAL` seconds, so that tokens renewed just
+        before their bucket ended are found with their pending extension.
+        '''
+        current_bucket = self.model.get_expiry_bucket(
+            timezone.now() - self._get_refresh_grace())
+        return self.filter(
+            Q(expiry_bucket__isnull=True) | Q(expiry_bucket__gte=current_bucket))
+
+    def purge_expired(self, batch_size=1000, sleep=0, send_signals=False):
+        '''
+        Drops the buckets that have ended, then deletes the expired tokens of
+        the current bucket as `AuthTokenManager.purge_expired` does. Buckets
+        are not dropped when `send_signals` is set.
+        '''
+        deleted = 0 if send_signals else self.purge_expired_buckets()
+        return deleted + super().purge_expired(
+            batch_size=batch_size, sleep=sleep, send_signals=send_signals)
+
+    def purge_expired_buckets(self, grace=None) -> int:
+        '''
+        Delete every bucket that ended at least `grace` ago, with a single
+        `DELETE` per bucket that neither loads the tokens nor sends signals.
+
+        With an `AUTO_REFRESH_BUFFER`, the default grace is
+        `AUTO_REFRESH_FLUSH_INTERVAL` seconds, so that extensions of tokens
+        renewed just before they expired are written before their bucket is
+        dropped.
+
+        Returns the number of deleted tokens.
+        '''
+        if grace is None:
+            grace = self._get_refresh_grace()
+        database = router.db_for_write(self.model)
+        last_bucket = self.model.get_expiry_bucket(
+            timezone.now() - grace - self.model.expiry_bucket_interval)
+        buckets = self.using(database).filter(expiry_bucket__lte=last_bucket).values_list(
+            'expiry_bucket', flat=True).distinct().order_by('expiry_bucket')
+        can_raw_delete = self._can_raw_delete()
+        deleted = 0
+        for bucket in list(buckets):
+            tokens = self.using(database).filter(expiry_bucket=bucket)
+            if can_raw_delete:
+                # The post_delete receivers only drop tokens from token
+                # caches, which never serve expired tokens
+                deleted += tokens._raw_delete(database)
+            else:
+                deleted += tokens.delete()[1].get(self.model._meta.label, 0)
+        get_metrics().increment(
+            'knox_expired_tokens_deleted_total', deleted, source='purge')
+        return deleted
+
+    def update_expiries(self, expiries) -> None:
+        self.bulk_update(self._with_expiry_buckets(expiries),
+                         ['expiry', 'expiry_bucket'])
+
+    async def aupdate_expiries(self, expiries) -> None:
+        await self.abulk_update(self._with_expiry_buckets(expiries),
+                                ['expiry', 'expiry_bucket'])
+
+    def _new_token(self, user, expiry, prefix):
+        token, fields = super()._new_token(user, expiry, prefix)
+        fields['expiry_bucket'] = self.model.get_expiry_bucket(fields['expiry'])
+        return token, fields
+
+    def _get_refresh_grace(self) -> timedelta:
+        from knox.refresh import get_refresh_buffer
+
+        if get_refresh_buffer() is None:
+            return timedelta(0)
+        return timedelta(seconds=knox_settings.AUTO_REFRESH_FLUSH_INTERVAL)
+
+    def _with_expiry_buckets(self, expiries) -> list:
+        return [
+            self.model(pk=digest, expiry=expiry,
+                       expiry_bucket=self.model.get_expiry_bucket(expiry))
+            for digest, expiry in expiries.items()
+        ]
+
+
+class AbstractExpiryBucketAuthToken(AbstractAuthToken):
+    '''
+    Token model grouping tokens into buckets of `expiry_bucket_interval` by
+    their expiry, see `ExpiryBucketAuthTokenManager`. Subclass it in your app
+    and set `KNOX_TOKEN_MODEL` to use it.
+
+    `expiry_bucket` holds the start of the bucket, `None` for tokens that
+    never expire.
+    '''
+    expiry_bucket_interval = timedelta(days=1)
+
+    objects = ExpiryBucketAuthTokenManager()
+
+    expiry_bucket = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta(AbstractAuthToken.Meta):
+        abstract = True
+        indexes = [
+            *AbstractAuthToken.Meta.indexes,
+            # Live bucket lookups and dropping buckets
+            models.Index(fields=['expiry_bucket']),
+        ]
+
+    @classmethod
+    def get_expiry_bucket(cls, expiry):
+        if expiry is None:
+            return None
+        interval = cls.expiry_bucket_interval.total_seconds()
+        start = expiry.timestamp() // interval * interval
+        return datetime.fromtimestamp(start, tz=expiry.tzinfo)
+
+    def save(self, *args, **kwargs):
+        self.expiry_bucket = self.get_expiry_bucket(self.expiry)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'expiry' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'expiry_bucket'}
+        super().save(*args, **kwargs)
+
+
+class AbstractBinaryDigestAuthToken(AbstractAuthToken):
+    '''
+    Token model storing its digest as raw bytes, see `BinaryDigestField`.
+    Subclass it in your app and set `KNOX_TOKEN_MODEL` to use it.
+    '''
+    digest = BinaryDigestField(primary_key=True)
+
+    class Meta(AbstractAuthToken.Meta):
+        abstract = True
+
+
 class AuthToken(AbstractAuthToken):
-    class Meta:
+    class Meta(AbstractAuthToken.Meta):
         swappable = 'KNOX_TOKEN_MODEL'
 
 
@@ -0,0 +1,81 @@
+from django.db import migrations
+
+
+class CopyTokens(migrations.RunPython):
+    '''
+    Copies the tokens of the `knox_authtoken` table into another token model,
+    e.g. one with a `BinaryDigestField`, when switching `KNOX_TOKEN_MODEL`.
+
+    Rows are read in pages of `batch_size` ordered by digest and copied,
+    converting their digests. `last_used` is copied when both tables have
+    it. The source table is left untouched, and a missing source table, as
+    in a fresh install, is skipped.
+    '''
+
+    def __init__(self, model, source_table='knox_authtoken', batch_size=1000):
+        self.model = model
+        self.source_table = source_table
+        self.batch_size = batch_size
+        super().__init__(self.copy_tokens, migrations.RunPython.noop)
+
+    def deconstruct(self):
+        return (self.__class__.__qualname__, *self._constructor_args)
+
+    def describe(self):
+        return f'Copy tokens from {self.source_table} to {self.model}'
+
+    def copy_tokens(self, apps, schema_editor):
+        connection = schema_editor.connection
+        if self.source_table not in connection.introspection.table_names():
+            return
+        target = apps.get_model(self.model)
+        columns = [
+            target._meta.get_field(name).column
+            for name in self.get_field_names(connection, target)
+        ]
+        digest_field = target._meta.get_field('digest')
+        quote_name = connection.ops.quote_name
+        # Pages by digest rather than fetching from a single SELECT, which
+        # client-side cursors would load whole
+        select = 'SELECT %s FROM %s %%s ORDER BY %s %s' % (
+            ', '.join(quote_name(column) for column in columns),
+            quote_name(self.source_table), quote_name(columns[0]),
+            connection.ops.limit_offset_sql(None, self.batch_size))
+        insert = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            quote_name(target._meta.db_table),
+            ', '.join(quote_name(column) for column in columns),
+            ', '.join(['%s'] * len(columns)))
+        select_after = select % ('WHERE %s > %%s' % quote_name(columns[0]))
+        after = None
+        with connection.cursor() as source, connection.cursor() as destination:
+            while True:
+                if after is None:
+                    source.execute(select % '')
+                else:
+                    source.execute(select_after, [after])
+                rows = source.fetchall()
+                if not rows:
+                    break
+                destination.executemany(insert, [
+                    (digest_field.get_db_prep_value(digest, connection), *values)
+                    for digest, *values in rows
+                ])
+                if len(rows) < self.batch_size:
+                    break
+                after = rows[-1][0]
+
+    def get_field_names(self, connection, target) -> list:
+        '''
+        Returns the fields to copy, including `last_used` when both the
+        source table and the target model have it.
+        '''
+        names = ['digest', 'token_key', 'user', 'created', 'expiry']
+        with connection.cursor() as cursor:
+            source_columns = {
+                column.name for column in
+                connection.introspection.get_table_description(cursor, self.source_table)
+            }
+        field_names = {field.name for field in target._meta.get_fields()}
+        if 'last_used' in source_columns and 'last_used' in field_names:
+            names.append('last_used')
+        return names
@@ -0,0 +1,225 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+from knox.models import get_token_model
+from knox.settings import knox_settings
+
+logger = logging.getLogger(__name__)
+
+_refresh_buffer = None
+
+
+class BaseRefreshBuffer:
+    '''
+    Buffers token expiry extensions made by `AUTO_REFRESH` and writes them to
+    the database in bulk, at most `AUTO_REFRESH_FLUSH_INTERVAL` seconds apart
+    or once `AUTO_REFRESH_BUFFER_SIZE` extensions are pending.
+
+    Subclasses call `schedule_flush()` when adding an extension, so that it
+    is written by a timer even if no later renewal flushes the buffer.
+    '''
+
+    def __init__(self):
+        self._last_flush = time.monotonic()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def add(self, digest, expiry) -> None:
+        raise NotImplementedError
+
+    def get_many(self, digests) -> dict:
+        '''
+        Returns the pending expiry of each given digest that has one.
+        '''
+        raise NotImplementedError
+
+    def pop_pending(self) -> dict:
+        '''
+        Removes and returns the pending expiries this buffer has to flush.
+        '''
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def get(self, digest):
+        return self.get_many([digest]).get(digest)
+
+    def is_flush_due(self) -> bool:
+        elapsed = time.monotonic() - self._last_flush
+        return (elapsed >= knox_settings.AUTO_REFRESH_FLUSH_INTERVAL or
+                len(self) >= knox_settings.AUTO_REFRESH_BUFFER_SIZE)
+
+    def flush_if_due(self) -> None:
+        if self.is_flush_due():
+            self.flush()
+
+    async def aflush_if_due(self) -> None:
+        if self.is_flush_due():
+            await self.aflush()
+
+    def flush(self) -> int:
+        self._last_flush = time.monotonic()
+        pending = self.pop_pending()
+        if pending:
+            self.write(pending)
+        return len(pending)
+
+    async def aflush(self) -> int:
+        self._last_flush = time.monotonic()
+        pending = self.pop_pending()
+        if pending:
+            await self.awrite(pending)
+        return len(pending)
+
+    def write(self, pending) -> None:
+        get_token_model().objects.update_expiries(pending)
+
+    async def awrite(self, pending) -> None:
+        await get_token_model().objects.aupdate_expiries(pending)
+
+    def schedule_flush(self) -> None:
+        '''
+        Starts a timer flushing the buffer in `AUTO_REFRESH_FLUSH_INTERVAL`
+        seconds, unless one is already running.
+        '''
+        with self._timer_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(
+                knox_settings.AUTO_REFRESH_FLUSH_INTERVAL, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self) -> None:
+        with self._timer_lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush pending token expiry updates.')
+        finally:
+            # The timer thread opened its own database connections
+            connections.close_all()
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush pending token expiry updates.')
+
+
+class LocMemRefreshBuffer(BaseRefreshBuffer):
+    '''
+    Keeps pending expiry extensions in process memory. Other processes only
+    see them once flushed.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._pending = {}
+        self._lock = threading.Lock()
+        atexit.register(self._flush_at_exit)
+
+    def add(self, digest, expiry) -> None:
+        with self._lock:
+            current = self._pending.get(digest)
+            if current is None or expiry > current:
+                self._pending[digest] = expiry
+        self.schedule_flush()
+
+    def get_many(self, digests) -> dict:
+        with self._lock:
+            return {
+                digest: self._pending[digest]
+                for digest in digests if digest in self._pending
+            }
+
+    def pop_pending(self) -> dict:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class CacheRefreshBuffer(BaseRefreshBuffer):
+    '''
+    Keeps pending expiry extensions in the Django cache named by
+    `TOKEN_CACHE_ALIAS`, so that every process honours them before they are
+    flushed. Each process flushes the extensions it added.
+    '''
+    key_prefix = 'knox:refresh:'
+
+    def __init__(self, alias=None):
+        super().__init__()
+        self.cache = caches[alias or knox_settings.TOKEN_CACHE_ALIAS]
+        self._digests = set()
+        self._lock = threading.Lock()
+        atexit.register(self._flush_at_exit)
+
+    def make_key(self, digest) -> str:
+        return self.key_prefix + digest
+
+    def get_timeout(self, expiry) -> float:
+        return (expiry - timezone.now()).total_seconds()
+
+    def add(self, digest, expiry) -> None:
+        timeout = self.get_timeout(expiry)
+        if timeout <= 0:
+            return
+        self.cache.set(self.make_key(digest), expiry, timeout)
+        with self._lock:
+            self._digests.add(digest)
+        self.schedule_flush()
+
+    def get_many(self, digests) -> dict:
+        keys = {self.make_key(digest): digest for digest in digests}
+        return {
+            keys[key]: expiry
+            for key, expiry in self.cache.get_many(list(keys)).items()
+        }
+
+    def pop_pending(self) -> dict:
+        with self._lock:
+            digests, self._digests = self._digests, set()
+        pending = self.get_many(digests)
+        self.cache.delete_many([self.make_key(digest) for digest in pending])
+        return pending
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+
+def get_refresh_buffer():
+    '''
+    Return the buffer configured by `AUTO_REFRESH_BUFFER`, or `None` when
+    renewed expiries are written immediately.
+    '''
+    global _refresh_buffer
+    buffer_class = knox_settings.AUTO_REFRESH_BUFFER
+    if buffer_class is None:
+        return None
+    if type(_refresh_buffer) is not buffer_class:
+        _refresh_buffer = buffer_class()
+    return _refresh_buffer
+
+
+def apply_pending_expiry(auth_token) -> None:
+    '''
+    Extends the expiry of a token loaded from the database with its pending,
+    not yet flushed, expiry.
+    '''
+    refresh_buffer = get_refresh_buffer()
+    if refresh_buffer is None or auth_token.expiry is None:
+        return
+    pending = refresh_buffer.get(auth_token.digest)
+    if pending is not None and pending > auth_token.expiry:
+        auth_token.expiry = pending
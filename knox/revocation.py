@@ -0,0 +1,247 @@
+import threading
+import time
+from functools import partial
+
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils import timezone
+
+from knox.cache import get_token_cache
+from knox.models import get_token_model
+from knox.settings import knox_settings
+
+_revocation_channel = None
+
+
+class BaseRevocationChannel:
+    '''
+    Broadcasts the digests of revoked tokens to every process, so that each
+    drops them from its `TOKEN_CACHE` at most `REVOCATION_POLL_INTERVAL`
+    seconds later.
+
+    The digests received during the last `SIGNED_TOKEN_TRUST_WINDOW` are
+    kept to tell which signed tokens may be trusted without a lookup, see
+    `is_trusted`.
+    '''
+
+    def __init__(self):
+        self._last_poll = time.monotonic()
+        self._lock = threading.Lock()
+        # Every revocation of the tokens issued from here on is received
+        self._trusted_since = timezone.now()
+        self._revoked = {}
+
+    def publish(self, digests) -> None:
+        raise NotImplementedError
+
+    def poll(self):
+        '''
+        Returns the digests published since the last poll, or `None` if some
+        may have been missed.
+        '''
+        raise NotImplementedError
+
+    def is_poll_due(self) -> bool:
+        elapsed = time.monotonic() - self._last_poll
+        return elapsed >= knox_settings.REVOCATION_POLL_INTERVAL
+
+    def poll_if_due(self) -> None:
+        if not self.is_poll_due():
+            return
+        with self._lock:
+            self._last_poll = time.monotonic()
+            digests = self.poll()
+            self._record(digests)
+        token_cache = get_token_cache()
+        if token_cache is None:
+            return
+        if digests is None:
+            token_cache.clear()
+        elif digests:
+            token_cache.delete_many(digests)
+
+    def record(self, digests) -> None:
+        '''
+        Remembers digests revoked by this process before they are polled.
+        '''
+        with self._lock:
+            self._record(digests)
+
+    def is_trusted(self, digest, issued_at) -> bool:
+        '''
+        Returns whether the token with the given digest, issued at
+        `issued_at`, cannot have been revoked without this channel receiving
+        it: it was issued after the channel started listening, and during
+        the last `SIGNED_TOKEN_TRUST_WINDOW`, and was not revoked since.
+        '''
+        window = knox_settings.SIGNED_TOKEN_TRUST_WINDOW
+        if window is None:
+            return False
+        with self._lock:
+            self._forget_before(timezone.now() - window)
+            return (issued_at >= self._trusted_since and
+                    digest not in self._revoked)
+
+    def _record(self, digests) -> None:
+        now = timezone.now()
+        if digests is None:
+            self._trusted_since = now
+            self._revoked.clear()
+            return
+        for digest in digests:
+            # Keep the digests ordered by the time they were received
+            self._revoked.pop(digest, None)
+            self._revoked[digest] = now
+        window = knox_settings.SIGNED_TOKEN_TRUST_WINDOW
+        if window is not None:
+            self._forget_before(now - window)
+
+    def _forget_before(self, since) -> None:
+        # Tokens revoked earlier were issued earlier, so are never trusted
+        self._trusted_since = max(self._trusted_since, since)
+        for digest, received in list(self._revoked.items()):
+            if received >= since:
+                break
+            del self._revoked[digest]
+
+
+class LocMemRevocationChannel(BaseRevocationChannel):
+    '''
+    Broadcasts between the channels of a single process. Stands in for a
+    shared channel in tests and single process deployments.
+    '''
+    max_entries = 1000
+
+    _log = []
+    _offset = 0
+    _log_lock = threading.Lock()
+
+    def __init__(self):
+        super().__init__()
+        with self._log_lock:
+            self._cursor = self._get_sequence()
+
+    def _get_sequence(self) -> int:
+        return LocMemRevocationChannel._offset + len(self._log)
+
+    def publish(self, digests) -> None:
+        with self._log_lock:
+            self._log.append(list(digests))
+            if len(self._log) > self.max_entries:
+                self._log.pop(0)
+                LocMemRevocationChannel._offset += 1
+
+    def poll(self):
+        with self._log_lock:
+            cursor, self._cursor = self._cursor, self._get_sequence()
+            if cursor < LocMemRevocationChannel._offset:
+                return None
+            entries = self._log[cursor - LocMemRevocationChannel._offset:]
+        return [digest for entry in entries for digest in entry]
+
+
+class CacheRevocationChannel(BaseRevocationChannel):
+    '''
+    Broadcasts through the Django cache named by `TOKEN_CACHE_ALIAS`, which
+    must be shared by every process, as a log of numbered entries.
+    '''
+    key_prefix = 'knox:revoked:'
+    max_entries = 1000
+
+    def __init__(self, alias=None):
+        super().__init__()
+        self.cache = caches[alias or knox_settings.TOKEN_CACHE_ALIAS]
+        self._cursor = self._get_sequence()
+
+    def make_key(self, sequence) -> str:
+        return f'{self.key_prefix}{sequence}'
+
+    def get_timeout(self) -> float:
+        # Cached tokens of processes that polled less recently are dropped
+        return knox_settings.TOKEN_CACHE_TTL + knox_settings.REVOCATION_POLL_INTERVAL
+
+    def _get_sequence(self) -> int:
+        key = self.make_key('sequence')
+        sequence = self.cache.get(key)
+        if sequence is None:
+            # A restarted sequence must not reuse the numbers of earlier
+            # entries, so that pollers notice the entries they missed
+            self.cache.add(key, time.time_ns(), timeout=None)
+            sequence = self.cache.get(key, 0)
+        return sequence
+
+    def publish(self, digests) -> None:
+        key = self.make_key('sequence')
+        try:
+            sequence = self.cache.incr(key)
+        except ValueError:
+            self._get_sequence()
+            sequence = self.cache.incr(key)
+        self.cache.set(self.make_key(sequence), list(digests), self.get_timeout())
+
+    def poll(self):
+        cursor, self._cursor = self._cursor, self._get_sequence()
+        if cursor == self._cursor:
+            return []
+        if not 0 < self._cursor - cursor <= self.max_entries:
+            return None
+        keys = [self.make_key(sequence)
+                for sequence in range(cursor + 1, self._cursor + 1)]
+        entries = self.cache.get_many(keys)
+        if len(entries) < len(keys):
+            return None
+        return [digest for key in keys for digest in entries[key]]
+
+
+def get_revocation_channel():
+    '''
+    Return the channel configured by `REVOCATION_CHANNEL`, or `None` when
+    revocations are not broadcast.
+    '''
+    global _revocation_channel
+    channel_class = knox_settings.REVOCATION_CHANNEL
+    if channel_class is None:
+        return None
+    if type(_revocation_channel) is not channel_class:
+        _revocation_channel = channel_class()
+    return _revocation_channel
+
+
+def poll_revocations() -> None:
+    revocation_channel = get_revocation_channel()
+    if revocation_channel is not None:
+        revocation_channel.poll_if_due()
+
+
+def publish_revocations(digests, using=None) -> None:
+    '''
+    Broadcast the given digests once the current transaction commits.
+    '''
+    revocation_channel = get_revocation_channel()
+    if revocation_channel is not None and digests:
+        revocation_channel.record(digests)
+        transaction.on_commit(
+            partial(revocation_channel.publish, list(digests)), using=using)
+
+
+def publish_revoked_token(sender, instance, using, **kwargs):
+    '''
+    `post_delete` receiver for the token model.
+    '''
+    publish_revocations([instance.digest], using=using)
+
+
+def publish_deactivated_user_tokens(sender, instance, **kwargs):
+    '''
+    `post_save` receiver for the user model, broadcasting the tokens of a
+    user that has been deactivated.
+    '''
+    if getattr(instance, 'is_active', True):
+        return
+    if get_revocation_channel() is None:
+        return
+    token_model = get_token_model()
+    database = router.db_for_write(token_model)
+    digests = token_model.objects.using(database).filter(
+        user=instance).values_list('digest', flat=True)
+    publish_revocations(list(digests), using=database)
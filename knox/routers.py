@@ -0,0 +1,34 @@
+import random
+
+from knox.models import AbstractAuthToken
+from knox.settings import knox_settings
+
+
+class TokenRouter:
+    '''
+    Database router sending token reads to the replicas in
+    `TOKEN_READ_DATABASES` and token writes to `TOKEN_WRITE_DATABASE`.
+
+    `TokenAuthentication` falls back to the write database when a token is
+    missing from, or expired on, the replica it was looked up in, since the
+    replica may not have caught up with a login or renewal yet.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if not issubclass(model, AbstractAuthToken):
+            return None
+        read_databases = knox_settings.TOKEN_READ_DATABASES
+        if not read_databases:
+            return knox_settings.TOKEN_WRITE_DATABASE
+        return random.choice(read_databases)
+
+    def db_for_write(self, model, **hints):
+        if not issubclass(model, AbstractAuthToken):
+            return None
+        return knox_settings.TOKEN_WRITE_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the write database
+        if isinstance(obj1, AbstractAuthToken) or isinstance(obj2, AbstractAuthToken):
+            return True
+        return None
@@ -10,3 +10,15 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (username_field,)
+
+
+class VerifyTokensSerializer(serializers.Serializer):
+    tokens = serializers.ListField(
+        child=serializers.CharField(trim_whitespace=False), allow_empty=False)
+
+    def validate_tokens(self, tokens):
+        max_tokens = self.context['view'].get_max_tokens()
+        if len(tokens) > max_tokens:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {max_tokens} elements.')
+        return tokens
@@ -8,22 +8,62 @@ USER_SETTINGS = getattr(settings, 'REST_KNOX', None)
 
 DEFAULTS = {
     'SECURE_HASH_ALGORITHM': 'hashlib.sha512',
+    'SECURE_HASH_PEPPER': None,
+    'SECURE_HASH_DIGEST_SIZE': None,
+    'LEGACY_SECURE_HASH_ALGORITHMS': [],
     'AUTH_TOKEN_CHARACTER_LENGTH': 64,
+    'LEGACY_AUTH_TOKEN_CHARACTER_LENGTHS': [],
     'TOKEN_TTL': timedelta(hours=10),
     'USER_SERIALIZER': None,
     'TOKEN_LIMIT_PER_USER': None,
+    'TOKEN_LIMIT_PER_USER_POLICY': 'reject',
     'AUTO_REFRESH': False,
     'AUTO_REFRESH_MAX_TTL': None,
     'MIN_REFRESH_INTERVAL': 60,
+    'AUTO_REFRESH_BUFFER': None,
+    'AUTO_REFRESH_FLUSH_INTERVAL': 30,
+    'AUTO_REFRESH_BUFFER_SIZE': 1000,
     'AUTH_HEADER_PREFIX': 'Token',
     'EXPIRY_DATETIME_FORMAT': api_settings.DATETIME_FORMAT,
     'TOKEN_MODEL': getattr(settings, 'KNOX_TOKEN_MODEL', 'knox.AuthToken'),
     'TOKEN_PREFIX': '',
+    'INLINE_TOKEN_CLEANUP': True,
+    'LAZY_USER': False,
+    'TOKEN_CACHE': None,
+    'TOKEN_CACHE_TTL': 60,
+    'TOKEN_CACHE_MAX_SIZE': 10000,
+    'TOKEN_CACHE_ALIAS': 'default',
+    'NEGATIVE_TOKEN_CACHE': None,
+    'NEGATIVE_TOKEN_CACHE_TTL': 10,
+    'NEGATIVE_TOKEN_CACHE_MAX_SIZE': 10000,
+    'SIGNED_TOKENS': False,
+    'TOKEN_SIGNING_KEYS': None,
+    'TOKEN_SIGNING_KEY_ID': 'default',
+    'SIGNED_TOKEN_TRUST_WINDOW': timedelta(hours=1),
+    'REVOCATION_CHANNEL': None,
+    'REVOCATION_POLL_INTERVAL': 5,
+    'METRICS': 'knox.metrics.NullMetrics',
+    'TOKEN_READ_DATABASES': [],
+    'TOKEN_WRITE_DATABASE': 'default',
+    'INTROSPECTION_MAX_AGE': 60,
+    'TOKEN_STORE': 'knox.stores.ORMTokenStore',
+    'TOKEN_STORE_CACHE_ALIAS': 'default',
+    'TRACK_LAST_USED': False,
+    'LAST_USED_INTERVAL': 300,
+    'LAST_USED_BUFFER': None,
 }
 
 IMPORT_STRINGS = {
     'SECURE_HASH_ALGORITHM',
+    'LEGACY_SECURE_HASH_ALGORITHMS',
     'USER_SERIALIZER',
+    'TOKEN_CACHE',
+    'NEGATIVE_TOKEN_CACHE',
+    'AUTO_REFRESH_BUFFER',
+    'REVOCATION_CHANNEL',
+    'METRICS',
+    'TOKEN_STORE',
+    'LAST_USED_BUFFER',
 }
 
 knox_settings = APISettings(USER_SETTINGS, DEFAULTS, IMPORT_STRINGS)
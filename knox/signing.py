@@ -0,0 +1,113 @@
+import binascii
+import json
+import math
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime, timezone
+from hmac import compare_digest
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.crypto import salted_hmac
+
+from knox.settings import knox_settings
+
+SEPARATOR = '.'
+
+SignedTokenClaims = namedtuple(
+    'SignedTokenClaims', ('key_id', 'user_pk', 'expiry', 'issued_at'),
+    defaults=(None,))
+
+
+def should_sign_tokens() -> bool:
+    return knox_settings.SIGNED_TOKENS
+
+
+def get_signing_keys() -> dict:
+    '''
+    Return the keys signed tokens are verified with, by key id.
+    '''
+    keys = knox_settings.TOKEN_SIGNING_KEYS
+    if keys is None:
+        return {'default': settings.SECRET_KEY}
+    return keys
+
+
+def sign_token(token, user, expiry) -> str:
+    '''
+    Append the id of `user`, the `expiry` datetime, the id of the signing
+    key and the time of signing to a random token and sign it with
+    `TOKEN_SIGNING_KEY_ID`:
+
+        <token>.<base64 encoded claims>.<base64 encoded MAC>
+    '''
+    key_id = knox_settings.TOKEN_SIGNING_KEY_ID
+    keys = get_signing_keys()
+    if key_id not in keys:
+        raise ImproperlyConfigured(
+            f"TOKEN_SIGNING_KEY_ID '{key_id}' is not in TOKEN_SIGNING_KEYS")
+    timestamp = None if expiry is None else math.ceil(expiry.timestamp())
+    issued = math.floor(time.time())
+    claims = json.dumps([key_id, user.pk, timestamp, issued],
+                        cls=DjangoJSONEncoder, separators=(',', ':'))
+    value = token + SEPARATOR + _b64encode(claims.encode())
+    return value + SEPARATOR + _mac(keys[key_id], value)
+
+
+def is_signing_configured() -> bool:
+    return should_sign_tokens() or knox_settings.TOKEN_SIGNING_KEYS is not None
+
+
+def is_signed_token(token) -> bool:
+    '''
+    Tokens are only parsed as signed while `SIGNED_TOKENS` or
+    `TOKEN_SIGNING_KEYS` is set, so that a `TOKEN_PREFIX` may contain
+    `SEPARATOR` otherwise.
+    '''
+    return is_signing_configured() and token.count(SEPARATOR) >= 2
+
+
+def get_random_part(token) -> str:
+    # Split from the right, the prefix may contain SEPARATOR
+    return token.rsplit(SEPARATOR, 2)[0]
+
+
+def unsign_token(token):
+    '''
+    Return the `SignedTokenClaims` of a signed token, or `None` if it is
+    malformed or its signature does not match. Tokens signed before the
+    time of signing was added to the claims have no `issued_at`.
+    '''
+    try:
+        value, signature = token.rsplit(SEPARATOR, 1)
+        _, claims = value.rsplit(SEPARATOR, 1)
+        key_id, user_pk, timestamp, *issued = json.loads(_b64decode(claims))
+        issued, = issued or [None]
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    key = get_signing_keys().get(key_id) if isinstance(key_id, str) else None
+    if key is None or not compare_digest(_mac(key, value), signature):
+        return None
+    return SignedTokenClaims(
+        key_id, user_pk, _from_timestamp(timestamp), _from_timestamp(issued))
+
+
+def _from_timestamp(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def _mac(key, value) -> str:
+    return _b64encode(salted_hmac(
+        'knox.signing', value, secret=key, algorithm='sha256').digest())
+
+
+def _b64encode(data) -> str:
+    return urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data) -> bytes:
+    return urlsafe_b64decode(data + '=' * (-len(data) % 4))
@@ -0,0 +1,855 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from knox.cache import get_token_cache
+from knox.metrics import get_metrics
+from knox.models import get_token_model
+from knox.revocation import publish_revocations
+from knox.settings import knox_settings
+from knox.signals import token_expired
+
+_token_store = None
+
+# Order in which TOKEN_LIMIT_PER_USER_POLICY evicts active tokens
+TOKEN_LIMIT_EVICTION_ORDER = {
+    'evict_oldest': ('created',),
+    'evict_soonest_expiring': (F('expiry').asc(nulls_last=True), 'created'),
+}
+
+# The same orders for tokens kept outside of the database
+TOKEN_LIMIT_EVICTION_KEYS = {
+    'evict_oldest': lambda token: token.created,
+    'evict_soonest_expiring': lambda token: (
+        token.expiry is None, token.expiry or token.created, token.created),
+}
+
+
+class BaseTokenStore:
+    '''
+    Creates, looks up, renews and deletes tokens for `TokenAuthentication`
+    and the knox views. Tokens are instances of the token model, whether or
+    not they are kept in the database.
+
+    The async methods run their synchronous counterparts in a thread unless
+    a store overrides them.
+    '''
+
+    def get_many(self, digests, queryset=None) -> dict:
+        '''
+        Returns the tokens stored under any of `digests`, by digest.
+
+        Stores keeping tokens in the database look them up in `queryset`, see
+        `TokenAuthentication.get_token_queryset`; other stores ignore it.
+        '''
+        raise NotImplementedError
+
+    def get(self, digests, queryset=None):
+        '''
+        Returns the token stored under one of `digests`, trying them in order,
+        or `None`.
+        '''
+        return self._find_token(self.get_many(digests, queryset), digests)
+
+    def get_write_queryset(self, queryset):
+        '''
+        Returns `queryset` on the database tokens are written to if it reads
+        from another one that may lag behind it, e.g. a replica, else `None`.
+        '''
+        return None
+
+    def create(self, user, expiry, prefix='', created=None) -> tuple:
+        '''
+        Creates a token of `user` expiring after the `expiry` timedelta, or
+        never if it is `None`, and returns `(instance, token)`. `created`
+        overrides the creation time of the token.
+        '''
+        raise NotImplementedError
+
+    def bulk_create(self, users_or_specs, expiry, prefix='', batch_size=1000) -> list:
+        '''
+        Creates a token for each given user, or dict with a `user` key and
+        optional `expiry`, `prefix` and `created` overriding the defaults, and
+        returns a list of `(instance, token)` pairs in input order.
+        '''
+        created = []
+        for item in users_or_specs:
+            spec = dict(item) if isinstance(item, dict) else {'user': item}
+            created.append(self.create(
+                spec.pop('user'), spec.pop('expiry', expiry), spec.pop('prefix', prefix),
+                **spec))
+        return created
+
+    def create_within_limit(self, user, token_limit_per_user, policy, create):
+        '''
+        Calls `create` to create a token of `user` and returns its result,
+        unless `user` already has `token_limit_per_user` active tokens: then
+        `None` is returned if `policy` is `'reject'`, else the active tokens
+        first in the order of `policy` are deleted to make room.
+
+        This does not lock the user, so concurrent logins may overshoot the
+        limit.
+        '''
+        active_tokens = self.get_active_for_user(user)
+        excess = len(active_tokens) - token_limit_per_user + 1
+        if excess > 0:
+            if policy == 'reject':
+                return None
+            active_tokens.sort(key=TOKEN_LIMIT_EVICTION_KEYS[policy])
+            evicted_count = sum(
+                self.delete(auth_token) for auth_token in active_tokens[:excess])
+            get_metrics().increment('knox_tokens_evicted_total', evicted_count)
+        return create()
+
+    def renew(self, auth_token) -> bool:
+        '''
+        Writes the expiry of `auth_token`, returning whether it is still
+        stored: another process may have deleted it while it was cached.
+        '''
+        raise NotImplementedError
+
+    def update_last_used(self, auth_token) -> bool:
+        '''
+        Writes the last use time of `auth_token`, returning whether it is
+        still stored.
+        '''
+        raise NotImplementedError
+
+    def delete(self, auth_token) -> bool:
+        '''
+        Deletes `auth_token`, returning whether it was stored.
+        '''
+        raise NotImplementedError
+
+    def delete_for_user(self, user) -> int:
+        '''
+        Deletes every token of `user`, returning how many were stored.
+        '''
+        raise NotImplementedError
+
+    def get_active_for_user(self, user) -> list:
+        '''
+        Returns the tokens of `user` that have not expired.
+        '''
+        raise NotImplementedError
+
+    def count_active_for_user(self, user) -> int:
+        return len(self.get_active_for_user(user))
+
+    def get_expired_for_user(self, user, exclude=None):
+        '''
+        Returns the expired tokens of `user` other than `exclude`, which
+        authentication deletes with `INLINE_TOKEN_CLEANUP`.
+        '''
+        raise NotImplementedError
+
+    def purge_expired(self, batch_size=1000, sleep=0, send_signals=False) -> int:
+        '''
+        Deletes expired tokens, returning how many were deleted.
+        '''
+        raise NotImplementedError
+
+    def count_tokens(
+        self,
+        tokens=None,
+        user_ids=None,
+        created_before=None,
+        prefix=None,
+        last_used_before=None,
+    ) -> int:
+        '''
+        Returns how many tokens `revoke` would revoke given the same filters.
+        '''
+        raise NotImplementedError
+
+    def revoke(
+        self,
+        tokens=None,
+        user_ids=None,
+        created_before=None,
+        prefix=None,
+        last_used_before=None,
+        batch_size=1000,
+        sleep=0,
+        send_signals=False,
+    ) -> int:
+        '''
+        Deletes tokens in batches, `tokens`, a queryset of the token model,
+        or all tokens by default, narrowed down by the filters of
+        `AuthTokenManager.revoke`. Returns the number of revoked tokens.
+        '''
+        raise NotImplementedError
+
+    def update_user(self, user, update_fields=None) -> None:
+        '''
+        Called when `user` has been saved, with the fields that were saved if
+        not all of them. Stores loading users from the database need not
+        implement this.
+        '''
+
+    def delete_user(self, user) -> None:
+        '''
+        Called when `user` has been deleted. The database deletes the tokens
+        of the token model along with their user; other stores delete them
+        here.
+        '''
+
+    def update_last_used_many(self, last_used) -> None:
+        '''
+        Writes the last use times of a mapping of digest to time, which a
+        `LAST_USED_BUFFER` flushes.
+        '''
+        raise NotImplementedError
+
+    async def aget(self, digests, queryset=None):
+        return await sync_to_async(self.get)(digests, queryset)
+
+    async def acreate(self, user, expiry, prefix='', created=None) -> tuple:
+        return await sync_to_async(self.create)(user, expiry, prefix, created)
+
+    async def arenew(self, auth_token) -> bool:
+        return await sync_to_async(self.renew)(auth_token)
+
+    async def aupdate_last_used(self, auth_token) -> bool:
+        return await sync_to_async(self.update_last_used)(auth_token)
+
+    async def adelete(self, auth_token) -> bool:
+        return await sync_to_async(self.delete)(auth_token)
+
+    async def aupdate_last_used_many(self, last_used) -> None:
+        await sync_to_async(self.update_last_used_many)(last_used)
+
+    async def adelete_for_user(self, user) -> int:
+        return await sync_to_async(self.delete_for_user)(user)
+
+    async def aget_expired_for_user(self, user, exclude=None) -> list:
+        return await sync_to_async(
+            lambda: list(self.get_expired_for_user(user, exclude)))()
+
+    def _find_token(self, auth_tokens, digests):
+        for digest in digests:
+            if digest in auth_tokens:
+                return auth_tokens[digest]
+        return None
+
+
+class ORMTokenStore(BaseTokenStore):
+    '''
+    Keeps tokens in the database with the token model. This is the default.
+
+    Tokens are read with the database router, e.g. from the replicas of
+    `knox.routers.TokenRouter`, and written to its write database.
+    '''
+
+    def get_queryset(self):
+        return get_token_model().objects.live().select_related('user')
+
+    def get_many(self, digests, queryset=None) -> dict:
+        return {
+            auth_token.digest: auth_token
+            for auth_token in self._filter_digests(queryset, digests)
+        }
+
+    def get_write_queryset(self, queryset):
+        write_database = router.db_for_write(queryset.model)
+        if queryset.db == write_database:
+            return None
+        return queryset.using(write_database)
+
+    def create(self, user, expiry, prefix='', created=None) -> tuple:
+        instance, token = get_token_model().objects.create(
+            user=user, expiry=expiry, prefix=prefix)
+        if created is not None:
+            # created is set on insert, whatever value it is given
+            instance.created = created
+            instance.save(update_fields=('created',))
+        return instance, token
+
+    def bulk_create(self, users_or_specs, expiry, prefix='', batch_size=1000) -> list:
+        return get_token_model().objects.bulk_create_tokens(
+            users_or_specs, expiry=expiry, prefix=prefix, batch_size=batch_size)
+
+    def create_within_limit(self, user, token_limit_per_user, policy, create):
+        '''
+        Checks the limit and creates the token in one transaction that locks
+        the row of `user`, so that concurrent logins of the same user cannot
+        overshoot the limit. Tokens are counted in the database they are
+        written to, never on a read replica.
+        '''
+        token_model = get_token_model()
+        database = router.db_for_write(token_model)
+        with transaction.atomic(using=database):
+            user_manager = user._meta.model._default_manager.using(database)
+            list(user_manager.select_for_update().filter(pk=user.pk).values_list('pk'))
+            active_tokens = self._filter_active(user).using(database)
+            excess = active_tokens.count() - token_limit_per_user + 1
+            if excess > 0:
+                if policy == 'reject':
+                    return None
+                evicted = active_tokens.order_by(
+                    *TOKEN_LIMIT_EVICTION_ORDER[policy]).values_list('pk', flat=True)
+                evicted_count = token_model.objects.filter(
+                    pk__in=list(evicted[:excess])).delete()[0]
+                get_metrics().increment('knox_tokens_evicted_total', evicted_count)
+            return create()
+
+    def renew(self, auth_token) -> bool:
+        return self._filter_token(auth_token).update(expiry=auth_token.expiry) > 0
+
+    def update_last_used(self, auth_token) -> bool:
+        return self._filter_token(auth_token).update(last_used=auth_token.last_used) > 0
+
+    def delete(self, auth_token) -> bool:
+        if auth_token.pk is None:
+            # Deleting an instance clears its primary key
+            return False
+        return auth_token.delete()[0] > 0
+
+    def delete_for_user(self, user) -> int:
+        return get_token_model().objects.filter(user=user).delete()[0]
+
+    def get_active_for_user(self, user) -> list:
+        return list(self._filter_active(user))
+
+    def count_active_for_user(self, user) -> int:
+        return self._filter_active(user).count()
+
+    def get_expired_for_user(self, user, exclude=None):
+        # Read from the database they are deleted from: a lagging replica
+        # may still have the old expiry of a renewed token.
+        # Served by the (user, expiry) index
+        token_model = get_token_model()
+        expired_tokens = token_model.objects.using(
+            router.db_for_write(token_model)).filter(user=user, expiry__lt=timezone.now())
+        if exclude is not None:
+            expired_tokens = expired_tokens.exclude(digest=exclude.digest)
+        return expired_tokens
+
+    def purge_expired(self, batch_size=1000, sleep=0, send_signals=False) -> int:
+        return get_token_model().objects.purge_expired(
+            batch_size=batch_size, sleep=sleep, send_signals=send_signals)
+
+    def update_last_used_many(self, last_used) -> None:
+        get_token_model().objects.update_last_used(last_used)
+
+    def count_tokens(self, tokens=None, **filters) -> int:
+        return get_token_model().objects.filter_tokens(tokens, **filters).count()
+
+    def revoke(self, tokens=None, **kwargs) -> int:
+        return get_token_model().objects.revoke(tokens, **kwargs)
+
+    async def aget(self, digests, queryset=None):
+        auth_tokens = {
+            auth_token.digest: auth_token
+            async for auth_token in self._filter_digests(queryset, digests)
+        }
+        return self._find_token(auth_tokens, digests)
+
+    async def acreate(self, user, expiry, prefix='', created=None) -> tuple:
+        instance, token = await get_token_model().objects.acreate(
+            user=user, expiry=expiry, prefix=prefix)
+        if created is not None:
+            instance.created = created
+            await instance.asave(update_fields=('created',))
+        return instance, token
+
+    async def arenew(self, auth_token) -> bool:
+        return await self._filter_token(auth_token).aupdate(expiry=auth_token.expiry) > 0
+
+    async def aupdate_last_used(self, auth_token) -> bool:
+        return await self._filter_token(auth_token).aupdate(
+            last_used=auth_token.last_used) > 0
+
+    async def adelete(self, auth_token) -> bool:
+        if auth_token.pk is None:
+            return False
+        return (await auth_token.adelete())[0] > 0
+
+    async def adelete_for_user(self, user) -> int:
+        return (await get_token_model().objects.filter(user=user).adelete())[0]
+
+    async def aupdate_last_used_many(self, last_used) -> None:
+        await get_token_model().objects.aupdate_last_used(last_used)
+
+    async def aget_expired_for_user(self, user, exclude=None) -> list:
+        return [
+            auth_token
+            async for auth_token in self.get_expired_for_user(user, exclude)
+        ]
+
+    def _filter_token(self, auth_token):
+        # Unlike save(), update() does not fail when the row is gone
+        return get_token_model().objects.filter(pk=auth_token.pk)
+
+    def _filter_digests(self, queryset, digests):
+        queryset = self.get_queryset() if queryset is None else queryset
+        if len(digests) == 1:
+            return queryset.filter(digest=digests[0])
+        return queryset.filter(digest__in=digests)
+
+    def _filter_active(self, user):
+        # Served by the (user, expiry) index
+        return get_token_model().objects.filter(user=user).filter(
+            Q(expiry__isnull=True) | Q(expiry__gt=timezone.now()))
+
+
+class KeyValueTokenStore(BaseTokenStore):
+    '''
+    Base class of the stores keeping tokens outside of the database, each
+    under its digest, along with the digests of the tokens of each user.
+
+    A snapshot of the user is stored with each token: its primary key,
+    `is_active`, username and `user_fields`, so that authentication does
+    not query the database. The other fields are loaded on access. The
+    snapshots are updated whenever a user is saved, and the tokens of a
+    user deleted along with it.
+
+    Tokens are dropped once they expire. The digests of a user are updated
+    while holding a lock taken with `add`, for at most `lock_timeout`
+    seconds, so that concurrent logins and logouts cannot lose a token from
+    them. `TOKEN_LIMIT_PER_USER` is checked without the lock, so concurrent
+    logins may overshoot it.
+
+    `AUTO_REFRESH_BUFFER` writes renewals to the database, so it cannot be
+    used with these stores.
+    '''
+    token_key_prefix = 'token:'
+    user_key_prefix = 'user:'
+    user_fields = ()
+    lock_timeout = 10
+
+    def __init__(self):
+        if knox_settings.AUTO_REFRESH_BUFFER is not None:
+            raise ImproperlyConfigured(
+                f'AUTO_REFRESH_BUFFER cannot be used with {type(self).__name__}.')
+
+    def read_many(self, keys) -> dict:
+        raise NotImplementedError
+
+    def add(self, key, value, timeout) -> bool:
+        '''
+        Stores `value` under `key` for `timeout` seconds unless `key` is
+        stored already, returning whether it was stored. This has to be
+        atomic.
+        '''
+        raise NotImplementedError
+
+    def write(self, key, value, timeout) -> None:
+        '''
+        Stores `value` under `key` for `timeout` seconds, or forever if it is
+        `None`.
+        '''
+        raise NotImplementedError
+
+    def remove_many(self, keys) -> None:
+        raise NotImplementedError
+
+    def get_many(self, digests, queryset=None) -> dict:
+        keys = {self.token_key_prefix + digest: digest for digest in digests}
+        return {
+            keys[key]: self._load_token(values)
+            for key, values in self.read_many(list(keys)).items()
+        }
+
+    def create(self, user, expiry, prefix='', created=None) -> tuple:
+        token_model = get_token_model()
+        token, fields = token_model.objects._new_token(user, expiry, prefix)
+        instance = token_model(**fields, created=created or timezone.now())
+        self._write_token(instance)
+        # Forget the tokens that expired
+        self._update_user_digests(
+            user.pk, lambda digests: [*self.get_many(digests), instance.digest])
+        get_metrics().increment('knox_tokens_created_total')
+        return instance, token
+
+    def renew(self, auth_token) -> bool:
+        return self._rewrite_token(auth_token)
+
+    def update_last_used(self, auth_token) -> bool:
+        return self._rewrite_token(auth_token)
+
+    def update_last_used_many(self, last_used) -> None:
+        for digest, auth_token in self.get_many(list(last_used)).items():
+            if auth_token.last_used is None or auth_token.last_used < last_used[digest]:
+                auth_token.last_used = last_used[digest]
+                self._write_token(auth_token)
+
+    def delete(self, auth_token) -> bool:
+        stored = bool(self.get_many([auth_token.digest]))
+        self._remove_tokens([auth_token.digest])
+        self._update_user_digests(auth_token.user_id, lambda digests: [
+            digest for digest in digests if digest != auth_token.digest])
+        return stored
+
+    def delete_for_user(self, user) -> int:
+        with self._lock_user(user.pk):
+            digests = self._read_user_digests(user.pk)
+            stored = len(self.get_many(digests))
+            self._remove_tokens(digests)
+            self.remove_many([self._make_user_key(user.pk)])
+        return stored
+
+    def get_active_for_user(self, user) -> list:
+        digests = self._read_user_digests(user.pk)
+        auth_tokens = self.get_many(digests)
+        if len(auth_tokens) < len(digests):
+            # Forget the tokens that expired, but not those created since
+            expired = set(digests).difference(auth_tokens)
+            self._update_user_digests(user.pk, lambda digests: [
+                digest for digest in digests if digest not in expired])
+        now = timezone.now()
+        return [
+            auth_token for auth_token in auth_tokens.values()
+            if auth_token.expiry is None or auth_token.expiry > now
+        ]
+
+    def get_expired_for_user(self, user, exclude=None) -> list:
+        # Expired tokens are dropped by the store itself
+        return []
+
+    def count_tokens(
+        self,
+        tokens=None,
+        user_ids=None,
+        created_before=None,
+        prefix=None,
+        last_used_before=None,
+    ) -> int:
+        return sum(len(batch) for batch in self._filter_tokens(
+            tokens, user_ids, created_before, prefix, last_used_before))
+
+    def revoke(
+        self,
+        tokens=None,
+        user_ids=None,
+        created_before=None,
+        prefix=None,
+        last_used_before=None,
+        batch_size=1000,
+        sleep=0,
+        send_signals=False,
+    ) -> int:
+        '''
+        Reads the tokens of `batch_size` users at a time, of all users in the
+        database by default, and deletes those matching the filters.
+        '''
+        logged_out = set()
+        revoked = 0
+        batches = self._filter_tokens(
+            tokens, user_ids, created_before, prefix, last_used_before, batch_size)
+        for batch in batches:
+            if revoked and sleep:
+                time.sleep(sleep)
+            revoked_digests = {auth_token.digest for auth_token in batch}
+            self._remove_tokens(list(revoked_digests))
+            for user_pk in {auth_token.user_id for auth_token in batch}:
+                self._update_user_digests(user_pk, lambda digests: [
+                    digest for digest in digests if digest not in revoked_digests])
+            revoked += len(batch)
+            if send_signals:
+                self._send_revocation_signals(batch, logged_out)
+        get_metrics().increment('knox_tokens_revoked_total', revoked)
+        return revoked
+
+    def update_user(self, user, update_fields=None) -> None:
+        if update_fields is not None and not (
+                self._get_user_field_names(user) & set(update_fields)):
+            return
+        auth_tokens = self.get_many(self._read_user_digests(user.pk))
+        for auth_token in auth_tokens.values():
+            auth_token.user = user
+            self._write_token(auth_token)
+        if not getattr(user, 'is_active', True):
+            # Like publish_deactivated_user_tokens for the token model
+            publish_revocations(list(auth_tokens))
+
+    def delete_user(self, user) -> None:
+        self.delete_for_user(user)
+
+    def _make_user_key(self, user_pk) -> str:
+        return f'{self.user_key_prefix}{user_pk}'
+
+    def _read_user_digests(self, user_pk) -> list:
+        key = self._make_user_key(user_pk)
+        return self.read_many([key]).get(key, [])
+
+    def _write_user_digests(self, user_pk, digests) -> None:
+        if digests:
+            self.write(self._make_user_key(user_pk), digests, None)
+        else:
+            self.remove_many([self._make_user_key(user_pk)])
+
+    def _update_user_digests(self, user_pk, update) -> None:
+        '''
+        Replaces the digests of the tokens of a user with `update(digests)`.
+        '''
+        with self._lock_user(user_pk):
+            self._write_user_digests(user_pk, update(self._read_user_digests(user_pk)))
+
+    @contextmanager
+    def _lock_user(self, user_pk):
+        key = f'{self._make_user_key(user_pk)}:lock'
+        # The lock expires if its holder dies
+        while not self.add(key, True, self.lock_timeout):
+            time.sleep(0.001)
+        try:
+            yield
+        finally:
+            self.remove_many([key])
+
+    def _write_token(self, auth_token) -> None:
+        timeout = None
+        if auth_token.expiry is not None:
+            timeout = max(0, (auth_token.expiry - timezone.now()).total_seconds())
+        values = {
+            field.attname: getattr(auth_token, field.attname)
+            for field in auth_token._meta.concrete_fields
+        }
+        if auth_token._meta.get_field('user').is_cached(auth_token):
+            values['user'] = self._get_user_snapshot(auth_token.user)
+        self.write(self.token_key_prefix + auth_token.digest, values, timeout)
+
+    def _rewrite_token(self, auth_token) -> bool:
+        # Do not bring back a token deleted while it was cached
+        if not self.get_many([auth_token.digest]):
+            return False
+        self._write_token(auth_token)
+        return True
+
+    def _load_token(self, values):
+        values = dict(values)
+        user_values = values.pop('user', None)
+        token_model = get_token_model()
+        auth_token = token_model(**values)
+        auth_token._state.adding = False
+        if user_values is not None:
+            user_model = token_model._meta.get_field('user').related_model
+            names = [
+                field.attname for field in user_model._meta.concrete_fields
+                if field.attname in user_values
+            ]
+            # The fields missing from the snapshot are deferred
+            auth_token.user = user_model.from_db(
+                router.db_for_read(user_model), names,
+                [user_values[name] for name in names])
+        return auth_token
+
+    def _get_user_field_names(self, user) -> set:
+        return {user._meta.pk.name, 'is_active', user.USERNAME_FIELD, *self.user_fields}
+
+    def _get_user_snapshot(self, user) -> dict:
+        names = self._get_user_field_names(user)
+        loaded = user.__dict__
+        return {
+            field.attname: loaded[field.attname]
+            for field in user._meta.concrete_fields
+            if field.name in names and field.attname in loaded
+        }
+
+    def _filter_tokens(
+        self,
+        tokens,
+        user_ids,
+        created_before,
+        prefix,
+        last_used_before,
+        batch_size=1000,
+    ):
+        '''
+        Yields the stored tokens of `tokens`, a queryset of the token model,
+        or of the users with `user_ids`, all users by default, narrowed down
+        as by `AuthTokenManager.filter_tokens`, in batches of the tokens of
+        `batch_size` users or digests.
+        '''
+        user_pks = None
+        if tokens is not None:
+            digest_batches = _batched(
+                tokens.values_list('pk', flat=True).iterator(), batch_size)
+            if user_ids is not None:
+                user_pks = {str(user_pk) for user_pk in user_ids}
+        else:
+            if user_ids is None:
+                user_model = get_token_model()._meta.get_field('user').related_model
+                user_ids = user_model._default_manager.values_list(
+                    'pk', flat=True).iterator(chunk_size=batch_size)
+            digest_batches = (
+                self._read_digests_of_users(batch)
+                for batch in _batched(user_ids, batch_size))
+        for digests in digest_batches:
+            batch = [
+                auth_token for auth_token in self.get_many(digests).values()
+                if (user_pks is None or str(auth_token.user_id) in user_pks) and
+                _matches(auth_token, created_before, prefix, last_used_before)
+            ]
+            if batch:
+                yield batch
+
+    def _read_digests_of_users(self, user_pks) -> list:
+        keys = [self._make_user_key(user_pk) for user_pk in user_pks]
+        return [
+            digest for digests in self.read_many(keys).values() for digest in digests]
+
+    def _send_revocation_signals(self, batch, logged_out) -> None:
+        '''
+        Sends `token_expired` for each token of `batch`, with the username of
+        its user snapshot, and `user_logged_out` for each user not in
+        `logged_out` yet.
+        '''
+        for auth_token in batch:
+            user = auth_token.user
+            token_expired.send(sender=type(auth_token), username=user.get_username(),
+                               source="revoke")
+            if user.pk not in logged_out:
+                user_logged_out.send(sender=type(user), request=None, user=user)
+                logged_out.add(user.pk)
+
+    def _remove_tokens(self, digests) -> None:
+        self.remove_many([self.token_key_prefix + digest for digest in digests])
+        # The post_delete receivers of the token model do not run
+        token_cache = get_token_cache()
+        if token_cache is not None:
+            token_cache.delete_many(digests)
+        publish_revocations(digests)
+
+
+class DjangoCacheTokenStore(KeyValueTokenStore):
+    '''
+    Keeps tokens in the Django cache named by `TOKEN_STORE_CACHE_ALIAS`,
+    which has to be persistent and shared by all processes, e.g. Redis.
+    '''
+    token_key_prefix = 'knox:store:token:'
+    user_key_prefix = 'knox:store:user:'
+
+    def __init__(self, alias=None):
+        super().__init__()
+        self.cache = caches[alias or knox_settings.TOKEN_STORE_CACHE_ALIAS]
+
+    def read_many(self, keys) -> dict:
+        return self.cache.get_many(keys)
+
+    def add(self, key, value, timeout) -> bool:
+        return self.cache.add(key, value, timeout)
+
+    def write(self, key, value, timeout) -> None:
+        self.cache.set(key, value, timeout)
+
+    def remove_many(self, keys) -> None:
+        self.cache.delete_many(keys)
+
+    def purge_expired(self, batch_size=1000, sleep=0, send_signals=False) -> int:
+        # The cache evicts tokens once they expire
+        return 0
+
+
+class InMemoryTokenStore(KeyValueTokenStore):
+    '''
+    Keeps tokens in process memory, for tests and benchmarks. Entries expire
+    by the wall clock, like tokens.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def read_many(self, keys) -> dict:
+        now = timezone.now()
+        with self._lock:
+            return {
+                key: value
+                for key, (expires_at, value) in (
+                    (key, self._data[key]) for key in keys if key in self._data)
+                if expires_at is None or expires_at > now
+            }
+
+    def add(self, key, value, timeout) -> bool:
+        now = timezone.now()
+        with self._lock:
+            if key in self._data:
+                expires_at, _ = self._data[key]
+                if expires_at is None or expires_at > now:
+                    return False
+            self._data[key] = (self._get_expires_at(timeout), value)
+        return True
+
+    def write(self, key, value, timeout) -> None:
+        expires_at = self._get_expires_at(timeout)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+
+    def remove_many(self, keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def purge_expired(self, batch_size=1000, sleep=0, send_signals=False) -> int:
+        now = timezone.now()
+        with self._lock:
+            expired = [
+                key for key, (expires_at, _) in self._data.items()
+                if expires_at is not None and expires_at <= now
+            ]
+            for key in expired:
+                del self._data[key]
+        deleted = sum(key.startswith(self.token_key_prefix) for key in expired)
+        get_metrics().increment(
+            'knox_expired_tokens_deleted_total', deleted, source='purge')
+        return deleted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def _get_expires_at(self, timeout):
+        if timeout is None:
+            return None
+        return timezone.now() + timedelta(seconds=timeout)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+def _matches(auth_token, created_before, prefix, last_used_before) -> bool:
+    if created_before is not None and auth_token.created >= created_before:
+        return False
+    if last_used_before is not None and (
+            auth_token.last_used or auth_token.created) >= last_used_before:
+        return False
+    return not prefix or auth_token.token_key.startswith(prefix)
+
+
+def update_user_tokens(sender, instance, update_fields=None, **kwargs):
+    '''
+    `post_save` receiver for the user model.
+    '''
+    get_token_store().update_user(instance, update_fields)
+
+
+def delete_user_tokens(sender, instance, **kwargs):
+    '''
+    `post_delete` receiver for the user model.
+    '''
+    get_token_store().delete_user(instance)
+
+
+def get_token_store():
+    '''
+    Return the token store configured by `TOKEN_STORE`.
+    '''
+    global _token_store
+    store_class = knox_settings.TOKEN_STORE
+    if type(_token_store) is not store_class:
+        _token_store = store_class()
+    return _token_store
@@ -4,6 +4,7 @@ from knox import views
 
 urlpatterns = [
     path(r'login/', views.LoginView.as_view(), name='knox_login'),
+    path(r'refresh/', views.RefreshView.as_view(), name='knox_refresh'),
     path(r'logout/', views.LogoutView.as_view(), name='knox_logout'),
     path(r'logoutall/', views.LogoutAllView.as_view(), name='knox_logoutall'),
 ]
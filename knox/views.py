@@ -1,16 +1,25 @@
+from datetime import timedelta
+
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.db.models import Q
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router, transaction
 from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.translation import gettext_lazy as _
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.serializers import DateTimeField
 from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from knox.auth import TokenAuthentication
+from knox.auth import INVALID_TOKEN, TokenAuthentication, get_user_instance
+from knox.metrics import get_metrics
 from knox.models import get_token_model
+from knox.serializers import VerifyTokensSerializer
 from knox.settings import knox_settings
+from knox.stores import TOKEN_LIMIT_EVICTION_ORDER, get_token_store
 
 
 class LoginView(APIView):
@@ -29,6 +38,9 @@ class LoginView(APIView):
     def get_token_limit_per_user(self):
         return knox_settings.TOKEN_LIMIT_PER_USER
 
+    def get_token_limit_per_user_policy(self):
+        return knox_settings.TOKEN_LIMIT_PER_USER_POLICY
+
     def get_user_serializer_class(self):
         return knox_settings.USER_SERIALIZER
 
@@ -39,10 +51,14 @@ class LoginView(APIView):
         datetime_format = self.get_expiry_datetime_format()
         return DateTimeField(format=datetime_format).to_representation(expiry)
 
+    def get_token_user(self):
+        # request.user may be a LazyUser, which the token cannot refer to
+        return get_user_instance(self.request.user)
+
     def create_token(self):
         token_prefix = self.get_token_prefix()
-        return get_token_model().objects.create(
-            user=self.request.user, expiry=self.get_token_ttl(), prefix=token_prefix
+        return get_token_store().create(
+            self.get_token_user(), self.get_token_ttl(), prefix=token_prefix
         )
 
     def get_post_response_data(self, request, token, instance):
@@ -63,21 +79,99 @@ class LoginView(APIView):
         data = self.get_post_response_data(request, token, instance)
         return Response(data)
 
+    def get_token_limit_response(self):
+        get_metrics().increment('knox_logins_total', result='limit_rejected')
+        return Response(
+            {"error": "Maximum amount of tokens allowed per user exceeded."},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    def create_token_within_limit(self, token_limit_per_user):
+        '''
+        Enforce the token limit and create a token, returning `None` if the
+        limit is reached and the policy is to reject.
+
+        The `TOKEN_STORE` checks the limit, see
+        `BaseTokenStore.create_within_limit`: `ORMTokenStore` locks the user
+        row so that concurrent logins of the same user cannot overshoot it.
+        '''
+        policy = self.get_token_limit_per_user_policy()
+        if policy != 'reject' and policy not in TOKEN_LIMIT_EVICTION_ORDER:
+            raise ImproperlyConfigured(
+                "TOKEN_LIMIT_PER_USER_POLICY must be one of 'reject', "
+                + ", ".join(f"'{name}'" for name in TOKEN_LIMIT_EVICTION_ORDER)
+            )
+        return get_token_store().create_within_limit(
+            self.get_token_user(), token_limit_per_user, policy, self.create_token)
+
     def post(self, request, format=None):
         token_limit_per_user = self.get_token_limit_per_user()
-        if token_limit_per_user is not None:
-            now = timezone.now()
-            token = request.user.auth_token_set.filter(
-                Q(expiry__gt=now) | Q(expiry__isnull=True)
-            )
-            if token.count() >= token_limit_per_user:
-                return Response(
-                    {"error": "Maximum amount of tokens allowed per user exceeded."},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-        instance, token = self.create_token()
+        if token_limit_per_user is None:
+            instance, token = self.create_token()
+        else:
+            created = self.create_token_within_limit(token_limit_per_user)
+            if created is None:
+                return self.get_token_limit_response()
+            instance, token = created
         user_logged_in.send(sender=request.user.__class__,
                             request=request, user=request.user)
+        get_metrics().increment('knox_logins_total', result='success')
+        return self.get_post_response(request, token, instance)
+
+
+class RefreshView(LoginView):
+    '''
+    Exchanges the knox token the request is authenticated with for a new
+    one, so that clients can rotate tokens without logging in again.
+    '''
+    authentication_classes = (TokenAuthentication,)
+
+    def get_token_ttl(self):
+        '''
+        Returns `TOKEN_TTL`, shortened so that the new token does not outlive
+        `AUTO_REFRESH_MAX_TTL` counted from the creation of the token it
+        replaces.
+        '''
+        token_ttl = super().get_token_ttl()
+        max_ttl = knox_settings.AUTO_REFRESH_MAX_TTL
+        if max_ttl is None:
+            return token_ttl
+        remaining_ttl = self.request.auth.created + max_ttl - timezone.now()
+        if token_ttl is None:
+            return remaining_ttl
+        return min(token_ttl, remaining_ttl)
+
+    def get_token_user(self):
+        return self.request.auth.user
+
+    def create_token(self, created=None):
+        token_prefix = self.get_token_prefix()
+        return get_token_store().create(
+            self.get_token_user(), self.get_token_ttl(), prefix=token_prefix,
+            created=created,
+        )
+
+    def rotate_token(self):
+        '''
+        Atomically deletes the token of the request and creates its
+        replacement, which keeps the `created` time of the replaced token.
+
+        Raises `AuthenticationFailed` if the token has already been replaced
+        by a concurrent request, and `PermissionDenied` if the token is past
+        `AUTO_REFRESH_MAX_TTL`, since its replacement would be expired.
+        '''
+        old_token = self.request.auth
+        token_ttl = self.get_token_ttl()
+        if token_ttl is not None and token_ttl <= timedelta(0):
+            raise PermissionDenied(_('Token can no longer be refreshed.'))
+        with transaction.atomic(using=router.db_for_write(get_token_model())):
+            if not get_token_store().delete(old_token):
+                raise AuthenticationFailed(_('Invalid token.'))
+            return self.create_token(created=old_token.created)
+
+    def post(self, request, format=None):
+        instance, token = self.rotate_token()
+        get_metrics().increment('knox_token_refreshes_total')
         return self.get_post_response(request, token, instance)
 
 
@@ -89,9 +183,10 @@ class LogoutView(APIView):
         return Response(None, status=status.HTTP_204_NO_CONTENT)
 
     def post(self, request, format=None):
-        request._auth.delete()
+        get_token_store().delete(request._auth)
         user_logged_out.send(sender=request.user.__class__,
                              request=request, user=request.user)
+        get_metrics().increment('knox_logouts_total', scope='token')
         return self.get_post_response(request)
 
 
@@ -107,7 +202,111 @@ class LogoutAllView(APIView):
         return Response(None, status=status.HTTP_204_NO_CONTENT)
 
     def post(self, request, format=None):
-        request.user.auth_token_set.all().delete()
+        get_token_store().delete_for_user(request.user)
         user_logged_out.send(sender=request.user.__class__,
                              request=request, user=request.user)
+        get_metrics().increment('knox_logouts_total', scope='all')
         return self.get_post_response(request)
+
+
+class IntrospectView(APIView):
+    '''
+    Tells whether the token in the `Authorization` header is active, in a
+    response that caches, e.g. an edge proxy, may keep until the token
+    expires but for no longer than `INTROSPECTION_MAX_AGE` seconds.
+    '''
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get_max_age(self):
+        return knox_settings.INTROSPECTION_MAX_AGE
+
+    def get_token_authentication(self):
+        return TokenAuthentication()
+
+    def format_expiry_datetime(self, expiry):
+        datetime_format = knox_settings.EXPIRY_DATETIME_FORMAT
+        return DateTimeField(format=datetime_format).to_representation(expiry)
+
+    def introspect(self, request):
+        '''
+        Returns the `TokenVerification` of the token of the request, which
+        is neither renewed nor recorded as used.
+        '''
+        token_authentication = self.get_token_authentication()
+        try:
+            token = token_authentication.get_token_from_header(request)
+        except AuthenticationFailed:
+            return INVALID_TOKEN
+        if token is None:
+            return INVALID_TOKEN
+        return token_authentication.verify_tokens([token], record_use=False)[0]
+
+    def get_response_max_age(self, result) -> int:
+        max_age = self.get_max_age()
+        if result.expiry is None:
+            return max_age
+        remaining = (result.expiry - timezone.now()).total_seconds()
+        return max(0, min(max_age, int(remaining)))
+
+    def get_response_data(self, request, result):
+        if not result.valid:
+            return {'active': False}
+        return {
+            'active': True,
+            'user_id': result.user_id,
+            'expiry': self.format_expiry_datetime(result.expiry),
+        }
+
+    def get(self, request, format=None):
+        result = self.introspect(request)
+        response = Response(self.get_response_data(request, result))
+        # Shared caches only store answers to requests with credentials if
+        # told to, and must keep one per token
+        patch_cache_control(
+            response, public=True, max_age=self.get_response_max_age(result))
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class VerifyTokensView(APIView):
+    '''
+    Verifies a batch of tokens posted as `{"tokens": [...]}`, e.g. by an API
+    gateway, with `TokenAuthentication.verify_tokens`.
+
+    It is not included in `knox.urls`. Only admin users may call it; set
+    `permission_classes` to whatever identifies your gateway.
+    '''
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    permission_classes = (IsAdminUser,)
+    max_tokens = 100
+
+    def get_max_tokens(self):
+        return self.max_tokens
+
+    def get_token_authentication(self):
+        return TokenAuthentication()
+
+    def format_expiry_datetime(self, expiry):
+        datetime_format = knox_settings.EXPIRY_DATETIME_FORMAT
+        return DateTimeField(format=datetime_format).to_representation(expiry)
+
+    def get_post_response_data(self, request, results):
+        return {
+            'results': [
+                {
+                    'valid': result.valid,
+                    'user_id': result.user_id,
+                    'expiry': self.format_expiry_datetime(result.expiry),
+                }
+                for result in results
+            ]
+        }
+
+    def post(self, request, format=None):
+        serializer = VerifyTokensSerializer(
+            data=request.data, context={'request': request, 'view': self})
+        serializer.is_valid(raise_exception=True)
+        results = self.get_token_authentication().verify_tokens(
+            serializer.validated_data['tokens'])
+        return Response(self.get_post_response_data(request, results))
@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "knox",
+    "tests",
 ]
 
 MIDDLEWARE = [
@@ -53,7 +54,12 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": "db.sqlite3",
-    }
+    },
+    # Stands in for a read replica in the tests of knox.routers
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "db_replica.sqlite3",
+    },
 }
 
 WSGI_APPLICATION = "knox_project.wsgi.application"
@@ -3,10 +3,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from knox.views import IntrospectView
+
 from .views import RootView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('knox.urls')),
+    path('api/introspect/', IntrospectView.as_view(), name='knox_introspect'),
     path('api/', RootView.as_view(), name="api-root"),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -60,7 +60,7 @@ setup(
     # You can just specify the packages manually here if your project is
     # simple. Or you can use find_packages().
     packages=find_packages(
-        exclude=['contrib', 'docs', 'tests*', 'knox_project']),
+        exclude=['contrib', 'docs', 'tests*', 'benchmarks*', 'knox_project']),
 
     # List run-time dependencies here.  These will be installed by pip when
     # your project is installed. For an analysis of "install_requires" vs pip's
@@ -79,6 +79,7 @@ setup(
     extras_require={
         'dev': [],
         'test': [],
+        'async': ['adrf'],
     },
 
     # If there are data files included in your packages that need to be
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import models
+
+from knox.models import (
+    AbstractBinaryDigestAuthToken, AbstractExpiryBucketAuthToken,
+)
+
+
+class BinaryDigestAuthToken(AbstractBinaryDigestAuthToken):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='binary_digest_auth_token_set')
+
+
+class ExpiryBucketAuthToken(AbstractExpiryBucketAuthToken):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='expiry_bucket_auth_token_set')
+
+
+class RelatedExpiryBucketAuthToken(AbstractExpiryBucketAuthToken):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             related_name='related_expiry_bucket_auth_token_set')
+
+
+class TokenSession(models.Model):
+    token = models.ForeignKey(RelatedExpiryBucketAuthToken, on_delete=models.CASCADE)
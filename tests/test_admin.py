@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from knox.models import AuthToken
+
+User = get_user_model()
+
+
+class AuthTokenAdminTestCase(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'hunter2')
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.client.force_login(self.admin)
+
+    def test_revoke_tokens_action(self):
+        tokens = [AuthToken.objects.create(user=self.user)[0] for _ in range(3)]
+        response = self.client.post(reverse('admin:knox_authtoken_changelist'), {
+            'action': 'revoke_tokens',
+            '_selected_action': [token.pk for token in tokens[:2]],
+        }, follow=True)
+        self.assertContains(response, 'Revoked 2 tokens.')
+        self.assertEqual(list(AuthToken.objects.all()), tokens[2:])
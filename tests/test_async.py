@@ -0,0 +1,88 @@
+import base64
+import unittest
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+
+try:
+    from knox import async_views
+except ImportError:
+    async_views = None
+
+User = get_user_model()
+
+
+class AsyncTokenAuthenticationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+
+    async def test_aauthenticate_credentials(self):
+        instance, token = await AuthToken.objects.acreate(user=self.user)
+        user, auth_token = await TokenAuthentication().aauthenticate_credentials(
+            token.encode())
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(auth_token.digest, instance.digest)
+
+    async def test_aauthenticate_credentials_rejects_expired_token(self):
+        _, token = await AuthToken.objects.acreate(
+            user=self.user, expiry=timedelta(seconds=-1))
+        with self.assertRaises(AuthenticationFailed):
+            await TokenAuthentication().aauthenticate_credentials(token.encode())
+        self.assertFalse(await AuthToken.objects.aexists())
+
+    async def test_aauthenticate_reads_header(self):
+        _, token = await AuthToken.objects.acreate(user=self.user)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token}')
+        user, _ = await TokenAuthentication().aauthenticate(request)
+        self.assertEqual(user.pk, self.user.pk)
+
+
+@unittest.skipIf(async_views is None, 'adrf is not installed')
+class AsyncViewsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.factory = APIRequestFactory()
+
+    async def test_login_creates_token(self):
+        credentials = base64.b64encode(b'john.doe:hunter2').decode()
+        request = self.factory.post('/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+        response = await async_views.AsyncLoginView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('token', response.data)
+        self.assertEqual(await AuthToken.objects.acount(), 1)
+
+    async def test_logout_deletes_token(self):
+        await AuthToken.objects.acreate(user=self.user)
+        _, token = await AuthToken.objects.acreate(user=self.user)
+        request = self.factory.post('/', HTTP_AUTHORIZATION=f'Token {token}')
+        response = await async_views.AsyncLogoutView.as_view()(request)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(await AuthToken.objects.acount(), 1)
+
+    async def test_logout_all_deletes_tokens(self):
+        other_user = await sync_to_async(User.objects.create_user)('jane.doe')
+        await AuthToken.objects.acreate(user=other_user)
+        await AuthToken.objects.acreate(user=self.user)
+        _, token = await AuthToken.objects.acreate(user=self.user)
+        request = self.factory.post('/', HTTP_AUTHORIZATION=f'Token {token}')
+        response = await async_views.AsyncLogoutAllView.as_view()(request)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(await AuthToken.objects.acount(), 1)
+
+    async def test_refresh_replaces_token(self):
+        instance, token = await AuthToken.objects.acreate(user=self.user)
+        request = self.factory.post('/', HTTP_AUTHORIZATION=f'Token {token}')
+        response = await async_views.AsyncRefreshView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['token'], token)
+        self.assertFalse(await AuthToken.objects.filter(pk=instance.pk).aexists())
+        self.assertEqual(await AuthToken.objects.acount(), 1)
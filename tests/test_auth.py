@@ -0,0 +1,279 @@
+from datetime import timedelta
+from importlib import reload
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from knox import auth, crypto
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.settings import CONSTANTS, knox_settings
+from knox.signals import token_expired
+
+User = get_user_model()
+
+no_inline_cleanup_knox = knox_settings.defaults.copy()
+no_inline_cleanup_knox["INLINE_TOKEN_CLEANUP"] = False
+
+
+class AuthenticationQueryCountTestCase(TestCase):
+    """
+    Guards the number of queries `TokenAuthentication` runs per request.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        for _ in range(3):
+            AuthToken.objects.create(user=self.user)
+
+    def authenticate(self, token):
+        return TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_successful_authentication(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        # token lookup joined with the user, then the expired token cleanup
+        with self.assertNumQueries(2):
+            user, _ = self.authenticate(token)
+            self.assertEqual(user.get_username(), 'john.doe')
+
+    def test_successful_authentication_without_inline_cleanup(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        with override_settings(REST_KNOX=no_inline_cleanup_knox):
+            reload(auth)
+            with self.assertNumQueries(1):
+                user, _ = self.authenticate(token)
+                self.assertTrue(user.is_active)
+        reload(auth)
+
+    def test_expired_authentication(self):
+        for _ in range(2):
+            AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        _, token = AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        # token lookup, cleanup scan, two other expired tokens and the
+        # presented token deleted
+        with self.assertNumQueries(5):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+
+    def test_colliding_token_keys(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        AuthToken.objects.bulk_create(
+            AuthToken(digest=str(i), token_key=instance.token_key, user=self.user)
+            for i in range(50)
+        )
+        with override_settings(REST_KNOX=no_inline_cleanup_knox):
+            reload(auth)
+            with self.assertNumQueries(1):
+                _, auth_token = self.authenticate(token)
+        reload(auth)
+        self.assertEqual(auth_token.digest, instance.digest)
+
+    def test_invalid_authentication(self):
+        with self.assertNumQueries(1):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate('0' * knox_settings.AUTH_TOKEN_CHARACTER_LENGTH)
+
+    def test_malformed_tokens_skip_database(self):
+        length = knox_settings.AUTH_TOKEN_CHARACTER_LENGTH
+        malformed = [
+            '0' * (length - 1),
+            'x' * (CONSTANTS.MAXIMUM_TOKEN_PREFIX_LENGTH + 1) + '0' * length,
+            'g' * length,
+            'A' * length,
+            '0' * (length - 1) + '\n',
+        ]
+        for token in malformed:
+            with self.subTest(token=token), self.assertNumQueries(0):
+                with self.assertRaises(AuthenticationFailed):
+                    self.authenticate(token)
+
+    def test_odd_token_length(self):
+        with override_settings(REST_KNOX=dict(
+                no_inline_cleanup_knox, AUTH_TOKEN_CHARACTER_LENGTH=63)):
+            reload(crypto)
+            reload(auth)
+            instance, token = AuthToken.objects.create(user=self.user)
+            _, auth_token = self.authenticate(token)
+        reload(crypto)
+        reload(auth)
+        self.assertEqual(len(token), 62)
+        self.assertEqual(auth_token.digest, instance.digest)
+
+    def test_legacy_token_lengths(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        shorter_tokens_knox = dict(no_inline_cleanup_knox, AUTH_TOKEN_CHARACTER_LENGTH=32)
+        with override_settings(REST_KNOX=shorter_tokens_knox):
+            reload(auth)
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+            with override_settings(REST_KNOX=dict(
+                    shorter_tokens_knox, LEGACY_AUTH_TOKEN_CHARACTER_LENGTHS=[64])):
+                reload(auth)
+                self.authenticate(token)
+        reload(auth)
+
+    def test_non_utf8_token_is_rejected(self):
+        with self.assertNumQueries(0):
+            with self.assertRaises(AuthenticationFailed):
+                TokenAuthentication().authenticate_credentials(b'\xff' * 64)
+
+    def test_tokens_with_any_prefix_are_accepted(self):
+        _, token = AuthToken.objects.create(
+            user=self.user, prefix='x' * CONSTANTS.MAXIMUM_TOKEN_PREFIX_LENGTH)
+        user, _ = self.authenticate(token)
+        self.assertEqual(user, self.user)
+
+
+class TokenQuerysetTestCase(TestCase):
+
+    def test_get_token_queryset_can_be_customised(self):
+        class NarrowTokenAuthentication(TokenAuthentication):
+            def get_token_queryset(self):
+                return super().get_token_queryset().only(
+                    'digest', 'token_key', 'expiry', 'created',
+                    'user__id', 'user__is_active')
+
+        user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        _, token = AuthToken.objects.create(user=user)
+        user, _ = NarrowTokenAuthentication().authenticate_credentials(token.encode())
+        self.assertEqual(user.get_deferred_fields() & {'username', 'password'},
+                         {'username', 'password'})
+
+
+lazy_user_knox = no_inline_cleanup_knox.copy()
+lazy_user_knox["LAZY_USER"] = True
+
+
+class LazyUserTestCase(TestCase):
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=lazy_user_knox)
+        self.override.enable()
+        reload(auth)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.instance, self.token = AuthToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        reload(auth)
+
+    def authenticate(self):
+        return auth.TokenAuthentication().authenticate_credentials(self.token.encode())
+
+    def test_lookup_fetches_only_user_pk_is_active_and_username(self):
+        with CaptureQueriesContext(connection) as queries:
+            user, _ = self.authenticate()
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"auth_user"."username"', queries[0]['sql'])
+        self.assertNotIn('"auth_user"."email"', queries[0]['sql'])
+        self.assertNotIn('"auth_user"."password"', queries[0]['sql'])
+        self.assertIsInstance(user, auth.LazyUser)
+
+    def test_eager_attributes_are_served_without_query(self):
+        user, _ = self.authenticate()
+        with self.assertNumQueries(0):
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.id, self.user.id)
+            self.assertTrue(user.is_active)
+            self.assertTrue(user.is_authenticated)
+            self.assertFalse(user.is_anonymous)
+            self.assertTrue(user)
+            self.assertIsInstance(user, User)
+            self.assertEqual(user, self.user)
+            self.assertEqual(self.user, user)
+            self.assertEqual(hash(user), hash(self.user))
+            self.assertEqual(user.get_username(), 'john.doe')
+        self.assertIs(auth.get_user_instance(user), user.__dict__['_user'])
+        self.assertIs(auth.get_user_instance(self.user), self.user)
+
+    def test_remaining_fields_are_loaded_in_one_query(self):
+        user, auth_token = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'john.doe')
+            self.assertEqual(user.email, 'john@example.com')
+            self.assertTrue(user.check_password('hunter2'))
+        self.assertEqual(auth_token.user.get_deferred_fields(), set())
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    async def test_async_cleanup_sends_username(self):
+        usernames = []
+
+        def handler(sender, username, **kwargs):
+            usernames.append(username)
+
+        await AuthToken.objects.acreate(user=self.user, expiry=timedelta(seconds=-1))
+        token_expired.connect(handler)
+        with override_settings(REST_KNOX=dict(lazy_user_knox, INLINE_TOKEN_CLEANUP=True)):
+            reload(auth)
+            try:
+                await auth.TokenAuthentication().aauthenticate_credentials(
+                    self.token.encode())
+            finally:
+                token_expired.disconnect(handler)
+        self.assertEqual(usernames, ['john.doe'])
+
+
+class VerifyTokensTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.other_user = User.objects.create_user(
+            'jane.doe', 'jane@example.com', 'hunter2')
+
+    def test_batch_is_verified_in_a_single_query(self):
+        tokens = []
+        for user in (self.user, self.other_user) * 5:
+            instance, token = AuthToken.objects.create(user=user)
+            tokens.append(token)
+        with self.assertNumQueries(1):
+            results = TokenAuthentication().verify_tokens(tokens)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(result.valid for result in results))
+        self.assertEqual(results[0].user_id, self.user.pk)
+        self.assertEqual(results[1].user_id, self.other_user.pk)
+        self.assertEqual(results[-1].expiry, instance.expiry)
+
+    def test_invalid_tokens(self):
+        length = knox_settings.AUTH_TOKEN_CHARACTER_LENGTH
+        instance, valid_token = AuthToken.objects.create(user=self.user)
+        _, expired_token = AuthToken.objects.create(
+            user=self.user, expiry=timedelta(seconds=-1))
+        _, inactive_token = AuthToken.objects.create(user=self.other_user)
+        self.other_user.is_active = False
+        self.other_user.save()
+        tokens = [
+            '0' * length, 'g' * length, b'\xff' * length,
+            expired_token, inactive_token, valid_token.encode(),
+        ]
+        with self.assertNumQueries(1):
+            results = TokenAuthentication().verify_tokens(tokens)
+        self.assertEqual(results[:5], [auth.INVALID_TOKEN] * 5)
+        self.assertEqual(
+            results[5], auth.TokenVerification(True, self.user.pk, instance.expiry))
+        # expired tokens are left for purge_expired
+        self.assertEqual(AuthToken.objects.count(), 3)
+
+    def test_empty_batch_skips_database(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(TokenAuthentication().verify_tokens([]), [])
+
+    def test_valid_tokens_are_renewed(self):
+        _, token = AuthToken.objects.create(user=self.user, expiry=timedelta(hours=1))
+        auto_refresh_knox = knox_settings.defaults.copy()
+        auto_refresh_knox["AUTO_REFRESH"] = True
+        with override_settings(REST_KNOX=auto_refresh_knox):
+            reload(auth)
+            (result,) = auth.TokenAuthentication().verify_tokens([token])
+        reload(auth)
+        self.assertTrue(result.valid)
+        self.assertEqual(AuthToken.objects.get().expiry, result.expiry)
+        self.assertGreater(result.expiry - timezone.now(), timedelta(hours=9))
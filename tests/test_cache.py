@@ -0,0 +1,235 @@
+from datetime import timedelta
+from importlib import reload
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from freezegun import freeze_time
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from knox import auth, cache
+from knox.auth import TokenAuthentication
+from knox.cache import LocMemTokenCache
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+root_url = reverse('api-root')
+
+locmem_cache_knox = knox_settings.defaults.copy()
+locmem_cache_knox["TOKEN_CACHE"] = 'knox.cache.LocMemTokenCache'
+
+django_cache_knox = knox_settings.defaults.copy()
+django_cache_knox["TOKEN_CACHE"] = 'knox.cache.DjangoTokenCache'
+
+locmem_negative_cache_knox = knox_settings.defaults.copy()
+locmem_negative_cache_knox["NEGATIVE_TOKEN_CACHE"] = 'knox.cache.LocMemNegativeTokenCache'
+
+django_negative_cache_knox = knox_settings.defaults.copy()
+django_negative_cache_knox["NEGATIVE_TOKEN_CACHE"] = 'knox.cache.DjangoNegativeTokenCache'
+django_negative_cache_knox["TOKEN_CACHE"] = 'knox.cache.DjangoTokenCache'
+
+
+class LocMemTokenCacheTestCase(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        token_cache = LocMemTokenCache(max_size=2)
+        token_cache.set('a', 'token-a', 60)
+        token_cache.set('b', 'token-b', 60)
+        token_cache.get('a')
+        token_cache.set('c', 'token-c', 60)
+        self.assertEqual(len(token_cache), 2)
+        self.assertEqual(token_cache.get('a'), 'token-a')
+        self.assertIsNone(token_cache.get('b'))
+
+    def test_entries_expire(self):
+        token_cache = LocMemTokenCache(max_size=2)
+        with patch('knox.cache.time.monotonic', return_value=100):
+            token_cache.set('a', 'token-a', 10)
+        with patch('knox.cache.time.monotonic', return_value=105):
+            self.assertEqual(token_cache.get('a'), 'token-a')
+        with patch('knox.cache.time.monotonic', return_value=111):
+            self.assertIsNone(token_cache.get('a'))
+        self.assertEqual(len(token_cache), 0)
+
+
+class CachedAuthenticationTestCase(APITestCase):
+    knox_settings = locmem_cache_knox
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=self.knox_settings)
+        self.override.enable()
+        reload(cache)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.instance, self.token = AuthToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        reload(cache)
+
+    def authenticate(self):
+        return TokenAuthentication().authenticate_credentials(self.token.encode())
+
+    def test_cached_token_skips_database(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, auth_token = self.authenticate()
+        self.assertEqual(user, self.user)
+        self.assertEqual(auth_token.digest, self.instance.digest)
+
+    def test_cached_token_honours_expiry(self):
+        self.authenticate()
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        with freeze_time(self.instance.expiry + timedelta(seconds=1)):
+            response = self.client.get(root_url)
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_logout_invalidates_cached_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        self.client.get(root_url)
+        self.client.post(reverse('knox_logout'))
+        self.assertEqual(self.client.get(root_url).status_code, 401)
+
+    def test_logout_all_invalidates_cached_tokens(self):
+        _, other_token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % other_token)
+        self.client.get(root_url)
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        self.client.post(reverse('knox_logoutall'))
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % other_token)
+        self.assertEqual(self.client.get(root_url).status_code, 401)
+
+    def assert_deleted_token_is_rejected(self, **overrides):
+        try:
+            with override_settings(REST_KNOX={**self.knox_settings, **overrides}):
+                reload(cache)
+                reload(auth)
+                auth.TokenAuthentication().authenticate_credentials(self.token.encode())
+                # Deleted by another process, whose receivers cannot drop it
+                # from the cache of this one
+                AuthToken.objects.filter(pk=self.instance.pk)._raw_delete('default')
+                with self.assertRaises(AuthenticationFailed):
+                    auth.TokenAuthentication().authenticate_credentials(
+                        self.token.encode())
+                self.assertIsNone(cache.get_token_cache().get(self.instance.digest))
+        finally:
+            reload(cache)
+            reload(auth)
+
+    def test_renewing_deleted_cached_token_is_rejected(self):
+        self.assert_deleted_token_is_rejected(AUTO_REFRESH=True, MIN_REFRESH_INTERVAL=0)
+
+    def test_recording_use_of_deleted_cached_token_is_rejected(self):
+        self.assert_deleted_token_is_rejected(TRACK_LAST_USED=True, LAST_USED_INTERVAL=0)
+
+    def test_deactivating_user_invalidates_cached_tokens(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        response = self.client.get(root_url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data, {"detail": "User inactive or deleted."})
+
+
+class DjangoCacheAuthenticationTestCase(CachedAuthenticationTestCase):
+    knox_settings = django_cache_knox
+
+    def test_uses_configured_cache(self):
+        self.assertIsInstance(cache.get_token_cache(), cache.DjangoTokenCache)
+
+    def test_caches_user_snapshot(self):
+        self.authenticate()
+        auth_token = cache.get_token_cache().get(self.instance.digest)
+        self.assertNotIn('password', auth_token.user.__dict__)
+        self.assertEqual(auth_token.user.get_deferred_fields(), {
+            'password', 'last_login', 'is_superuser', 'first_name', 'last_name',
+            'email', 'is_staff', 'date_joined'})
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+            self.assertEqual(user.get_username(), 'john.doe')
+            self.assertTrue(user.is_active)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'john@example.com')
+
+
+class ReceiversTestCase(TestCase):
+
+    def test_token_deletion_is_fast_without_token_cache(self):
+        user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        AuthToken.objects.create(user=user)
+        AuthToken.objects.create(user=user)
+        self.assertFalse(post_delete.has_listeners(AuthToken))
+        with self.assertNumQueries(1):
+            AuthToken.objects.filter(user=user).delete()
+
+    def test_receivers_follow_settings(self):
+        with override_settings(REST_KNOX=locmem_cache_knox):
+            self.assertTrue(post_delete.has_listeners(AuthToken))
+            self.assertTrue(post_save.has_listeners(User))
+        self.assertFalse(post_delete.has_listeners(AuthToken))
+
+
+class NegativeCacheAuthenticationTestCase(TestCase):
+    knox_settings = locmem_negative_cache_knox
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=self.knox_settings)
+        self.override.enable()
+        reload(cache)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+
+    def tearDown(self):
+        self.override.disable()
+        reload(cache)
+
+    def authenticate(self, token):
+        return TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_unknown_token_is_rejected_from_cache(self):
+        token = '0' * knox_settings.AUTH_TOKEN_CHARACTER_LENGTH
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        with self.assertNumQueries(0):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+
+    def test_revoked_token_is_rejected_from_cache(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        instance.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        with self.assertNumQueries(0):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+
+    def test_rejection_expires(self):
+        token = '0' * knox_settings.AUTH_TOKEN_CHARACTER_LENGTH
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        ttl = knox_settings.NEGATIVE_TOKEN_CACHE_TTL
+        with freeze_time(timedelta(seconds=ttl + 1)), self.assertNumQueries(1):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+
+    def test_valid_tokens_are_not_cached(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        self.assertIsNone(cache.get_negative_token_cache().get(
+            AuthToken.objects.get().digest))
+
+
+class DjangoNegativeCacheAuthenticationTestCase(NegativeCacheAuthenticationTestCase):
+    knox_settings = django_negative_cache_knox
+
+    def test_keys_do_not_clash_with_token_cache(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        cache.cache_invalid_digest('0' * 128)
+        self.assertIsNotNone(cache.get_token_cache().get(instance.digest))
+        self.assertIsNone(cache.get_token_cache().get('0' * 128))
@@ -0,0 +1,136 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.signals import token_expired
+
+User = get_user_model()
+
+
+class PurgeExpiredCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        for _ in range(5):
+            AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        AuthToken.objects.create(user=self.user)
+        AuthToken.objects.create(user=self.user, expiry=None)
+
+    def test_deletes_only_expired_tokens(self):
+        out = StringIO()
+        call_command('knox_purge_expired', '--batch-size', '2', stdout=out)
+        self.assertEqual(AuthToken.objects.count(), 2)
+        self.assertIn('Deleted 5 expired token(s).', out.getvalue())
+
+    def test_deletes_in_batches(self):
+        # expired keys and a fast DELETE for each of the three batches; the
+        # last batch is partial
+        with self.assertNumQueries(6):
+            deleted = AuthToken.objects.purge_expired(batch_size=2)
+        self.assertEqual(deleted, 5)
+
+    def test_signals_are_optional(self):
+        usernames = []
+
+        def handler(sender, username, source, **kwargs):
+            usernames.append((username, source))
+
+        token_expired.connect(handler)
+        try:
+            AuthToken.objects.purge_expired(batch_size=3)
+            self.assertEqual(usernames, [])
+            AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+            call_command('knox_purge_expired', '--send-signals', stdout=StringIO())
+        finally:
+            token_expired.disconnect(handler)
+        self.assertEqual(usernames, [('john.doe', 'purge')])
+
+
+class CreateTokensCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.user2 = User.objects.create_user('jane.doe', 'jane@example.com', 'hunter2')
+
+    def test_creates_tokens(self):
+        out = StringIO()
+        call_command('knox_create_tokens', 'john.doe', 'jane.doe', '--count', '2',
+                     '--no-expiry', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(AuthToken.objects.filter(expiry__isnull=True).count(), 4)
+        username, token = lines[-1].split()
+        self.assertEqual(username, 'jane.doe')
+        user, _ = TokenAuthentication().authenticate_credentials(token.encode())
+        self.assertEqual(user, self.user2)
+
+    def test_unknown_user(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown user(s): nobody'):
+            call_command('knox_create_tokens', 'john.doe', 'nobody', stdout=StringIO())
+        self.assertFalse(AuthToken.objects.exists())
+
+
+class RevokeCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.user2 = User.objects.create_user('jane.doe', 'jane@example.com', 'hunter2')
+        AuthToken.objects.create(user=self.user)
+        AuthToken.objects.create(user=self.user2, prefix='abc_')
+
+    def test_revokes_tokens_of_users(self):
+        out = StringIO()
+        call_command('knox_revoke', '--user-ids', str(self.user.pk), stdout=out)
+        self.assertIn('Revoked 1 token(s).', out.getvalue())
+        self.assertEqual(list(AuthToken.objects.values_list('user', flat=True)),
+                         [self.user2.pk])
+
+    def test_revokes_tokens_created_before(self):
+        call_command('knox_revoke', '--created-before', '2000-01-01T00:00:00',
+                     stdout=StringIO())
+        self.assertEqual(AuthToken.objects.count(), 2)
+        call_command('knox_revoke', '--created-before',
+                     (timezone.now() + timedelta(seconds=1)).isoformat(),
+                     stdout=StringIO())
+        self.assertEqual(AuthToken.objects.count(), 0)
+
+    def test_revokes_tokens_by_prefix(self):
+        call_command('knox_revoke', '--prefix', 'abc_', stdout=StringIO())
+        self.assertEqual(list(AuthToken.objects.values_list('user', flat=True)),
+                         [self.user.pk])
+
+    def test_revokes_tokens_last_used_before(self):
+        now = timezone.now()
+        AuthToken.objects.filter(user=self.user).update(last_used=now)
+        AuthToken.objects.filter(user=self.user2).update(
+            created=now - timedelta(days=2))
+        call_command('knox_revoke', '--last-used-before',
+                     (now - timedelta(days=1)).isoformat(), stdout=StringIO())
+        self.assertEqual(list(AuthToken.objects.values_list('user', flat=True)),
+                         [self.user.pk])
+
+    def test_requires_a_filter_or_all(self):
+        with self.assertRaises(CommandError):
+            call_command('knox_revoke', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('knox_revoke', '--prefix', '', stdout=StringIO())
+        self.assertEqual(AuthToken.objects.count(), 2)
+        call_command('knox_revoke', '--all', stdout=StringIO())
+        self.assertEqual(AuthToken.objects.count(), 0)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('knox_revoke', '--all', '--dry-run', stdout=out)
+        self.assertIn('Would revoke 2 token(s).', out.getvalue())
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    def test_rejects_invalid_datetime(self):
+        with self.assertRaises(CommandError):
+            call_command('knox_revoke', '--created-before', 'yesterday',
+                         stdout=StringIO())
@@ -1,10 +1,25 @@
+import hashlib
+import hmac
+from importlib import reload
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
 
+from benchmarks import hash_token as hash_token_benchmark
+from knox import auth, crypto
+from knox.auth import TokenAuthentication
 from knox.crypto import create_token_string, hash_token, make_hex_compatible
+from knox.models import AuthToken
 from knox.settings import knox_settings
 
+blake2b_knox = knox_settings.defaults.copy()
+blake2b_knox["SECURE_HASH_ALGORITHM"] = 'hashlib.blake2b'
+blake2b_knox["SECURE_HASH_PEPPER"] = 'pepper'
+blake2b_knox["SECURE_HASH_DIGEST_SIZE"] = 32
+blake2b_knox["LEGACY_SECURE_HASH_ALGORITHMS"] = ['hashlib.sha512']
+
 
 class CryptoUtilsTestCase(TestCase):
     def test_create_token_string(self):
@@ -57,3 +72,87 @@ class CryptoUtilsTestCase(TestCase):
         self.assertEqual(len(result), 128)
         hex_chars = set('0123456789abcdef')
         self.assertTrue(all(c in hex_chars for c in result.lower()))
+
+    def test_hash_token_is_unchanged_by_dropping_hex_round_trip(self):
+        token = create_token_string()
+        self.assertEqual(
+            hash_token(token), hashlib.sha512(make_hex_compatible(token)).hexdigest())
+
+
+class HashConfigurationTestCase(TestCase):
+
+    def tearDown(self):
+        reload(crypto)
+
+    def hash_token(self, token, **overrides):
+        with override_settings(REST_KNOX=dict(knox_settings.defaults, **overrides)):
+            reload(crypto)
+            return crypto.hash_token(token)
+
+    def test_keyed_blake2b(self):
+        digest = self.hash_token(
+            'abc', SECURE_HASH_ALGORITHM='hashlib.blake2b',
+            SECURE_HASH_PEPPER='pepper', SECURE_HASH_DIGEST_SIZE=32)
+        self.assertEqual(
+            digest, hashlib.blake2b(b'abc', key=b'pepper', digest_size=32).hexdigest())
+
+    def test_unkeyed_blake2b(self):
+        digest = self.hash_token('abc', SECURE_HASH_ALGORITHM='hashlib.blake2b')
+        self.assertEqual(digest, hashlib.blake2b(b'abc').hexdigest())
+
+    def test_peppered_sha512_uses_hmac(self):
+        digest = self.hash_token('abc', SECURE_HASH_PEPPER=b'pepper')
+        self.assertEqual(
+            digest, hmac.new(b'pepper', b'abc', hashlib.sha512).hexdigest())
+
+    def test_truncated_sha512(self):
+        digest = self.hash_token('abc', SECURE_HASH_DIGEST_SIZE=32)
+        self.assertEqual(digest, hashlib.sha512(b'abc').hexdigest()[:64])
+
+
+class LegacyHashTestCase(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('john.doe', 'john@example.com')
+        self.legacy_instance, self.legacy_token = AuthToken.objects.create(user=self.user)
+        self.override = override_settings(REST_KNOX=blake2b_knox)
+        self.override.enable()
+        reload(crypto)
+
+    def tearDown(self):
+        self.override.disable()
+        reload(crypto)
+
+    def authenticate(self, token):
+        return TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_new_tokens_use_the_current_hash(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        self.assertEqual(len(instance.digest), 64)
+        _, auth_token = self.authenticate(token)
+        self.assertEqual(auth_token, instance)
+
+    def test_legacy_tokens_keep_verifying_in_one_query(self):
+        with override_settings(REST_KNOX=dict(blake2b_knox, INLINE_TOKEN_CLEANUP=False)):
+            reload(auth)
+            with self.assertNumQueries(1):
+                _, auth_token = auth.TokenAuthentication().authenticate_credentials(
+                    self.legacy_token.encode())
+        reload(auth)
+        self.assertEqual(auth_token, self.legacy_instance)
+
+    def test_legacy_tokens_are_rejected_without_legacy_algorithm(self):
+        with override_settings(REST_KNOX=dict(
+                blake2b_knox, LEGACY_SECURE_HASH_ALGORITHMS=[])):
+            reload(crypto)
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(self.legacy_token)
+
+
+class HashBenchmarkTestCase(TestCase):
+
+    def test_benchmark_runs(self):
+        with patch('builtins.print') as mock_print:
+            hash_token_benchmark.main(iterations=10)
+        self.assertEqual(
+            mock_print.call_count, len(hash_token_benchmark.HASH_CONFIGURATIONS))
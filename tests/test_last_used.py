@@ -0,0 +1,188 @@
+from datetime import timedelta
+from importlib import reload
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
+from rest_framework.test import APITestCase
+
+from knox import auth, cache, last_used, metrics, refresh, stores
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+
+last_used_knox = knox_settings.defaults.copy()
+last_used_knox["TRACK_LAST_USED"] = True
+last_used_knox["INLINE_TOKEN_CLEANUP"] = False
+last_used_knox["METRICS"] = 'knox.metrics.InMemoryMetrics'
+
+buffered_last_used_knox = last_used_knox.copy()
+buffered_last_used_knox["LAST_USED_BUFFER"] = 'knox.last_used.LocMemLastUsedBuffer'
+
+cache_buffered_last_used_knox = last_used_knox.copy()
+cache_buffered_last_used_knox["LAST_USED_BUFFER"] = 'knox.last_used.CacheLastUsedBuffer'
+
+token_cache_last_used_knox = last_used_knox.copy()
+token_cache_last_used_knox["TOKEN_CACHE"] = 'knox.cache.LocMemTokenCache'
+token_cache_last_used_knox["TOKEN_CACHE_TTL"] = 3600
+
+in_memory_store_last_used_knox = last_used_knox.copy()
+in_memory_store_last_used_knox["TOKEN_STORE"] = 'knox.stores.InMemoryTokenStore'
+
+buffered_in_memory_store_last_used_knox = in_memory_store_last_used_knox.copy()
+buffered_in_memory_store_last_used_knox["LAST_USED_BUFFER"] = (
+    'knox.last_used.LocMemLastUsedBuffer')
+
+MODULES = (metrics, cache, refresh, last_used, stores, auth)
+
+LAST_USED_UPDATES = 'knox_last_used_updates_total'
+
+
+class LastUsedTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.use_settings(last_used_knox)
+
+    def tearDown(self):
+        buffer = last_used.get_last_used_buffer()
+        if buffer is not None:
+            buffer.pop_pending()
+        self.override.disable()
+        for module in MODULES:
+            reload(module)
+
+    def use_settings(self, settings):
+        if hasattr(self, 'override'):
+            self.override.disable()
+        self.override = override_settings(REST_KNOX=settings)
+        self.override.enable()
+        for module in MODULES:
+            reload(module)
+        self.metrics = metrics.get_metrics()
+
+    def authenticate(self, token):
+        return auth.TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_disabled_by_default(self):
+        self.use_settings(knox_settings.defaults)
+        instance, token = AuthToken.objects.create(user=self.user)
+        with self.assertNumQueries(2):
+            self.authenticate(token)
+        self.assertIsNone(AuthToken.objects.get().last_used)
+
+    def test_last_used_is_sampled(self):
+        with freeze_time('2026-01-01 12:00:00'):
+            _, token = AuthToken.objects.create(user=self.user)
+            # lookup and the last_used update
+            with self.assertNumQueries(2):
+                self.authenticate(token)
+        with freeze_time('2026-01-01 12:04:59'):
+            with self.assertNumQueries(1):
+                self.authenticate(token)
+        self.assertEqual(
+            AuthToken.objects.get().last_used.isoformat(), '2026-01-01T12:00:00+00:00')
+        with freeze_time('2026-01-01 12:05:01'):
+            self.authenticate(token)
+        self.assertEqual(
+            AuthToken.objects.get().last_used.isoformat(), '2026-01-01T12:05:01+00:00')
+        self.assertEqual(self.metrics.get_count(LAST_USED_UPDATES, result='written'), 2)
+        self.assertEqual(self.metrics.get_count(LAST_USED_UPDATES, result='throttled'), 1)
+
+    def test_buffered_writes(self):
+        self.use_settings(buffered_last_used_knox)
+        with freeze_time('2026-01-01 12:00:00'):
+            tokens = [AuthToken.objects.create(user=self.user)[1] for _ in range(3)]
+            with self.assertNumQueries(3):
+                for token in tokens:
+                    self.authenticate(token)
+            # pending times spare later requests a second buffered write
+            self.authenticate(tokens[0])
+            self.assertFalse(
+                AuthToken.objects.filter(last_used__isnull=False).exists())
+            with self.assertNumQueries(1):
+                self.assertEqual(last_used.get_last_used_buffer().flush(), 3)
+        self.assertEqual(
+            AuthToken.objects.filter(last_used__isnull=False).count(), 3)
+        self.assertEqual(self.metrics.get_count(LAST_USED_UPDATES, result='buffered'), 3)
+        self.assertEqual(self.metrics.get_count(LAST_USED_UPDATES, result='throttled'), 1)
+
+    def test_cache_buffer(self):
+        self.use_settings(cache_buffered_last_used_knox)
+        _, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        buffer = last_used.get_last_used_buffer()
+        self.assertIsNotNone(buffer.get(AuthToken.objects.get().digest))
+        buffer.flush()
+        self.assertIsNotNone(AuthToken.objects.get().last_used)
+
+    def test_flushed_when_due(self):
+        self.use_settings(buffered_last_used_knox)
+        with freeze_time('2026-01-01 12:00:00'):
+            _, token = AuthToken.objects.create(user=self.user)
+            _, other_token = AuthToken.objects.create(user=self.user)
+        with freeze_time('2026-01-01 12:00:00') as frozen_time:
+            last_used.get_last_used_buffer()._last_flush -= (
+                knox_settings.AUTO_REFRESH_FLUSH_INTERVAL)
+            self.authenticate(token)
+            frozen_time.tick()
+        self.assertIsNotNone(AuthToken.objects.get(
+            digest=auth.hash_token(token)).last_used)
+
+    def test_cached_tokens(self):
+        self.use_settings(token_cache_last_used_knox)
+        with freeze_time('2026-01-01 12:00:00'):
+            _, token = AuthToken.objects.create(user=self.user)
+            self.authenticate(token)
+            with self.assertNumQueries(0):
+                _, auth_token = self.authenticate(token)
+        self.assertIsNotNone(auth_token.last_used)
+        with freeze_time('2026-01-01 12:10:00'):
+            with self.assertNumQueries(1):
+                self.authenticate(token)
+        self.assertEqual(
+            AuthToken.objects.get().last_used.isoformat(), '2026-01-01T12:10:00+00:00')
+
+    def test_verify_tokens(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        auth.TokenAuthentication().verify_tokens([token])
+        self.assertIsNotNone(AuthToken.objects.get().last_used)
+
+    def test_token_store(self):
+        self.use_settings(in_memory_store_last_used_knox)
+        _, token = stores.get_token_store().create(self.user, timedelta(hours=1))
+        self.authenticate(token)
+        _, auth_token = self.authenticate(token)
+        self.assertIsNotNone(auth_token.last_used)
+
+    def test_buffered_token_store(self):
+        self.use_settings(buffered_in_memory_store_last_used_knox)
+        store = stores.get_token_store()
+        instance, token = store.create(self.user, timedelta(hours=1))
+        self.authenticate(token)
+        self.assertIsNone(store.get([instance.digest]).last_used)
+        self.assertEqual(last_used.get_last_used_buffer().flush(), 1)
+        self.assertIsNotNone(store.get([instance.digest]).last_used)
+        self.assertFalse(AuthToken.objects.exists())
+
+
+class AsyncLastUsedTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.override = override_settings(REST_KNOX=last_used_knox)
+        self.override.enable()
+        for module in MODULES:
+            reload(module)
+
+    def tearDown(self):
+        self.override.disable()
+        for module in MODULES:
+            reload(module)
+
+    async def test_last_used_is_recorded(self):
+        _, token = await AuthToken.objects.acreate(user=self.user)
+        await auth.TokenAuthentication().aauthenticate_credentials(token.encode())
+        auth_token = await AuthToken.objects.aget()
+        self.assertIsNotNone(auth_token.last_used)
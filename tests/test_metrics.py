@@ -0,0 +1,184 @@
+import base64
+from datetime import timedelta
+from importlib import reload
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from knox import auth, cache, metrics, views
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+
+metrics_knox = knox_settings.defaults.copy()
+metrics_knox["METRICS"] = 'knox.metrics.InMemoryMetrics'
+
+auto_refresh_metrics_knox = metrics_knox.copy()
+auto_refresh_metrics_knox["AUTO_REFRESH"] = True
+
+token_cache_metrics_knox = metrics_knox.copy()
+token_cache_metrics_knox["TOKEN_CACHE"] = 'knox.cache.LocMemTokenCache'
+
+token_limit_metrics_knox = metrics_knox.copy()
+token_limit_metrics_knox["TOKEN_LIMIT_PER_USER"] = 1
+
+evict_oldest_metrics_knox = token_limit_metrics_knox.copy()
+evict_oldest_metrics_knox["TOKEN_LIMIT_PER_USER_POLICY"] = 'evict_oldest'
+
+STAGE_DURATION = 'knox_authentication_stage_duration_seconds'
+
+
+class MetricsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.metrics = self.use_settings(metrics_knox)
+
+    def tearDown(self):
+        self.override.disable()
+        for module in (metrics, cache, auth, views):
+            reload(module)
+
+    def use_settings(self, settings):
+        if hasattr(self, 'override'):
+            self.override.disable()
+        self.override = override_settings(REST_KNOX=settings)
+        self.override.enable()
+        for module in (metrics, cache, auth, views):
+            reload(module)
+        return metrics.get_metrics()
+
+    def authenticate(self, token):
+        return auth.TokenAuthentication().authenticate_credentials(token.encode())
+
+    def login(self):
+        credentials = base64.b64encode(b'john.doe:hunter2').decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+        return self.client.post(reverse('knox_login'), {}, format='json')
+
+    def test_successful_authentication(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        self.assertEqual(
+            self.metrics.get_count('knox_authentications_total', result='success'), 1)
+        self.assertEqual(
+            self.metrics.get_count('knox_token_lookups_total', source='database'), 1)
+        self.assertEqual(
+            len(self.metrics.get_observations('knox_authentication_duration_seconds')), 1)
+        for stage in ('hash', 'lookup', 'cleanup'):
+            observations = self.metrics.get_observations(STAGE_DURATION, stage=stage)
+            self.assertEqual(len(observations), 1)
+            self.assertGreaterEqual(observations[0], 0)
+
+    def test_failed_authentication(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('0' * knox_settings.AUTH_TOKEN_CHARACTER_LENGTH)
+        self.assertEqual(
+            self.metrics.get_count('knox_authentications_total', result='failure'), 1)
+        self.assertEqual(
+            len(self.metrics.get_observations(STAGE_DURATION, stage='lookup')), 1)
+
+    def test_cached_lookups(self):
+        self.metrics = self.use_settings(token_cache_metrics_knox)
+        _, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        self.authenticate(token)
+        self.assertEqual(
+            self.metrics.get_count('knox_token_lookups_total', source='database'), 1)
+        self.assertEqual(
+            self.metrics.get_count('knox_token_lookups_total', source='cache'), 1)
+
+    def test_renewals(self):
+        self.metrics = self.use_settings(auto_refresh_metrics_knox)
+        _, token = AuthToken.objects.create(user=self.user, expiry=timedelta(hours=1))
+        self.authenticate(token)
+        self.authenticate(token)
+        self.assertEqual(
+            self.metrics.get_count('knox_token_renewals_total', result='written'), 1)
+        self.assertEqual(
+            self.metrics.get_count('knox_token_renewals_total', result='throttled'), 1)
+
+    def test_expired_token_deletions(self):
+        AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        _, token = AuthToken.objects.create(user=self.user)
+        self.authenticate(token)
+        self.assertEqual(self.metrics.get_count(
+            'knox_expired_tokens_deleted_total', source='other_token'), 1)
+        _, token = AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.assertEqual(self.metrics.get_count(
+            'knox_expired_tokens_deleted_total', source='auth_token'), 1)
+
+    def test_purged_tokens(self):
+        for _ in range(3):
+            AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        AuthToken.objects.purge_expired(batch_size=2)
+        self.assertEqual(self.metrics.get_count(
+            'knox_expired_tokens_deleted_total', source='purge'), 3)
+
+    def test_created_tokens(self):
+        AuthToken.objects.create(user=self.user)
+        AuthToken.objects.bulk_create_tokens([self.user] * 3)
+        self.assertEqual(self.metrics.get_count('knox_tokens_created_total'), 4)
+
+    def test_logins_and_logouts(self):
+        token = self.login().data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.post(reverse('knox_logout'))
+        AuthToken.objects.create(user=self.user)
+        _, token = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.post(reverse('knox_logoutall'))
+        self.assertEqual(self.metrics.get_count('knox_logins_total', result='success'), 1)
+        self.assertEqual(self.metrics.get_count('knox_logouts_total', scope='token'), 1)
+        self.assertEqual(self.metrics.get_count('knox_logouts_total', scope='all'), 1)
+
+    def test_emitted_metrics_are_declared(self):
+        token = self.login().data['token']
+        self.authenticate(token)
+        emitted = [*self.metrics.counters, *self.metrics.observations]
+        self.assertTrue(emitted)
+        for name, *labels in emitted:
+            _, label_names = metrics.METRICS[name]
+            self.assertEqual({label for label, _ in labels}, set(label_names))
+
+    def test_rejected_login(self):
+        self.metrics = self.use_settings(token_limit_metrics_knox)
+        AuthToken.objects.create(user=self.user)
+        self.assertEqual(self.login().status_code, 403)
+        self.assertEqual(
+            self.metrics.get_count('knox_logins_total', result='limit_rejected'), 1)
+
+    def test_evicted_tokens(self):
+        self.metrics = self.use_settings(evict_oldest_metrics_knox)
+        AuthToken.objects.create(user=self.user)
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.metrics.get_count('knox_tokens_evicted_total'), 1)
+
+
+class MetricsBackendTestCase(SimpleTestCase):
+
+    def test_default_discards_metrics(self):
+        backend = metrics.get_metrics()
+        self.assertIsInstance(backend, metrics.NullMetrics)
+        with backend.timer('knox_authentication_duration_seconds'):
+            backend.increment('knox_authentications_total', result='success')
+
+    def test_in_memory_metrics(self):
+        backend = metrics.InMemoryMetrics()
+        backend.increment('counter', a='1', b='2')
+        backend.increment('counter', 2, b='2', a='1')
+        backend.increment('counter', a='2', b='2')
+        with backend.timer('histogram', stage='hash'):
+            pass
+        self.assertEqual(backend.get_count('counter', a='1', b='2'), 3)
+        self.assertEqual(backend.get_count('counter', a='2', b='2'), 1)
+        self.assertEqual(backend.get_count('counter'), 0)
+        self.assertEqual(len(backend.get_observations('histogram', stage='hash')), 1)
+        backend.reset()
+        self.assertEqual(backend.get_count('counter', a='1', b='2'), 0)
@@ -1,12 +1,28 @@
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
 
+from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_out
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from freezegun import freeze_time
+from rest_framework.exceptions import AuthenticationFailed
 
+from knox.auth import TokenAuthentication
 from knox.models import AuthToken
+from knox.operations import CopyTokens
 from knox.settings import CONSTANTS, knox_settings
+from knox.signals import token_expired
+from knox.stores import ORMTokenStore
+from tests.models import (
+    BinaryDigestAuthToken, ExpiryBucketAuthToken, RelatedExpiryBucketAuthToken,
+    TokenSession,
+)
 
 
 class AuthTokenTests(TestCase):
@@ -85,3 +101,309 @@ class AuthTokenTests(TestCase):
         )
         self.assertTrue(token.startswith(custom_prefix))
         self.assertTrue(instance.token_key.startswith(custom_prefix))
+
+    def test_bulk_create_tokens(self):
+        """
+        Test bulk token creation from users and specs in a single query.
+        """
+        other_user = self.User.objects.create_user(username='otheruser')
+        now = timezone.now()
+        with freeze_time(now), self.assertNumQueries(1):
+            created = AuthToken.objects.bulk_create_tokens([
+                self.user,
+                {'user': other_user, 'expiry': None, 'prefix': 'TEST_'},
+            ])
+        (first, first_token), (second, second_token) = created
+        self.assertEqual(first.user, self.user)
+        self.assertEqual(first.expiry, now + knox_settings.TOKEN_TTL)
+        self.assertEqual(second.user, other_user)
+        self.assertIsNone(second.expiry)
+        self.assertTrue(second_token.startswith('TEST_'))
+        self.assertEqual(AuthToken.objects.count(), 2)
+        self.assertEqual(
+            TokenAuthentication().authenticate_credentials(second_token.encode()),
+            (other_user, second))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output is SQLite specific')
+class AuthTokenIndexTests(TestCase):
+    """
+    Check that token queries on the hot paths are served by an index.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser')
+        self.instance, _ = AuthToken.objects.create(user=self.user)
+        self.user_expiry_index, self.expiry_index = (
+            index.name for index in AuthToken._meta.indexes)
+
+    def test_active_token_count_uses_user_expiry_index(self):
+        plan = ORMTokenStore()._filter_active(self.user).explain()
+        self.assertIn(f'USING INDEX {self.user_expiry_index} (user_id=?)', plan)
+
+    def test_expired_token_cleanup_uses_user_expiry_index(self):
+        queryset = TokenAuthentication()._get_expired_other_tokens(self.instance)
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {self.user_expiry_index} (user_id=? AND expiry<?)',
+                      plan)
+
+    def test_purge_uses_expiry_index(self):
+        plan = AuthToken.objects.filter(expiry__lt=timezone.now()).explain()
+        self.assertIn(f'USING INDEX {self.expiry_index} (expiry<?)', plan)
+
+
+class BinaryDigestAuthTokenTests(TestCase):
+    """
+    Token model storing its digest as raw bytes.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser')
+
+    def test_digest_is_stored_as_bytes(self):
+        instance, token = BinaryDigestAuthToken.objects.create(user=self.user)
+        self.assertEqual(len(instance.digest), CONSTANTS.DIGEST_LENGTH)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT digest FROM {BinaryDigestAuthToken._meta.db_table}')
+            (stored,), = cursor.fetchall()
+        self.assertEqual(bytes(stored), bytes.fromhex(instance.digest))
+
+    def test_lookups_by_hex_digest(self):
+        instance, _ = BinaryDigestAuthToken.objects.create(user=self.user)
+        other, _ = BinaryDigestAuthToken.objects.create(user=self.user)
+        self.assertEqual(
+            BinaryDigestAuthToken.objects.get(digest=instance.digest), instance)
+        self.assertEqual(
+            set(BinaryDigestAuthToken.objects.filter(
+                digest__in=[instance.digest, other.digest]).values_list(
+                    'digest', flat=True)),
+            {instance.digest, other.digest})
+
+    def test_update_expiries(self):
+        instance, _ = BinaryDigestAuthToken.objects.create(user=self.user)
+        expiry = timezone.now() + timedelta(days=1)
+        BinaryDigestAuthToken.objects.update_expiries({instance.digest: expiry})
+        instance.refresh_from_db()
+        self.assertEqual(instance.expiry, expiry)
+
+    def test_authentication(self):
+        class BinaryDigestTokenAuthentication(TokenAuthentication):
+            def get_token_queryset(self):
+                return BinaryDigestAuthToken.objects.select_related('user')
+
+        instance, token = BinaryDigestAuthToken.objects.create(user=self.user)
+        user, auth_token = BinaryDigestTokenAuthentication().authenticate_credentials(
+            token.encode())
+        self.assertEqual((user, auth_token), (self.user, instance))
+
+    def test_copy_tokens(self):
+        tokens = [AuthToken.objects.create(user=self.user) for _ in range(5)]
+        AuthToken.objects.filter(pk=tokens[0][0].pk).update(last_used=timezone.now())
+        operation = CopyTokens('tests.BinaryDigestAuthToken', batch_size=2)
+        # only the connection of the schema editor is used
+        with CaptureQueriesContext(connection) as queries:
+            operation.code(apps, SimpleNamespace(connection=connection))
+        pages = [query['sql'] for query in queries
+                 if query['sql'].startswith('SELECT') and 'LIMIT 2' in query['sql']]
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(
+            list(BinaryDigestAuthToken.objects.order_by('digest').values_list(
+                'digest', 'token_key', 'user', 'created', 'expiry', 'last_used')),
+            list(AuthToken.objects.order_by('digest').values_list(
+                'digest', 'token_key', 'user', 'created', 'expiry', 'last_used')))
+        self.assertEqual(AuthToken.objects.count(), 5)
+
+    def test_copy_tokens_deconstruct(self):
+        operation = CopyTokens('tests.BinaryDigestAuthToken', batch_size=2)
+        self.assertEqual(operation.deconstruct(), (
+            'CopyTokens', ('tests.BinaryDigestAuthToken',), {'batch_size': 2}))
+
+
+@freeze_time('2026-01-10 12:00:00')
+class ExpiryBucketAuthTokenTests(TestCase):
+    """
+    Token model grouping tokens into buckets by expiry.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser')
+
+    def create(self, expiry):
+        instance, _ = ExpiryBucketAuthToken.objects.create(user=self.user, expiry=expiry)
+        return instance
+
+    def bucket(self, day):
+        return datetime(2026, 1, day, tzinfo=dt_timezone.utc)
+
+    def test_expiry_bucket(self):
+        self.assertEqual(self.create(timedelta(hours=10)).expiry_bucket, self.bucket(10))
+        self.assertEqual(self.create(timedelta(hours=13)).expiry_bucket, self.bucket(11))
+        self.assertIsNone(self.create(None).expiry_bucket)
+        (instance, _), = ExpiryBucketAuthToken.objects.bulk_create_tokens(
+            [self.user], expiry=timedelta(days=2))
+        self.assertEqual(instance.expiry_bucket, self.bucket(12))
+
+    def test_renewal_moves_token_to_its_new_bucket(self):
+        instance = self.create(timedelta(hours=1))
+        instance.expiry += timedelta(days=1)
+        instance.save(update_fields=('expiry',))
+        instance.refresh_from_db()
+        self.assertEqual(instance.expiry_bucket, self.bucket(11))
+        ExpiryBucketAuthToken.objects.update_expiries(
+            {instance.digest: instance.expiry + timedelta(days=1)})
+        instance.refresh_from_db()
+        self.assertEqual(instance.expiry_bucket, self.bucket(12))
+
+    def test_live_excludes_ended_buckets(self):
+        ended = self.create(timedelta(days=-1))
+        expired = self.create(timedelta(seconds=-1))
+        active = self.create(timedelta(hours=1))
+        forever = self.create(None)
+        self.assertCountEqual(ExpiryBucketAuthToken.objects.live(),
+                              [expired, active, forever])
+        self.assertNotIn(ended, ExpiryBucketAuthToken.objects.live())
+
+    @freeze_time('2026-01-10 00:00:10')
+    def test_live_keeps_ended_buckets_for_pending_renewals(self):
+        renewed = self.create(timedelta(seconds=-20))
+        self.assertNotIn(renewed, ExpiryBucketAuthToken.objects.live())
+        # A renewal may be pending in the AUTO_REFRESH_BUFFER
+        with patch('knox.refresh.get_refresh_buffer', return_value=object()):
+            self.assertIn(renewed, ExpiryBucketAuthToken.objects.live())
+
+    def test_authentication_looks_up_live_buckets(self):
+        class ExpiryBucketTokenAuthentication(TokenAuthentication):
+            def get_token_queryset(self):
+                return ExpiryBucketAuthToken.objects.live().select_related('user')
+
+        authentication = ExpiryBucketTokenAuthentication()
+        instance, token = ExpiryBucketAuthToken.objects.create(user=self.user)
+        _, auth_token = authentication.authenticate_credentials(token.encode())
+        self.assertEqual(auth_token, instance)
+        _, token = ExpiryBucketAuthToken.objects.create(
+            user=self.user, expiry=timedelta(days=-1))
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(token.encode())
+
+    def test_purge_expired_buckets(self):
+        for days in (-3, -2, -2):
+            self.create(timedelta(days=days))
+        expired = self.create(timedelta(seconds=-1))
+        active = self.create(timedelta(hours=1))
+        forever = self.create(None)
+        # the ended buckets, then one DELETE per bucket
+        with self.assertNumQueries(3):
+            self.assertEqual(ExpiryBucketAuthToken.objects.purge_expired_buckets(), 3)
+        self.assertCountEqual(ExpiryBucketAuthToken.objects.all(),
+                              [expired, active, forever])
+
+    def test_purge_expired_buckets_with_grace(self):
+        self.create(timedelta(days=-3))
+        self.create(timedelta(days=-2))
+        deleted = ExpiryBucketAuthToken.objects.purge_expired_buckets(
+            grace=timedelta(days=2))
+        self.assertEqual(deleted, 1)
+        self.assertEqual(ExpiryBucketAuthToken.objects.count(), 1)
+
+    def test_purge_expired(self):
+        self.create(timedelta(days=-2))
+        self.create(timedelta(seconds=-1))
+        active = self.create(timedelta(hours=1))
+        self.assertEqual(ExpiryBucketAuthToken.objects.purge_expired(), 2)
+        self.assertCountEqual(ExpiryBucketAuthToken.objects.all(), [active])
+
+
+class RevokeTokensTests(TestCase):
+    """
+    Bulk revocation of tokens.
+    """
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='john.doe')
+        self.other_user = User.objects.create_user(username='jane.doe')
+        with freeze_time(timezone.now() - timedelta(days=1)):
+            self.old, _ = AuthToken.objects.create(user=self.user)
+        self.new, _ = AuthToken.objects.create(user=self.user)
+        self.other, _ = AuthToken.objects.create(user=self.other_user, prefix='abc_')
+
+    def test_revoke_all(self):
+        self.assertEqual(AuthToken.objects.revoke(), 3)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_revoke_filters(self):
+        self.assertEqual(AuthToken.objects.revoke(prefix='abc_'), 1)
+        self.assertEqual(AuthToken.objects.revoke(
+            created_before=timezone.now() - timedelta(hours=1)), 1)
+        self.assertCountEqual(AuthToken.objects.all(), [self.new])
+        self.assertEqual(AuthToken.objects.revoke(user_ids=[self.other_user.pk]), 0)
+        self.assertEqual(AuthToken.objects.revoke(user_ids=[self.user.pk]), 1)
+
+    def test_revoke_queryset(self):
+        revoked = AuthToken.objects.revoke(
+            AuthToken.objects.filter(pk__in=[self.old.pk, self.other.pk]))
+        self.assertEqual(revoked, 2)
+        self.assertCountEqual(AuthToken.objects.all(), [self.new])
+
+    def test_revoke_in_batches(self):
+        # for each of the two batches, its keys and one DELETE
+        with self.assertNumQueries(4):
+            self.assertEqual(AuthToken.objects.revoke(batch_size=2), 3)
+
+    def test_revoke_signals(self):
+        expired = []
+        logged_out = []
+
+        def token_expired_handler(sender, username, source, **kwargs):
+            expired.append((username, source))
+
+        def user_logged_out_handler(sender, request, user, **kwargs):
+            logged_out.append(user)
+
+        token_expired.connect(token_expired_handler)
+        user_logged_out.connect(user_logged_out_handler)
+        try:
+            AuthToken.objects.revoke(user_ids=[self.user.pk], batch_size=1)
+            self.assertEqual(expired, [])
+            AuthToken.objects.create(user=self.user)
+            AuthToken.objects.revoke(batch_size=1, send_signals=True)
+        finally:
+            token_expired.disconnect(token_expired_handler)
+            user_logged_out.disconnect(user_logged_out_handler)
+        self.assertCountEqual(expired, [('john.doe', 'revoke'), ('jane.doe', 'revoke')])
+        self.assertCountEqual(logged_out, [self.user, self.other_user])
+
+
+class RelatedTokenDeletionTests(TestCase):
+    """
+    Deletion of tokens of a custom token model that other rows refer to.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='john.doe')
+
+    def create(self, expiry):
+        instance, _ = RelatedExpiryBucketAuthToken.objects.create(
+            user=self.user, expiry=expiry)
+        return TokenSession.objects.create(token=instance)
+
+    def test_raw_delete_only_without_relations(self):
+        self.assertTrue(AuthToken.objects._can_raw_delete())
+        self.assertTrue(ExpiryBucketAuthToken.objects._can_raw_delete())
+        self.assertFalse(RelatedExpiryBucketAuthToken.objects._can_raw_delete())
+
+    def test_revoke_cascades(self):
+        self.create(None)
+        self.create(timedelta(hours=1))
+        self.assertEqual(RelatedExpiryBucketAuthToken.objects.revoke(batch_size=1), 2)
+        self.assertFalse(RelatedExpiryBucketAuthToken.objects.exists())
+        self.assertFalse(TokenSession.objects.exists())
+
+    def test_purge_expired_buckets_cascades(self):
+        self.create(timedelta(days=-3))
+        self.create(timedelta(days=-2))
+        active = self.create(timedelta(hours=1))
+        self.assertEqual(RelatedExpiryBucketAuthToken.objects.purge_expired_buckets(), 2)
+        self.assertEqual(list(RelatedExpiryBucketAuthToken.objects.all()), [active.token])
+        self.assertEqual(list(TokenSession.objects.all()), [active])
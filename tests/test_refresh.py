@@ -0,0 +1,146 @@
+import time
+from datetime import datetime, timedelta, timezone
+from importlib import reload
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from freezegun import freeze_time
+
+from knox import auth, refresh
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+
+buffered_refresh_knox = knox_settings.defaults.copy()
+buffered_refresh_knox["AUTO_REFRESH"] = True
+buffered_refresh_knox["AUTO_REFRESH_BUFFER"] = 'knox.refresh.LocMemRefreshBuffer'
+buffered_refresh_knox["AUTO_REFRESH_FLUSH_INTERVAL"] = timedelta(days=10).total_seconds()
+
+cache_buffered_refresh_knox = buffered_refresh_knox.copy()
+cache_buffered_refresh_knox["AUTO_REFRESH_BUFFER"] = 'knox.refresh.CacheRefreshBuffer'
+
+original_time = datetime(2018, 7, 25, 0, 0, 0, 0, tzinfo=timezone.utc)
+
+
+class BufferedRefreshTestCase(TestCase):
+    knox_settings = buffered_refresh_knox
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=self.knox_settings)
+        self.override.enable()
+        reload(refresh)
+        reload(auth)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        with freeze_time(original_time):
+            # freezegun also freezes the clock used to schedule flushes
+            self.refresh_buffer = refresh.get_refresh_buffer()
+            self.instance, self.token = AuthToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        self.refresh_buffer.pop_pending()
+        if self.refresh_buffer._timer is not None:
+            self.refresh_buffer._timer.cancel()
+        self.override.disable()
+        reload(refresh)
+        reload(auth)
+
+    def authenticate(self, token=None):
+        token = token or self.token
+        return TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_renewal_is_buffered(self):
+        with freeze_time(original_time + timedelta(hours=5)):
+            with self.assertNumQueries(2):
+                _, auth_token = self.authenticate()
+        self.assertEqual(auth_token.expiry, original_time + timedelta(hours=15))
+        self.assertEqual(AuthToken.objects.get().expiry, self.instance.expiry)
+        self.assertEqual(len(self.refresh_buffer), 1)
+
+    def test_pending_renewal_is_honoured_before_flush(self):
+        with freeze_time(original_time + timedelta(hours=5)):
+            self.authenticate()
+        with freeze_time(original_time + timedelta(hours=11)):
+            _, auth_token = self.authenticate()
+        self.assertEqual(auth_token.expiry, original_time + timedelta(hours=21))
+
+    def test_flush_writes_renewals_in_bulk(self):
+        with freeze_time(original_time):
+            tokens = [AuthToken.objects.create(user=self.user)[1] for _ in range(3)]
+        with freeze_time(original_time + timedelta(hours=5)):
+            for token in tokens + [self.token]:
+                self.authenticate(token)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.refresh_buffer.flush(), 4)
+        self.assertEqual(
+            AuthToken.objects.get(pk=self.instance.pk).expiry,
+            original_time + timedelta(hours=15))
+
+    def test_flush_when_interval_elapsed(self):
+        interval = self.knox_settings['AUTO_REFRESH_FLUSH_INTERVAL']
+        self.refresh_buffer._last_flush -= interval
+        with freeze_time(original_time + timedelta(hours=5)):
+            self.authenticate()
+        self.assertEqual(len(self.refresh_buffer), 0)
+        self.assertEqual(
+            AuthToken.objects.get().expiry, original_time + timedelta(hours=15))
+
+    def test_buffered_renewal_respects_max_ttl(self):
+        with override_settings(REST_KNOX=dict(
+                self.knox_settings, AUTO_REFRESH_MAX_TTL=timedelta(hours=12))):
+            reload(auth)
+            with freeze_time(original_time + timedelta(hours=5)):
+                self.authenticate()
+                pending = self.refresh_buffer.get(self.instance.digest)
+        self.assertEqual(pending, original_time + timedelta(hours=12))
+
+    def test_purge_keeps_tokens_with_pending_renewal(self):
+        with freeze_time(original_time + timedelta(hours=5)):
+            self.authenticate()
+        with freeze_time(original_time + timedelta(hours=11)):
+            self.assertEqual(AuthToken.objects.purge_expired(), 0)
+        self.assertEqual(
+            AuthToken.objects.get().expiry, original_time + timedelta(hours=15))
+
+
+class CacheBufferedRefreshTestCase(BufferedRefreshTestCase):
+    knox_settings = cache_buffered_refresh_knox
+
+    def test_pending_renewal_is_shared(self):
+        with freeze_time(original_time + timedelta(hours=5)):
+            self.authenticate()
+            other_process_buffer = refresh.CacheRefreshBuffer()
+            self.assertEqual(
+                other_process_buffer.get(self.instance.digest),
+                original_time + timedelta(hours=15))
+            self.assertEqual(other_process_buffer.flush(), 0)
+
+
+class TimedFlushTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=dict(
+            buffered_refresh_knox, AUTO_REFRESH_FLUSH_INTERVAL=0.01))
+        self.override.enable()
+        reload(refresh)
+        reload(auth)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+
+    def tearDown(self):
+        self.override.disable()
+        reload(refresh)
+        reload(auth)
+
+    def test_idle_buffer_is_flushed_by_timer(self):
+        with freeze_time(original_time):
+            _, token = AuthToken.objects.create(user=self.user)
+        with freeze_time(original_time + timedelta(hours=5)):
+            TokenAuthentication().authenticate_credentials(token.encode())
+        for _ in range(500):
+            if AuthToken.objects.get().expiry != original_time + timedelta(hours=10):
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(refresh.get_refresh_buffer()), 0)
+        self.assertEqual(
+            AuthToken.objects.get().expiry, original_time + timedelta(hours=15))
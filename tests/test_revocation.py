@@ -0,0 +1,137 @@
+from importlib import reload
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from knox import cache, revocation
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+root_url = reverse('api-root')
+
+locmem_revocation_knox = knox_settings.defaults.copy()
+locmem_revocation_knox["TOKEN_CACHE"] = 'knox.cache.LocMemTokenCache'
+locmem_revocation_knox["REVOCATION_CHANNEL"] = 'knox.revocation.LocMemRevocationChannel'
+
+cache_revocation_knox = locmem_revocation_knox.copy()
+cache_revocation_knox["REVOCATION_CHANNEL"] = 'knox.revocation.CacheRevocationChannel'
+
+
+class RevocationTestCase(APITestCase):
+    knox_settings = locmem_revocation_knox
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=self.knox_settings)
+        self.override.enable()
+        reload(cache)
+        reload(revocation)
+        caches['default'].clear()
+        self.channel = revocation.get_revocation_channel()
+        # another process, sharing the channel
+        self.other_channel = type(self.channel)()
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.instance, self.token = AuthToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        reload(cache)
+        reload(revocation)
+
+    def authenticate(self):
+        return TokenAuthentication().authenticate_credentials(self.token.encode())
+
+    def poll_later(self):
+        interval = knox_settings.REVOCATION_POLL_INTERVAL
+        with patch('knox.revocation.time.monotonic',
+                   return_value=self.channel._last_poll + interval):
+            self.channel.poll_if_due()
+
+    def test_logout_publishes_revocation(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('knox_logout'))
+        self.assertEqual(self.other_channel.poll(), [self.instance.digest])
+
+    def test_logout_all_publishes_revocations(self):
+        other, _ = AuthToken.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('knox_logoutall'))
+        self.assertCountEqual(self.other_channel.poll(),
+                              [self.instance.digest, other.digest])
+
+    def test_deactivation_publishes_revocations(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.other_channel.poll(), [self.instance.digest])
+
+    def test_bulk_revocation_publishes_and_invalidates_once_per_batch(self):
+        other, _ = AuthToken.objects.create(user=self.user)
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            AuthToken.objects.revoke(user_ids=[self.user.pk])
+        self.assertEqual(len(callbacks), 1)
+        self.assertCountEqual(self.other_channel.poll(),
+                              [self.instance.digest, other.digest])
+        self.assertIsNone(cache.get_token_cache().get(self.instance.digest))
+
+    def test_revocation_is_published_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.instance.delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.other_channel.poll(), [])
+
+    def test_remote_revocation_invalidates_cached_token(self):
+        self.authenticate()
+        self.other_channel.publish([self.instance.digest])
+        with self.assertNumQueries(0):
+            self.authenticate()
+        self.poll_later()
+        self.assertIsNone(cache.get_token_cache().get(self.instance.digest))
+
+    def test_missed_revocations_clear_the_cache(self):
+        self.authenticate()
+        with patch.object(type(self.channel), 'poll', return_value=None):
+            self.poll_later()
+        self.assertEqual(len(cache.get_token_cache()), 0)
+
+
+class CacheRevocationTestCase(RevocationTestCase):
+    knox_settings = cache_revocation_knox
+
+    def test_expired_entries_are_reported_as_missed(self):
+        self.other_channel.publish(['a'])
+        self.other_channel.publish(['b'])
+        self.channel.cache.delete(self.channel.make_key(self.channel._cursor + 1))
+        self.assertIsNone(self.channel.poll())
+        self.assertEqual(self.channel.poll(), [])
+
+    def test_evicted_sequence_is_reported_as_missed(self):
+        self.other_channel.publish(['a'])
+        self.channel.cache.delete(self.channel.make_key('sequence'))
+        self.other_channel.publish(['b'])
+        self.assertIsNone(self.channel.poll())
+
+
+class LocMemRevocationChannelTestCase(TestCase):
+
+    def test_log_is_bounded(self):
+        channel = revocation.LocMemRevocationChannel()
+        other_channel = revocation.LocMemRevocationChannel()
+        for i in range(channel.max_entries):
+            other_channel.publish([str(i)])
+        self.assertEqual(len(channel.poll()), channel.max_entries)
+        other_channel.publish(['a'])
+        other_channel.publish(['b'])
+        self.assertEqual(channel.poll(), ['a', 'b'])
+        for i in range(channel.max_entries + 1):
+            other_channel.publish([str(i)])
+        self.assertIsNone(channel.poll())
+        self.assertLessEqual(len(channel._log), channel.max_entries)
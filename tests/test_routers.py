@@ -0,0 +1,160 @@
+import base64
+from datetime import timedelta
+from importlib import reload
+
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from knox import auth, routers, views
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+
+replica_knox = knox_settings.defaults.copy()
+replica_knox["TOKEN_READ_DATABASES"] = ['replica']
+replica_knox["INLINE_TOKEN_CLEANUP"] = False
+
+auto_refresh_replica_knox = replica_knox.copy()
+auto_refresh_replica_knox["AUTO_REFRESH"] = True
+
+cleanup_replica_knox = replica_knox.copy()
+cleanup_replica_knox["INLINE_TOKEN_CLEANUP"] = True
+
+token_limit_replica_knox = replica_knox.copy()
+token_limit_replica_knox["TOKEN_LIMIT_PER_USER"] = 1
+
+
+@override_settings(DATABASE_ROUTERS=['knox.routers.TokenRouter'])
+class TokenRouterTestCase(APITestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.use_settings(replica_knox)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.replicate(self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        for module in (routers, auth, views):
+            reload(module)
+
+    def use_settings(self, settings):
+        if hasattr(self, 'override'):
+            self.override.disable()
+        self.override = override_settings(REST_KNOX=settings)
+        self.override.enable()
+        for module in (routers, auth, views):
+            reload(module)
+
+    def replicate(self, instance):
+        instance.save(using='replica')
+
+    def authenticate(self, token):
+        return auth.TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_routing(self):
+        self.assertEqual(router.db_for_read(AuthToken), 'replica')
+        self.assertEqual(router.db_for_write(AuthToken), 'default')
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_reads_without_replicas_use_write_database(self):
+        self.use_settings(knox_settings.defaults)
+        self.assertEqual(router.db_for_read(AuthToken), 'default')
+
+    def test_token_is_looked_up_on_replica(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        self.replicate(instance)
+        with self.assertNumQueries(1, using='replica'), \
+                self.assertNumQueries(0, using='default'):
+            _, auth_token = self.authenticate(token)
+        self.assertEqual(auth_token, instance)
+        self.assertEqual(auth_token._state.db, 'replica')
+
+    def test_fresh_token_falls_back_to_write_database(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        with self.assertNumQueries(1, using='replica'), \
+                self.assertNumQueries(1, using='default'):
+            _, auth_token = self.authenticate(token)
+        self.assertEqual(auth_token, instance)
+
+    def test_unknown_token_is_rejected(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        AuthToken.objects.all().delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_token_expired_on_replica_is_read_from_write_database(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        instance.expiry = timezone.now() - timedelta(seconds=1)
+        self.replicate(instance)
+        _, auth_token = self.authenticate(token)
+        self.assertGreater(auth_token.expiry, timezone.now())
+        self.assertTrue(AuthToken.objects.using('default').filter(
+            pk=instance.pk).exists())
+
+    def test_batch_verification_falls_back_for_fresh_tokens(self):
+        replicated, replicated_token = AuthToken.objects.create(user=self.user)
+        self.replicate(replicated)
+        _, fresh_token = AuthToken.objects.create(user=self.user)
+        with self.assertNumQueries(1, using='replica'), \
+                self.assertNumQueries(1, using='default'):
+            results = auth.TokenAuthentication().verify_tokens(
+                [replicated_token, fresh_token])
+        self.assertEqual([result.valid for result in results], [True, True])
+
+    def test_renewals_are_written_to_write_database(self):
+        self.use_settings(auto_refresh_replica_knox)
+        instance, token = AuthToken.objects.create(
+            user=self.user, expiry=timedelta(hours=1))
+        self.replicate(instance)
+        self.authenticate(token)
+        self.assertGreater(
+            AuthToken.objects.using('default').get(pk=instance.pk).expiry,
+            instance.expiry)
+        self.assertEqual(
+            AuthToken.objects.using('replica').get(pk=instance.pk).expiry,
+            instance.expiry)
+
+    def test_inline_cleanup_reads_write_database(self):
+        self.use_settings(cleanup_replica_knox)
+        instance, token = AuthToken.objects.create(user=self.user)
+        self.replicate(instance)
+        renewed, _ = AuthToken.objects.create(user=self.user)
+        renewed.expiry = timezone.now() - timedelta(seconds=1)
+        # The replica has not caught up with the renewal of the token yet
+        self.replicate(renewed)
+        expired, _ = AuthToken.objects.create(
+            user=self.user, expiry=timedelta(seconds=-1))
+        self.authenticate(token)
+        self.assertCountEqual(
+            AuthToken.objects.using('default').all(), [instance, renewed])
+
+    def test_purge_expired_reads_write_database(self):
+        for _ in range(2):
+            instance, _ = AuthToken.objects.create(
+                user=self.user, expiry=timedelta(seconds=-1))
+            self.replicate(instance)
+        with self.assertNumQueries(0, using='replica'):
+            self.assertEqual(AuthToken.objects.purge_expired(batch_size=1), 2)
+        self.assertFalse(AuthToken.objects.using('default').exists())
+
+    def test_logout_deletes_on_write_database(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        self.replicate(instance)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.client.post(reverse('knox_logout'))
+        self.assertFalse(AuthToken.objects.using('default').exists())
+
+    def test_token_limit_is_checked_on_write_database(self):
+        self.use_settings(token_limit_replica_knox)
+        AuthToken.objects.create(user=self.user)
+        credentials = base64.b64encode(b'john.doe:hunter2').decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+        response = self.client.post(reverse('knox_login'), {}, format='json')
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta, timezone
+from importlib import reload
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from freezegun import freeze_time
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from knox import auth, cache, revocation, signing
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from knox.settings import knox_settings
+
+User = get_user_model()
+utc = timezone.utc
+root_url = reverse('api-root')
+
+signed_tokens_knox = knox_settings.defaults.copy()
+signed_tokens_knox["SIGNED_TOKENS"] = True
+signed_tokens_knox["TOKEN_SIGNING_KEYS"] = {'2024': 'old-key', '2025': 'new-key'}
+signed_tokens_knox["TOKEN_SIGNING_KEY_ID"] = '2025'
+
+trusted_tokens_knox = signed_tokens_knox.copy()
+trusted_tokens_knox["REVOCATION_CHANNEL"] = 'knox.revocation.LocMemRevocationChannel'
+trusted_tokens_knox["INLINE_TOKEN_CLEANUP"] = False
+
+
+class SignedTokenTestCase(APITestCase):
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=signed_tokens_knox)
+        self.override.enable()
+        reload(signing)
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        self.instance, self.token = AuthToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        reload(signing)
+        reload(cache)
+
+    def authenticate(self, token=None):
+        token = token or self.token
+        return TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_token_carries_claims(self):
+        claims = signing.unsign_token(self.token)
+        self.assertEqual(claims.key_id, '2025')
+        self.assertEqual(claims.user_pk, self.user.pk)
+        # rounded up to the second
+        self.assertGreaterEqual(claims.expiry, self.instance.expiry)
+        self.assertLess(claims.expiry - self.instance.expiry, timedelta(seconds=1))
+        self.assertTrue(self.token.startswith(self.instance.token_key))
+        self.assertLessEqual(claims.issued_at, self.instance.created)
+
+    def test_authenticate(self):
+        user, auth_token = self.authenticate()
+        self.assertEqual(user, self.user)
+        self.assertEqual(auth_token.digest, self.instance.digest)
+
+    def test_tampered_token_skips_database(self):
+        body, claims, mac = self.token.split('.')
+        forged = signing._b64encode(f'["2025",{self.user.pk + 1},null]'.encode())
+        for token in (f'{body}.{forged}.{mac}', f'{body}.{claims}.{mac[:-2]}',
+                      f'{body}.{claims}', f'{body}..{claims}.{mac}'):
+            with self.subTest(token=token), self.assertNumQueries(0):
+                with self.assertRaises(AuthenticationFailed):
+                    self.authenticate(token)
+
+    def test_expired_token_skips_database(self):
+        with freeze_time(self.instance.expiry + timedelta(seconds=2)):
+            with self.assertNumQueries(0):
+                with self.assertRaises(AuthenticationFailed):
+                    self.authenticate()
+
+    def test_tokens_signed_with_retired_key_are_rejected(self):
+        with override_settings(REST_KNOX=dict(
+                signed_tokens_knox, TOKEN_SIGNING_KEYS={'2025': 'new-key'},
+                TOKEN_SIGNING_KEY_ID='2025')):
+            reload(signing)
+            self.authenticate()
+            with override_settings(REST_KNOX=dict(
+                    signed_tokens_knox, TOKEN_SIGNING_KEYS={'2024': 'old-key'},
+                    TOKEN_SIGNING_KEY_ID='2024')):
+                reload(signing)
+                with self.assertRaises(AuthenticationFailed):
+                    self.authenticate()
+
+    def test_rotated_keys_keep_verifying(self):
+        with override_settings(REST_KNOX=dict(
+                signed_tokens_knox, TOKEN_SIGNING_KEY_ID='2024')):
+            reload(signing)
+            _, token = AuthToken.objects.create(user=self.user)
+        reload(signing)
+        user, _ = self.authenticate(token)
+        self.assertEqual(user, self.user)
+
+    def test_tokens_verify_after_signing_is_disabled(self):
+        with override_settings(REST_KNOX=dict(signed_tokens_knox, SIGNED_TOKENS=False)):
+            reload(signing)
+            user, _ = self.authenticate()
+            _, unsigned_token = AuthToken.objects.create(user=self.user)
+        self.assertEqual(user, self.user)
+        self.assertFalse(signing.is_signed_token(unsigned_token))
+
+    def test_prefix_containing_separator(self):
+        instance, token = AuthToken.objects.create(user=self.user, prefix='v1.')
+        self.assertEqual(signing.get_random_part(token)[:3], 'v1.')
+        _, auth_token = self.authenticate(token)
+        self.assertEqual(auth_token.digest, instance.digest)
+
+    def test_logout_revokes_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token %s' % self.token)
+        self.assertEqual(self.client.get(root_url).status_code, 200)
+        self.client.post(reverse('knox_logout'))
+        self.assertEqual(self.client.get(root_url).status_code, 401)
+
+    def test_token_cache_skips_database(self):
+        with override_settings(REST_KNOX=dict(
+                signed_tokens_knox, TOKEN_CACHE='knox.cache.LocMemTokenCache')):
+            reload(cache)
+            self.authenticate()
+            with self.assertNumQueries(0):
+                user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+
+
+@freeze_time('2026-01-01 00:00:00')
+class TrustedSignedTokenTestCase(APITestCase):
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=trusted_tokens_knox)
+        self.override.enable()
+        reload(signing)
+        reload(revocation)
+        reload(auth)
+        self.channel = revocation.get_revocation_channel()
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        with freeze_time('2026-01-01 00:00:01'):
+            self.instance, self.token = AuthToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        self.override.disable()
+        reload(signing)
+        reload(revocation)
+        reload(auth)
+
+    def authenticate(self, token=None):
+        token = token or self.token
+        return auth.TokenAuthentication().authenticate_credentials(token.encode())
+
+    def test_authenticate_without_database(self):
+        with self.assertNumQueries(0):
+            user, auth_token = self.authenticate()
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(auth_token.digest, self.instance.digest)
+            self.assertEqual(auth_token.expiry, self.instance.expiry)
+        self.assertEqual(user.username, 'john.doe')
+
+    def test_revoked_token_is_looked_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.instance.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_revocation_from_other_process_is_looked_up(self):
+        revocation.LocMemRevocationChannel().publish([self.instance.digest])
+        AuthToken.objects.filter(digest=self.instance.digest).delete()
+        with freeze_time('2026-01-01 00:01:00'):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate()
+
+    def test_deactivated_user_is_looked_up(self):
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_tokens_issued_before_listening_are_looked_up(self):
+        with freeze_time('2025-12-31 23:59:59'):
+            _, token = AuthToken.objects.create(user=self.user)
+        with self.assertNumQueries(1):
+            self.authenticate(token)
+
+    def test_tokens_older_than_trust_window_are_looked_up(self):
+        with freeze_time('2026-01-01 01:00:02'), self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_missed_revocations_are_looked_up(self):
+        with patch.object(self.channel, 'poll', return_value=None):
+            with freeze_time('2026-01-01 00:01:00'), self.assertNumQueries(1):
+                self.authenticate()
+
+    def test_auto_refresh_is_looked_up(self):
+        with override_settings(REST_KNOX=dict(trusted_tokens_knox, AUTO_REFRESH=True)):
+            reload(auth)
+            with self.assertNumQueries(1):
+                self.authenticate()
+        reload(auth)
+
+
+class SigningKeyTestCase(TestCase):
+
+    def test_unknown_signing_key_id(self):
+        user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        with override_settings(REST_KNOX=dict(
+                signed_tokens_knox, TOKEN_SIGNING_KEY_ID='2026')):
+            reload(signing)
+            with self.assertRaises(ImproperlyConfigured):
+                AuthToken.objects.create(user=user)
+        reload(signing)
+
+    def test_unsigned_prefix_containing_separator(self):
+        user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+        instance, token = AuthToken.objects.create(user=user, prefix='v1.')
+        self.assertFalse(signing.is_signed_token(token))
+        _, auth_token = TokenAuthentication().authenticate_credentials(token.encode())
+        self.assertEqual(auth_token.digest, instance.digest)
+
+    def test_secret_key_is_the_default_signing_key(self):
+        with override_settings(REST_KNOX={'SIGNED_TOKENS': True}):
+            reload(signing)
+            user = User(pk=1)
+            with freeze_time('2026-01-01'):
+                token = signing.sign_token('0' * 64, user, None)
+            self.assertEqual(signing.unsign_token(token),
+                             signing.SignedTokenClaims(
+                                 'default', 1, None, datetime(2026, 1, 1, tzinfo=utc)))
+        reload(signing)
@@ -0,0 +1,334 @@
+import base64
+import threading
+from datetime import timedelta
+from importlib import reload
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as default_cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+
+from knox import auth, stores, views
+from knox.models import AuthToken
+from knox.settings import knox_settings
+from knox.signals import token_expired
+
+User = get_user_model()
+
+in_memory_store_knox = knox_settings.defaults.copy()
+in_memory_store_knox["TOKEN_STORE"] = 'knox.stores.InMemoryTokenStore'
+
+django_cache_store_knox = knox_settings.defaults.copy()
+django_cache_store_knox["TOKEN_STORE"] = 'knox.stores.DjangoCacheTokenStore'
+
+
+class StoreTestMixin:
+    knox_settings = None
+
+    def setUp(self):
+        self.override = override_settings(REST_KNOX=self.knox_settings)
+        self.override.enable()
+        for module in (stores, auth, views):
+            reload(module)
+        self.store = stores.get_token_store()
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+
+    def tearDown(self):
+        default_cache.clear()
+        self.override.disable()
+        for module in (stores, auth, views):
+            reload(module)
+
+    def authenticate(self, token):
+        return auth.TokenAuthentication().authenticate_credentials(token.encode())
+
+    def login(self):
+        credentials = base64.b64encode(b'john.doe:hunter2').decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Basic {credentials}')
+        return self.client.post(reverse('knox_login'), {}, format='json')
+
+    def test_tokens_are_kept_out_of_the_database(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(AuthToken.objects.exists())
+        user, auth_token = self.authenticate(response.data['token'])
+        self.assertEqual(user, self.user)
+        self.assertEqual(auth_token.user_id, self.user.pk)
+
+    def test_authentication_does_not_query_the_database(self):
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.get_username(), 'john.doe')
+        self.assertEqual(user.email, 'john@example.com')
+
+    def test_user_snapshot_follows_saves(self):
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        self.user.username = 'jane.doe'
+        self.user.save()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+            self.assertEqual(user.get_username(), 'jane.doe')
+
+    def test_deleted_user_tokens_are_deleted(self):
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_unknown_token_is_rejected(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_expired_token_is_rejected(self):
+        with freeze_time('2026-01-01 12:00:00'):
+            _, token = self.store.create(self.user, timedelta(hours=1))
+            self.authenticate(token)
+        with freeze_time('2026-01-01 13:00:01'):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+
+    def test_inactive_user_is_rejected(self):
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_deactivation_publishes_revocations(self):
+        instance, _ = self.store.create(self.user, timedelta(hours=1))
+        with patch('knox.stores.publish_revocations') as publish_revocations:
+            self.user.is_active = False
+            self.user.save()
+        publish_revocations.assert_called_once_with([instance.digest])
+
+    def test_logout(self):
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        _, other_token = self.store.create(self.user, timedelta(hours=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(self.client.post(reverse('knox_logout')).status_code, 204)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.authenticate(other_token)
+
+    def test_logout_all(self):
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        _, other_token = self.store.create(self.user, None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(self.client.post(reverse('knox_logoutall')).status_code, 204)
+        for revoked_token in (token, other_token):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(revoked_token)
+        self.assertEqual(self.store.count_active_for_user(self.user), 0)
+
+    def test_refresh(self):
+        instance, token = self.store.create(self.user, timedelta(hours=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        response = self.client.post(reverse('knox_refresh'))
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        _, new_instance = self.authenticate(response.data['token'])
+        self.assertEqual(new_instance.created, instance.created)
+
+    def test_renewal(self):
+        auto_refresh_knox = self.knox_settings.copy()
+        auto_refresh_knox["AUTO_REFRESH"] = True
+        with freeze_time('2026-01-01 12:00:00'):
+            _, token = self.store.create(self.user, timedelta(hours=1))
+        with override_settings(REST_KNOX=auto_refresh_knox):
+            reload(auth)
+            with freeze_time('2026-01-01 12:30:00'):
+                auth.TokenAuthentication().authenticate_credentials(token.encode())
+        reload(auth)
+        with freeze_time('2026-01-01 13:30:00'):
+            _, auth_token = self.authenticate(token)
+        self.assertEqual(auth_token.expiry.isoformat(), '2026-01-01T22:30:00+00:00')
+
+    def test_token_limit(self):
+        token_limit_knox = self.knox_settings.copy()
+        token_limit_knox["TOKEN_LIMIT_PER_USER"] = 1
+        self.store.create(self.user, timedelta(hours=1))
+        with override_settings(REST_KNOX=token_limit_knox):
+            reload(views)
+            self.assertEqual(self.login().status_code, 403)
+        reload(views)
+
+    def test_token_limit_eviction(self):
+        evict_oldest_knox = self.knox_settings.copy()
+        evict_oldest_knox["TOKEN_LIMIT_PER_USER"] = 2
+        evict_oldest_knox["TOKEN_LIMIT_PER_USER_POLICY"] = 'evict_oldest'
+        with freeze_time('2026-01-01 12:00:00'):
+            _, oldest_token = self.store.create(self.user, None)
+        _, token = self.store.create(self.user, None)
+        with override_settings(REST_KNOX=evict_oldest_knox):
+            reload(views)
+            self.assertEqual(self.login().status_code, 200)
+        reload(views)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(oldest_token)
+        self.authenticate(token)
+        self.assertEqual(self.store.count_active_for_user(self.user), 2)
+
+    def test_create_forgets_expired_tokens(self):
+        with freeze_time('2026-01-01 12:00:00'):
+            for _ in range(3):
+                self.store.create(self.user, timedelta(seconds=1))
+        instance, _ = self.store.create(self.user, timedelta(hours=1))
+        self.assertEqual(self.store._read_user_digests(self.user.pk), [instance.digest])
+
+    def test_concurrent_logins_keep_every_token(self):
+        threads = [
+            threading.Thread(target=self.store.create, args=(self.user, None))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.store._read_user_digests(self.user.pk)), 20)
+        self.assertEqual(self.store.delete_for_user(self.user), 20)
+
+    def test_auto_refresh_buffer_is_rejected(self):
+        buffered_knox = self.knox_settings.copy()
+        buffered_knox["AUTO_REFRESH_BUFFER"] = 'knox.refresh.LocMemRefreshBuffer'
+        with override_settings(REST_KNOX=buffered_knox):
+            reload(stores)
+            with self.assertRaises(ImproperlyConfigured):
+                stores.get_token_store()
+
+    def test_bulk_create(self):
+        created = self.store.bulk_create(
+            [self.user, {'user': self.user, 'prefix': 'abc_', 'expiry': None}],
+            expiry=timedelta(hours=1))
+        self.assertEqual(len(created), 2)
+        (instance, token), (other_instance, other_token) = created
+        self.assertIsNotNone(instance.expiry)
+        self.assertIsNone(other_instance.expiry)
+        self.assertTrue(other_token.startswith('abc_'))
+        for token in (token, other_token):
+            self.authenticate(token)
+        self.assertEqual(self.store.count_active_for_user(self.user), 2)
+
+    def test_revoke(self):
+        other_user = User.objects.create_user('jane.doe')
+        with freeze_time(timezone.now() - timedelta(days=1)):
+            _, old_token = self.store.create(self.user, None)
+        _, token = self.store.create(self.user, None, prefix='abc_')
+        _, other_token = self.store.create(other_user, None)
+        self.assertEqual(self.store.count_tokens(), 3)
+        self.assertEqual(self.store.count_tokens(prefix='abc_'), 1)
+        self.assertEqual(self.store.revoke(
+            created_before=timezone.now() - timedelta(hours=1)), 1)
+        self.assertEqual(self.store.revoke(user_ids=[str(other_user.pk)]), 1)
+        for revoked_token in (old_token, other_token):
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(revoked_token)
+        self.authenticate(token)
+        self.assertEqual(self.store.count_active_for_user(self.user), 1)
+        self.assertEqual(self.store.count_active_for_user(other_user), 0)
+
+    def test_revoke_signals(self):
+        expired = []
+
+        def token_expired_handler(sender, username, source, **kwargs):
+            expired.append((username, source))
+
+        self.store.create(self.user, None)
+        self.store.create(self.user, None)
+        token_expired.connect(token_expired_handler)
+        try:
+            self.assertEqual(self.store.revoke(batch_size=1, send_signals=True), 2)
+        finally:
+            token_expired.disconnect(token_expired_handler)
+        self.assertEqual(expired, [('john.doe', 'revoke')] * 2)
+
+    def test_revoke_command(self):
+        self.store.create(self.user, None)
+        _, token = self.store.create(self.user, None, prefix='abc_')
+        stdout = StringIO()
+        call_command('knox_revoke', '--prefix', 'abc_', '--dry-run', stdout=stdout)
+        self.assertIn('Would revoke 1 token(s).', stdout.getvalue())
+        call_command('knox_revoke', '--prefix', 'abc_', stdout=StringIO())
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.assertEqual(self.store.count_active_for_user(self.user), 1)
+
+    def test_create_tokens_command(self):
+        stdout = StringIO()
+        call_command('knox_create_tokens', 'john.doe', stdout=stdout)
+        _, token = stdout.getvalue().split()
+        self.authenticate(token)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_verify_tokens(self):
+        instance, token = self.store.create(self.user, timedelta(hours=1))
+        results = auth.TokenAuthentication().verify_tokens([token, 'invalid'])
+        self.assertEqual(results, [
+            auth.TokenVerification(True, self.user.pk, instance.expiry),
+            auth.INVALID_TOKEN,
+        ])
+
+
+class InMemoryTokenStoreTestCase(StoreTestMixin, APITestCase):
+    knox_settings = in_memory_store_knox
+
+    def test_purge_expired(self):
+        with freeze_time('2026-01-01 12:00:00'):
+            self.store.create(self.user, timedelta(seconds=1))
+        _, token = self.store.create(self.user, timedelta(hours=1))
+        self.assertEqual(self.store.purge_expired(), 1)
+        call_command('knox_purge_expired', stdout=StringIO())
+        self.authenticate(token)
+
+
+class DjangoCacheTokenStoreTestCase(StoreTestMixin, APITestCase):
+    knox_settings = django_cache_store_knox
+
+
+class ORMTokenStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.store = stores.ORMTokenStore()
+        self.user = User.objects.create_user('john.doe', 'john@example.com', 'hunter2')
+
+    def test_is_the_default(self):
+        self.assertIsInstance(stores.get_token_store(), stores.ORMTokenStore)
+
+    def test_create_and_get(self):
+        instance, token = self.store.create(self.user, timedelta(hours=1))
+        self.assertEqual(self.store.get([instance.digest]), instance)
+        self.assertIsNone(self.store.get(['0' * 128]))
+
+    def test_create_with_created(self):
+        created = AuthToken.objects.create(user=self.user)[0].created - timedelta(days=1)
+        instance, _ = self.store.create(self.user, None, created=created)
+        self.assertEqual(AuthToken.objects.get(pk=instance.pk).created, created)
+
+    def test_delete(self):
+        instance, _ = self.store.create(self.user, timedelta(hours=1))
+        self.assertTrue(self.store.delete(instance))
+        self.assertFalse(self.store.delete(instance))
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_active_and_expired_tokens(self):
+        self.store.create(self.user, timedelta(hours=1))
+        self.store.create(self.user, None)
+        expired, _ = self.store.create(self.user, timedelta(seconds=-1))
+        self.assertEqual(self.store.count_active_for_user(self.user), 2)
+        self.assertEqual(len(self.store.get_active_for_user(self.user)), 2)
+        self.assertEqual(list(self.store.get_expired_for_user(self.user)), [expired])
+        self.assertEqual(
+            list(self.store.get_expired_for_user(self.user, exclude=expired)), [])
+        self.assertEqual(self.store.purge_expired(), 1)
+        self.assertEqual(self.store.delete_for_user(self.user), 2)
@@ -8,9 +8,11 @@ from django.urls import reverse
 from freezegun import freeze_time
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.serializers import DateTimeField
-from rest_framework.test import APIRequestFactory, APITestCase as TestCase
+from rest_framework.test import (
+    APIRequestFactory, APITestCase as TestCase, force_authenticate,
+)
 
-from knox import auth, crypto, views
+from knox import auth, crypto, urls as knox_urls, views
 from knox.auth import TokenAuthentication
 from knox.models import AuthToken
 from knox.serializers import UserSerializer
@@ -38,6 +40,12 @@ auto_refresh_max_ttl_knox["AUTO_REFRESH_MAX_TTL"] = timedelta(hours=12)
 token_user_limit_knox = knox_settings.defaults.copy()
 token_user_limit_knox["TOKEN_LIMIT_PER_USER"] = 10
 
+evict_oldest_knox = token_user_limit_knox.copy()
+evict_oldest_knox["TOKEN_LIMIT_PER_USER_POLICY"] = 'evict_oldest'
+
+evict_soonest_expiring_knox = token_user_limit_knox.copy()
+evict_soonest_expiring_knox["TOKEN_LIMIT_PER_USER_POLICY"] = 'evict_soonest_expiring'
+
 user_serializer_knox = knox_settings.defaults.copy()
 user_serializer_knox["USER_SERIALIZER"] = UserSerializer
 
@@ -51,6 +59,9 @@ EXPIRY_DATETIME_FORMAT = '%H:%M %d/%m/%y'
 expiry_datetime_format_knox = knox_settings.defaults.copy()
 expiry_datetime_format_knox["EXPIRY_DATETIME_FORMAT"] = EXPIRY_DATETIME_FORMAT
 
+no_inline_cleanup_knox = knox_settings.defaults.copy()
+no_inline_cleanup_knox["INLINE_TOKEN_CLEANUP"] = False
+
 token_prefix = "TEST_"
 token_prefix_knox = knox_settings.defaults.copy()
 token_prefix_knox["TOKEN_PREFIX"] = token_prefix
@@ -147,6 +158,85 @@ class LoginViewTestCase(BaseTestCase):
         )
 
 
+class RefreshViewTestCase(BaseTestCase):
+    """
+    Tests the token rotation of the refresh view.
+    """
+
+    def refresh(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=('Token %s' % token))
+        return self.client.post(reverse('knox_refresh'), {}, format='json')
+
+    def test_refresh_replaces_token(self):
+        AuthToken.objects.create(user=self.user)
+        with freeze_time(datetime.now() - timedelta(hours=1)):
+            instance, token = AuthToken.objects.create(user=self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['token'], token)
+        self.assertEqual(AuthToken.objects.count(), 2)
+        self.assertFalse(AuthToken.objects.filter(pk=instance.pk).exists())
+        new_instance = AuthToken.objects.get(
+            digest=crypto.hash_token(response.data['token']))
+        self.assertEqual(new_instance.created, instance.created)
+        self.assertGreater(new_instance.expiry, instance.expiry)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(response.data['token']).status_code, 200)
+
+    def test_refresh_requires_token_authentication(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=get_basic_auth_header(self.username, self.password)
+        )
+        response = self.client.post(reverse('knox_refresh'), {}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_refresh_uses_token_prefix(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        with override_settings(REST_KNOX=token_prefix_knox):
+            reload(views)
+            response = self.refresh(token)
+        reload(views)
+        self.assertTrue(response.data['token'].startswith(token_prefix))
+
+    def test_refresh_honours_auto_refresh_max_ttl(self):
+        with freeze_time(datetime.now() - timedelta(hours=11)):
+            instance, token = AuthToken.objects.create(user=self.user)
+            expiry = instance.created + auto_refresh_max_ttl_knox["AUTO_REFRESH_MAX_TTL"]
+        instance.expiry = expiry
+        instance.save()
+        with override_settings(REST_KNOX=auto_refresh_max_ttl_knox):
+            reload(auth)
+            reload(views)
+            response = self.refresh(token)
+        reload(auth)
+        reload(views)
+        new_instance = AuthToken.objects.get(
+            digest=crypto.hash_token(response.data['token']))
+        self.assertAlmostEqual(new_instance.expiry, expiry, delta=timedelta(seconds=1))
+
+    def test_refresh_past_auto_refresh_max_ttl_fails(self):
+        with freeze_time(datetime.now() - timedelta(hours=13)):
+            instance, token = AuthToken.objects.create(user=self.user, expiry=None)
+        with override_settings(REST_KNOX=dict(auto_refresh_max_ttl_knox, TOKEN_TTL=None)):
+            reload(auth)
+            reload(views)
+            response = self.refresh(token)
+        reload(auth)
+        reload(views)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(list(AuthToken.objects.all()), [instance])
+
+    def test_refresh_of_replaced_token_fails(self):
+        instance, _ = AuthToken.objects.create(user=self.user)
+        view = views.RefreshView()
+        view.request = APIRequestFactory().post('/')
+        view.request.auth = instance
+        instance.delete()
+        with self.assertRaises(AuthenticationFailed):
+            view.rotate_token()
+        self.assertEqual(AuthToken.objects.count(), 0)
+
+
 class LogoutViewsTestCase(BaseTestCase):
     """
     Tests the functionality of the logout views.
@@ -217,6 +307,19 @@ class TokenAuthenticationTestCase(BaseTestCase):
         self.client.post(url, {}, format='json')
         self.assertEqual(AuthToken.objects.count(), 0)
 
+    def test_expired_tokens_kept_without_inline_cleanup(self):
+        for _ in range(3):
+            AuthToken.objects.create(user=self.user, expiry=timedelta(seconds=-1))
+        _, token = AuthToken.objects.create(user=self.user)
+
+        self.client.credentials(HTTP_AUTHORIZATION=('Token %s' % token))
+        with override_settings(REST_KNOX=no_inline_cleanup_knox):
+            reload(auth)
+            response = self.client.get(root_url, {}, format='json')
+        reload(auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AuthToken.objects.count(), 4)
+
     def test_update_token_key(self):
         self.assertEqual(AuthToken.objects.count(), 0)
         _, token = AuthToken.objects.create(self.user)
@@ -428,6 +531,54 @@ class TokenAuthenticationTestCase(BaseTestCase):
         self.assertEqual(failed_response.data,
                          {"error": "Maximum amount of tokens allowed per user exceeded."})
 
+    def test_exceeding_token_limit_evicts_oldest_token(self):
+        with override_settings(REST_KNOX=evict_oldest_knox):
+            reload(views)
+            with freeze_time(datetime.now() - timedelta(hours=1)):
+                oldest, _ = AuthToken.objects.create(user=self.user)
+            for _ in range(9):
+                AuthToken.objects.create(user=self.user)
+            url = reverse('knox_login')
+            self.client.credentials(
+                HTTP_AUTHORIZATION=get_basic_auth_header(self.username, self.password)
+            )
+            response = self.client.post(url, {}, format='json')
+        reload(views)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AuthToken.objects.count(), 10)
+        self.assertFalse(AuthToken.objects.filter(pk=oldest.pk).exists())
+
+    def test_token_limit_with_lazy_user(self):
+        _, token = AuthToken.objects.create(user=self.user)
+        with override_settings(REST_KNOX=dict(token_user_limit_knox, LAZY_USER=True)):
+            reload(auth)
+            reload(views)
+            self.client.credentials(HTTP_AUTHORIZATION=('Token %s' % token))
+            response = self.client.post(reverse('knox_login'), {}, format='json')
+        reload(auth)
+        reload(views)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 2)
+
+    def test_exceeding_token_limit_evicts_soonest_expiring_token(self):
+        with override_settings(REST_KNOX=evict_soonest_expiring_knox):
+            reload(views)
+            for _ in range(5):
+                AuthToken.objects.create(user=self.user, expiry=None)
+            soonest, _ = AuthToken.objects.create(
+                user=self.user, expiry=timedelta(hours=1))
+            for _ in range(4):
+                AuthToken.objects.create(user=self.user)
+            url = reverse('knox_login')
+            self.client.credentials(
+                HTTP_AUTHORIZATION=get_basic_auth_header(self.username, self.password)
+            )
+            response = self.client.post(url, {}, format='json')
+        reload(views)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AuthToken.objects.count(), 10)
+        self.assertFalse(AuthToken.objects.filter(pk=soonest.pk).exists())
+
     def test_invalid_prefix_return_401(self):
         with override_settings(REST_KNOX=auth_header_prefix_knox):
             reload(auth)
@@ -551,3 +702,110 @@ class TokenAuthenticationTestCase(BaseTestCase):
             response = self.client.get(root_url, {}, format='json')
             self.assertEqual(response.status_code, 200)
         reload(views)
+
+
+class VerifyTokensViewTestCase(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.view = views.VerifyTokensView.as_view()
+
+    def verify(self, data, user=None):
+        request = APIRequestFactory().post('/', data, format='json')
+        force_authenticate(request, user or self.user)
+        return self.view(request)
+
+    def test_verify_tokens(self):
+        instance, token = AuthToken.objects.create(user=self.user2)
+        response = self.verify({'tokens': [token, 'invalid']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'results': [
+            {'valid': True, 'user_id': self.user2.pk,
+             'expiry': DateTimeField().to_representation(instance.expiry)},
+            {'valid': False, 'user_id': None, 'expiry': None},
+        ]})
+
+    def test_requires_admin_user(self):
+        _, token = AuthToken.objects.create(user=self.user2)
+        response = self.verify({'tokens': [token]}, user=self.user2)
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_size_is_limited(self):
+        response = self.verify({'tokens': ['0'] * 101})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.verify({'tokens': []}).status_code, 400)
+        self.assertEqual(self.verify({}).status_code, 400)
+
+
+class IntrospectViewTestCase(BaseTestCase):
+
+    def introspect(self, token=None):
+        if token is not None:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return self.client.get(reverse('knox_introspect'))
+
+    def assertMaxAge(self, response, max_age):
+        self.assertEqual(response['Cache-Control'], f'public, max-age={max_age}')
+        self.assertIn('Authorization', response['Vary'])
+
+    def test_active_token(self):
+        instance, token = AuthToken.objects.create(user=self.user)
+        response = self.introspect(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'active': True,
+            'user_id': self.user.pk,
+            'expiry': DateTimeField().to_representation(instance.expiry),
+        })
+        self.assertMaxAge(response, knox_settings.INTROSPECTION_MAX_AGE)
+
+    def test_max_age_does_not_outlive_token(self):
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        with freeze_time(now):
+            _, token = AuthToken.objects.create(user=self.user, expiry=timedelta(hours=1))
+        with freeze_time(now + timedelta(minutes=59, seconds=30)):
+            self.assertMaxAge(self.introspect(token), 30)
+
+    def test_token_without_expiry(self):
+        _, token = AuthToken.objects.create(user=self.user, expiry=None)
+        response = self.introspect(token)
+        self.assertIsNone(response.data['expiry'])
+        self.assertMaxAge(response, knox_settings.INTROSPECTION_MAX_AGE)
+
+    def test_inactive_tokens(self):
+        _, expired_token = AuthToken.objects.create(
+            user=self.user, expiry=timedelta(seconds=-1))
+        for token in (None, 'invalid', 'a b', expired_token):
+            with self.subTest(token=token):
+                response = self.introspect(token)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data, {'active': False})
+                self.assertMaxAge(response, knox_settings.INTROSPECTION_MAX_AGE)
+
+    def test_does_not_renew_token(self):
+        now = datetime(2026, 1, 1, 12, 0, 0)
+        with freeze_time(now):
+            instance, token = AuthToken.objects.create(user=self.user)
+        with override_settings(REST_KNOX=dict(auto_refresh_knox, TRACK_LAST_USED=True)):
+            reload(auth)
+            with freeze_time(now + timedelta(hours=1)):
+                self.assertTrue(self.introspect(token).data['active'])
+        reload(auth)
+        auth_token = AuthToken.objects.get()
+        self.assertEqual(auth_token.expiry, instance.expiry)
+        self.assertIsNone(auth_token.last_used)
+
+    def test_is_not_routed_by_knox_urls(self):
+        self.assertNotIn(
+            'knox_introspect', [pattern.name for pattern in knox_urls.urlpatterns])
+
+    def test_max_age_setting(self):
+        introspection_knox = knox_settings.defaults.copy()
+        introspection_knox["INTROSPECTION_MAX_AGE"] = 5
+        _, token = AuthToken.objects.create(user=self.user)
+        with override_settings(REST_KNOX=introspection_knox):
+            reload(views)
+            self.assertMaxAge(self.introspect(token), 5)
+        reload(views)